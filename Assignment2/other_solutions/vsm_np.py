@@ -74,6 +74,26 @@ class InvertedFile(object):
         else:
             return False
 
+def build_triplets(documents, keywords):
+    '''
+        Flatten the term frequencies of the documents into three aligned arrays,
+        one entry per (document, keyword) pair, in document order.
+
+        Returns:
+            dids: np.array, the document ids.
+            tids: np.array, the term ids of the keywords.
+            counts: np.array, the term frequencies.
+    '''
+    sizes = [len(document.get_terms()) for document in documents]
+    dids = np.repeat(np.arange(len(documents), dtype = np.int32), sizes)
+    tids = np.fromiter((keywords[word] for document in documents
+                        for word in document.get_terms()),
+                       dtype = np.int32, count = len(dids))
+    counts = np.fromiter((document.get_tf(word) for document in documents
+                          for word in document.get_terms()),
+                         dtype = np.float64, count = len(dids))
+    return dids, tids, counts
+
 class VectorSpace(object):
     '''
         Abstract data structure for the vectorspace. Maintains the documents'
@@ -83,16 +103,14 @@ class VectorSpace(object):
         Attrs:
             vectorspace: np.array, the matrix holding documents' weights vectors.
     '''
-    def __init__(self, documents, keywords, inverted_file):
-        self.__vectorspace = np.zeros((len(documents), len(keywords)))
-        for document in documents:
-            did = document.get_id()
-            for word in document.get_terms():
-                tid = keywords[word]
-                idf = math.log(len(documents) / len(inverted_file.get_documents(word)), 2)
-                max_tf = document.get_max_tf()
-                tf = document.get_tf(word)
-                self.__vectorspace[did, tid] = tf / max_tf * idf
+    def __init__(self, triplets, num_documents, num_keywords):
+        dids, tids, counts = triplets
+        document_frequency = np.bincount(tids, minlength = num_keywords)
+        idf = np.array([math.log(num_documents / df, 2) for df in document_frequency.tolist()])
+        max_tf = np.ones(num_documents)
+        np.maximum.at(max_tf, dids, counts)
+        self.__vectorspace = np.zeros((num_documents, num_keywords))
+        self.__vectorspace[dids, tids] = counts / max_tf[dids] * idf[tids]
 
     def get_weights_vector(self, did):
         return self.__vectorspace[did, :]
@@ -152,7 +170,8 @@ class DataManager(object):
         for i, term in enumerate(word_file_map.keys()):
             self.__dictionary[term] = i
 
-        self.__vspace = VectorSpace(documents, self.__dictionary, self.__inverted_file)
+        self.__vspace = VectorSpace(build_triplets(documents, self.__dictionary),
+                                    len(documents), len(self.__dictionary))
 
     def magnitude(self, vector):
         return np.linalg.norm(vector, ord = 2)
@@ -236,6 +255,9 @@ class VSM(object):
         word_file_map, documents = self.load_documents(input_path)
         self.__data_manager = DataManager(word_file_map, documents)
 
+    def get_data_manager(self):
+        return self.__data_manager
+
     def pre_process(self, passage):
         passage = passage.strip()
         for i in range(len(passage)):
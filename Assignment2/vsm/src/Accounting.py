@@ -0,0 +1,283 @@
+import os
+import sys
+import math
+from itertools import islice
+
+import numpy as np
+
+SOURCE_FOLDER = os.path.dirname(os.path.abspath(__file__))
+
+# what the size of a structure grows with, from the slowest to the fastest; a
+# document and a posting both grow linearly with the collection
+GROWTH_CLASSES = ('constant', 'term', 'document', 'posting', 'matrix')
+
+# the structures whose class cannot be told from their shape
+GROWTH = {'TermDictionary.deletes': 'term', 'TermDictionary.chars': 'term',
+          'TermDictionary.alphabet': 'constant', 'IndexStatistics.values': 'constant',
+          'objects': 'constant'}
+
+# structures shared by several components, accounted to the component which
+# owns them rather than to the first one walked
+OWNED_STRUCTURES = ('InvertedFile.index', 'IndexReader.terms')
+
+# default growth exponent of the vocabulary, V = K * N ^ beta (Heaps' law)
+DEFAULT_BETA = 0.5
+
+def deep_size(value, seen):
+    '''
+        Bytes of an object and of all the objects it contains, an object already
+        in seen being counted as zero so that shared keys and values are counted
+        once, in the first structure holding them.
+    '''
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    size = sys.getsizeof(value)
+    if isinstance(value, np.ndarray):
+        # the size of an array includes its data only when it owns it
+        if value.base is not None:
+            size += deep_size(value.base, seen)
+    elif isinstance(value, dict):
+        for key, item in value.items():
+            size += deep_size(key, seen) + deep_size(item, seen)
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        for item in value:
+            size += deep_size(item, seen)
+    return size
+
+def is_component(value):
+    '''
+        Whether value is an instance of a class of this program, whose attributes
+        are accounted as separate structures.
+    '''
+    if not hasattr(value, '__dict__') or isinstance(value, type):
+        return False
+    module = sys.modules.get(type(value).__module__)
+    path = getattr(module, '__file__', None)
+    return path is not None and os.path.dirname(os.path.abspath(path)) == SOURCE_FOLDER
+
+def structure_name(component, attribute):
+    # a private attribute is stored as _Class__name, Class being the class
+    # defining it, which may be a base class of the component
+    if attribute.startswith('_') and '__' in attribute[1 :]:
+        owner, name = attribute[1 :].split('__', 1)
+        return '%s.%s' % (owner, name)
+    return '%s.%s' % (type(component).__name__, attribute)
+
+def classify(value, counts, vocabulary):
+    '''
+        Tell what the size of a structure grows with from its shape: a documents
+        x keywords array is a 'matrix'; a dictionary keyed by keyword holding
+        posting lists, or a sequence as long as the postings, grows per
+        'posting'; a dictionary keyed by keyword holding anything else, or a
+        sequence of keywords or as long as the vocabulary, per 'term'; a
+        sequence as long as the collection per 'document'. Scalars, locks and
+        empty containers are 'constant', a few structures held together grow
+        with the fastest of them, and any other container is taken to grow per
+        'document'.
+
+        Args:
+            counts: dictionary, the number of documents, terms and postings of the
+            index by class.
+            vocabulary: dictionary, keyed by the keywords of the index.
+    '''
+    if isinstance(value, np.ndarray):
+        if value.ndim == 2 and sorted(value.shape) == sorted((counts['document'],
+                                                              counts['term'])):
+            return 'matrix'
+        length = len(value) if value.ndim > 0 else 0
+    elif isinstance(value, dict):
+        length = len(value)
+        first = next(iter(value), None)
+        if isinstance(first, str) and first in vocabulary:
+            # posting lists have varying lengths, per keyword records a fixed one
+            lengths = set()
+            for item in islice(value.values(), 100):
+                if isinstance(item, tuple):
+                    item = max(item, key = lambda x: len(x) if hasattr(x, '__len__') else 0)
+                if not isinstance(item, (list, set, np.ndarray)):
+                    return 'term'
+                lengths.add(len(item))
+            return 'posting' if len(lengths) > 1 else 'term'
+        if 0 < length < 8:
+            return bundle(value.values(), counts, vocabulary)
+    elif isinstance(value, tuple) and 0 < len(value) < 8:
+        return bundle(value, counts, vocabulary)
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        length = len(value)
+        first = next(iter(value), None)
+        if isinstance(first, str) and first in vocabulary:
+            return 'term'
+    else:
+        return 'constant'
+
+    if length == 0:
+        return 'constant'
+    for name in ('posting', 'document', 'term'):
+        if length == counts[name]:
+            return name
+    return 'document'
+
+def bundle(values, counts, vocabulary):
+    classes = [classify(item, counts, vocabulary) for item in values]
+    return max(classes, key = GROWTH_CLASSES.index)
+
+def account(sizes, growth, name, size, kind):
+    '''
+        Add size bytes to the structure name, which grows with the fastest of
+        the classes it was accounted with unless GROWTH tells otherwise.
+    '''
+    sizes[name] = sizes.get(name, 0) + size
+    kind = GROWTH.get(name, kind)
+    if GROWTH_CLASSES.index(kind) > GROWTH_CLASSES.index(growth.get(name, 'constant')):
+        growth[name] = kind
+    else:
+        growth.setdefault(name, kind)
+
+def walk(component, sizes, growth, seen, context, per_item = False):
+    '''
+        Account the attributes of component and of the components it holds. The
+        structures of the items of a list of components, such as the document
+        vectors, are summed over the items and grow per 'document'.
+
+        Args:
+            context: tuple (counts, vocabulary), see classify.
+    '''
+    if id(component) in seen:
+        return
+    seen.add(id(component))
+    if per_item:
+        account(sizes, growth, '%s.objects' % type(component).__name__,
+                sys.getsizeof(component), 'document')
+    else:
+        account(sizes, growth, 'objects', sys.getsizeof(component), 'constant')
+    for attribute, value in vars(component).items():
+        name = structure_name(component, attribute)
+        if is_component(value):
+            walk(value, sizes, growth, seen, context, per_item)
+        elif (isinstance(value, list) and len(value) > 0 and is_component(value[0])):
+            if id(value) in seen:
+                continue
+            seen.add(id(value))
+            account(sizes, growth, name, sys.getsizeof(value), classify(value, *context))
+            for item in value:
+                walk(item, sizes, growth, seen, context, True)
+        elif name == 'IndexStatistics.values':
+            seen.add(id(value))
+            account(sizes, growth, name, sys.getsizeof(value), 'constant')
+            for key, item in value.items():
+                key_name = 'IndexStatistics.%s' % key
+                account(sizes, growth, key_name, deep_size(item, seen),
+                        classify(item, *context))
+        else:
+            kind = 'document' if per_item else classify(value, *context)
+            account(sizes, growth, name, deep_size(value, seen), kind)
+
+def owned(component, found, visited):
+    '''
+        Collect the values of the OWNED_STRUCTURES held by component and by the
+        components it holds, but not by the items of a list of components.
+    '''
+    if id(component) in visited:
+        return
+    visited.add(id(component))
+    for attribute, value in vars(component).items():
+        name = structure_name(component, attribute)
+        if is_component(value):
+            owned(value, found, visited)
+        elif name in OWNED_STRUCTURES:
+            found.append((name, value))
+
+def measure(data_manager):
+    '''
+        Walk the loaded index and account its memory by structure, e.g.
+        'Vector.term_index' sums the position lists of all the documents and
+        'InvertedFile.index' the posting lists. A structure shared by several
+        components is accounted once, to its owner in OWNED_STRUCTURES or else
+        to the first component walked. The instances of the components are
+        accounted under 'objects', the ones of a list such as the document
+        vectors under 'Vector.objects'. Only the documents and postings in
+        memory are walked, for a loaded index the ones in its caches.
+
+        Returns:
+            sizes: dictionary, map structure names to bytes.
+            growth: dictionary, map structure names to what they grow with, one of
+            GROWTH_CLASSES.
+    '''
+    statistics = data_manager.get_statistics()
+    vocabulary = statistics.get('document_frequency')
+    counts = {'document': statistics.get_num_documents(), 'term': len(vocabulary),
+              'posting': sum(vocabulary.values())}
+    sizes = {}
+    growth = {}
+    seen = set()
+    found = []
+    owned(data_manager, found, set())
+    for name, value in found:
+        account(sizes, growth, name, deep_size(value, seen), classify(value, counts, vocabulary))
+    walk(data_manager, sizes, growth, seen, (counts, vocabulary))
+    return sizes, growth
+
+def term_sizes(data_manager, n = 10):
+    '''
+        Find the n keywords with the largest posting lists and position lists,
+        among the keywords with the highest document and collection frequencies.
+
+        Returns:
+            list, containing n (keyword, posting bytes, position bytes) tuples,
+            largest total first.
+    '''
+    statistics = data_manager.get_statistics()
+    documents = data_manager.get_documents()
+    candidates = set()
+    for name in ('document_frequency', 'collection_frequency'):
+        frequency = statistics.get(name)
+        candidates.update(sorted(frequency, key = lambda word: -frequency[word])[: 3 * n])
+
+    ret = []
+    for word in candidates:
+        dids = data_manager.get_documents_by_term(word)
+        if dids is None:
+            continue
+        postings = deep_size(dids, set())
+        positions = 0
+        for did in dids:
+            positions += deep_size(documents[did].get_term_index(word), set())
+        ret.append((word, postings, positions))
+    ret.sort(key = lambda x: (-(x[1] + x[2]), x[0]))
+    return ret[: n]
+
+def estimate_beta(documents):
+    '''
+        Estimate the exponent of Heaps' law from the vocabulary of the first half
+        of the documents and of all of them.
+    '''
+    if len(documents) < 2:
+        return DEFAULT_BETA
+    vocabulary = set()
+    half = 0
+    for i, document in enumerate(documents):
+        if i == len(documents) // 2:
+            half = len(vocabulary)
+        vocabulary.update(document.get_terms())
+    if half == 0 or len(vocabulary) <= half:
+        return DEFAULT_BETA
+    return math.log(len(vocabulary) / half) / math.log(len(documents) / (len(documents) // 2))
+
+def project(sizes, growth, num_documents, target, beta):
+    '''
+        Project the size of every structure to a collection of target documents
+        by what it grows with: not at all for the constants, by Heaps' law for
+        the per term structures, linearly for the per document and per posting
+        ones, and by both for the matrices.
+
+        Returns:
+            dictionary, map structure names to projected bytes.
+    '''
+    scale = target / max(num_documents, 1)
+    exponents = {'constant': 0.0, 'term': beta, 'document': 1.0, 'posting': 1.0,
+                 'matrix': 1.0 + beta}
+    projected = {}
+    for name, size in sizes.items():
+        projected[name] = size * scale ** exponents[growth[name]]
+    return projected
@@ -0,0 +1,194 @@
+import heapq
+
+import numpy as np
+
+from Scorer import sorted_ids
+
+class Backend(object):
+    '''
+        Interface of a query engine, the data layout the scores of a query are
+        computed over. All the backends rank the documents exactly as the scorer
+        would, ties broken by document id, and only rank the documents containing
+        at least one query term.
+
+        A new engine subclasses Backend and is added with register_backend, it is
+        then available to create_backend and to the automatic selection.
+
+        Attrs:
+            name: str, the name used to select the backend on the command line.
+            scorers: tuple, the names of the scorers the backend supports, None
+            for all of them.
+            threaded: bool, whether the backend scores on the worker threads of the
+            scorer.
+            scorer: Scorer, the retrieval model, providing the index statistics.
+    '''
+    name = None
+    scorers = None
+    threaded = False
+
+    def __init__(self, scorer):
+        self.scorer = scorer
+
+    @classmethod
+    def supports(cls, scorer_name):
+        return cls.scorers is None or scorer_name in cls.scorers
+
+    def top(self, query, n, candidates = None):
+        '''
+            Find the n highest scored documents.
+
+            Args:
+                query: Vector, the vector instance of current query.
+                n: int, the number of documents to be found.
+                candidates: collection, the document ids to be ranked, by default
+                all the documents containing at least one of the query terms.
+
+            Returns:
+                list, containing n (did, score) tuples.
+        '''
+        raise NotImplementedError
+
+class SparseBackend(Backend):
+    '''
+        Term at a time numpy scoring over the posting lists, which are the
+        columns of the sparse document-term matrix, see Scorer.top. Supports
+        every scorer and the worker threads, its cost follows the number of
+        postings of the query terms.
+    '''
+    name = 'sparse'
+    threaded = True
+
+    def top(self, query, n, candidates = None):
+        return self.scorer.top(query, n, candidates)
+
+class DenseBackend(Backend):
+    '''
+        Dense numpy document-term matrix of the term frequencies, a query term is
+        scored as a whole column without indexing by the posting lists. Its cost
+        follows the number of documents and it holds documents * vocabulary
+        floats, so it suits collections with few documents or a dense matrix.
+    '''
+    name = 'dense'
+
+    def __init__(self, scorer):
+        Backend.__init__(self, scorer)
+        postings = scorer.statistics.get('postings')
+        frequencies = scorer.statistics.get('term_frequencies')
+        self.__num_documents = scorer.statistics.get_num_documents()
+        self.__columns = {}
+        self.__matrix = np.zeros((self.__num_documents, len(postings)), order = 'F')
+        for column, (word, dids) in enumerate(postings.items()):
+            self.__columns[word] = column
+            self.__matrix[dids, column] = frequencies[word]
+        self.__dids = np.arange(self.__num_documents, dtype = np.int32)
+
+    def top(self, query, n, candidates = None):
+        accumulator = np.zeros(self.__num_documents)
+        touched = np.zeros(self.__num_documents, dtype = bool)
+        for word in query.get_terms():
+            if word not in self.__columns:
+                continue
+            tfs = self.__matrix[:, self.__columns[word]]
+            accumulator += self.scorer.term_scores(word, self.__dids, tfs,
+                                                   self.scorer.query_weight(query, word))
+            touched |= tfs > 0
+
+        if candidates is None:
+            dids = np.flatnonzero(touched).astype(np.int32)
+        else:
+            dids = sorted_ids(candidates)
+        scores = self.scorer.finalize(accumulator[dids], dids, query)
+        order = np.lexsort((dids, -scores))[: n]
+        return [(int(dids[i]), float(scores[i])) for i in order]
+
+class DictBackend(Backend):
+    '''
+        Pure Python scoring over dictionaries, the cosine model only: the
+        postings of every term are kept as lists of (did, tf / max_tf) and the
+        scores are accumulated in a dictionary. Without the fixed cost of the
+        array operations it is the fastest for the small demo collections.
+    '''
+    name = 'dict'
+    scorers = ('cosine',)
+
+    def __init__(self, scorer):
+        Backend.__init__(self, scorer)
+        statistics = scorer.statistics
+        postings = statistics.get('postings')
+        frequencies = statistics.get('term_frequencies')
+        max_tf = statistics.get('max_tf')
+        self.__idf = statistics.get('idf')
+        self.__magnitude = statistics.get('magnitude').tolist()
+        self.__postings = {}
+        for word, dids in postings.items():
+            self.__postings[word] = list(zip(dids.tolist(),
+                                             (frequencies[word] / max_tf[dids]).tolist()))
+
+    def top(self, query, n, candidates = None):
+        accumulator = {}
+        for word in query.get_terms():
+            if word not in self.__postings:
+                continue
+            weight = self.__idf[word] * self.scorer.query_weight(query, word)
+            for did, tf in self.__postings[word]:
+                accumulator[did] = accumulator.get(did, 0.0) + tf * weight
+
+        if candidates is not None:
+            if isinstance(candidates, np.ndarray):
+                candidates = candidates.tolist()
+            accumulator = dict((did, accumulator.get(did, 0.0)) for did in candidates)
+        query_magnitude = np.sqrt(sum(weight ** 2 for weight in query.get_weights()))
+        scores = []
+        for did, score in accumulator.items():
+            norm = self.__magnitude[did] * query_magnitude
+            scores.append((-(score / norm) if norm > 0 else 0.0, did))
+        return [(did, -score) for score, did in heapq.nsmallest(n, scores)]
+
+BACKENDS = {}
+
+def register_backend(backend):
+    BACKENDS[backend.name] = backend
+    return backend
+
+for backend in (SparseBackend, DenseBackend, DictBackend):
+    register_backend(backend)
+
+# heuristic thresholds, not measured crossovers: the pure Python loop is
+# expected to win for a small index of DICT_POSTINGS postings, the dense columns
+# over the posting lists for a few thousand documents or when the average term
+# is in a large fraction of them, as long as the matrix of DENSE_CELLS floats
+# fits in memory
+DICT_POSTINGS = 20000
+DENSE_DOCUMENTS = 2000
+DENSE_DENSITY = 0.2
+DENSE_CELLS = 4000000
+
+def select_backend(scorer_name, num_documents, vocabulary, num_postings, workers = 1):
+    '''
+        Choose the backend supporting the scorer from the collection statistics:
+        the dictionaries for a small index, the dense matrix for few documents or
+        a dense matrix, the posting lists otherwise and whenever the queries are
+        scored on several workers, as only they use the threads.
+    '''
+    if workers > 1:
+        return SparseBackend.name
+    cells = num_documents * vocabulary
+    density = num_postings / max(cells, 1)
+    if num_postings <= DICT_POSTINGS and DictBackend.supports(scorer_name):
+        return DictBackend.name
+    if cells <= DENSE_CELLS and (num_documents <= DENSE_DOCUMENTS
+                                 or density >= DENSE_DENSITY):
+        return DenseBackend.name
+    return SparseBackend.name
+
+def create_backend(name, scorer):
+    if name not in BACKENDS:
+        raise ValueError('Unknown backend \'%s\', expected one of: %s'
+                         % (name, ', '.join(sorted(BACKENDS.keys()))))
+    if not BACKENDS[name].supports(scorer.name):
+        raise ValueError('Backend \'%s\' does not support the scorer \'%s\'.'
+                         % (name, scorer.name))
+    if scorer.get_workers() > 1 and not BACKENDS[name].threaded:
+        raise ValueError('Backend \'%s\' does not score on several threads, '
+                         'use the sparse backend.' % name)
+    return BACKENDS[name](scorer)
@@ -0,0 +1,121 @@
+import numpy as np
+
+from PostingList import intersect_all, difference, union
+
+class Bitmap(object):
+    '''
+        Set of document ids as a bitmap of 64 bit words, document d being bit
+        d % 64 of word d // 64. Unions, intersections and differences of bitmaps
+        are one bitwise operation per word, so their cost is a pass over
+        num_documents / 8 bytes whatever the number of documents in the sets.
+
+        Attrs:
+            words: np.array, the uint64 words.
+            num_documents: int, the number of documents of the collection.
+    '''
+    def __init__(self, words, num_documents):
+        self.words = words
+        self.num_documents = num_documents
+
+    @staticmethod
+    def empty(num_documents):
+        return Bitmap(np.zeros((num_documents + 63) // 64, dtype = np.uint64), num_documents)
+
+    @staticmethod
+    def full(num_documents):
+        bitmap = Bitmap.empty(num_documents)
+        bitmap.words[:] = np.uint64(0xffffffffffffffff)
+        if num_documents % 64 > 0:
+            bitmap.words[-1] = np.uint64((1 << (num_documents % 64)) - 1)
+        return bitmap
+
+    @staticmethod
+    def from_postings(dids, num_documents):
+        bitmap = Bitmap.empty(num_documents)
+        bitmap.add(dids)
+        return bitmap
+
+    def add(self, dids):
+        dids = np.asarray(dids, dtype = np.int64)
+        np.bitwise_or.at(self.words, dids >> 6,
+                         np.left_shift(np.uint64(1), (dids & 63).astype(np.uint64)))
+
+    def remove(self, dids):
+        dids = np.asarray(dids, dtype = np.int64)
+        np.bitwise_and.at(self.words, dids >> 6,
+                          ~np.left_shift(np.uint64(1), (dids & 63).astype(np.uint64)))
+
+    def contains(self, dids):
+        '''
+            Returns:
+                np.array, a bool for every document id of dids.
+        '''
+        dids = np.asarray(dids, dtype = np.int64)
+        bits = np.right_shift(self.words[dids >> 6], (dids & 63).astype(np.uint64))
+        return (bits & np.uint64(1)).astype(bool)
+
+    def to_array(self):
+        bits = np.unpackbits(self.words.view(np.uint8), bitorder = 'little')
+        return np.flatnonzero(bits[: self.num_documents]).astype(np.int32)
+
+    def to_list(self):
+        return self.to_array().tolist()
+
+# The document sets below are either a Bitmap or a sorted sequence of document
+# ids; a result stays a bitmap as long as a bitmap operand decides its size.
+
+def to_list(documents):
+    if isinstance(documents, Bitmap):
+        return documents.to_list()
+    return list(documents)
+
+def to_array(documents):
+    if isinstance(documents, Bitmap):
+        return documents.to_array()
+    return np.asarray(documents, dtype = np.int32)
+
+def set_union(sets, num_documents):
+    bitmaps = [documents for documents in sets if isinstance(documents, Bitmap)]
+    lists = [documents for documents in sets if not isinstance(documents, Bitmap)]
+    if len(bitmaps) == 0:
+        return union(lists)
+    words = bitmaps[0].words.copy()
+    for bitmap in bitmaps[1 :]:
+        np.bitwise_or(words, bitmap.words, out = words)
+    ret = Bitmap(words, num_documents)
+    for documents in lists:
+        if len(documents) > 0:
+            ret.add(documents)
+    return ret
+
+def set_intersection(sets, num_documents):
+    bitmaps = [documents for documents in sets if isinstance(documents, Bitmap)]
+    lists = [documents for documents in sets if not isinstance(documents, Bitmap)]
+    if len(bitmaps) == 0:
+        return intersect_all(lists)
+    words = bitmaps[0].words.copy()
+    for bitmap in bitmaps[1 :]:
+        np.bitwise_and(words, bitmap.words, out = words)
+    ret = Bitmap(words, num_documents)
+    if len(lists) == 0:
+        return ret
+    # the rare terms decide the size, test their common documents against the bits
+    documents = np.asarray(intersect_all(lists), dtype = np.int32)
+    if len(documents) == 0:
+        return []
+    return documents[ret.contains(documents)].tolist()
+
+def set_difference(documents, excluded, num_documents):
+    if isinstance(documents, Bitmap):
+        if isinstance(excluded, Bitmap):
+            return Bitmap(documents.words & ~excluded.words, num_documents)
+        ret = Bitmap(documents.words.copy(), num_documents)
+        if len(excluded) > 0:
+            ret.remove(excluded)
+        return ret
+    if isinstance(excluded, Bitmap):
+        documents = np.asarray(documents, dtype = np.int32)
+        if len(documents) == 0:
+            return []
+        return documents[~excluded.contains(documents)].tolist()
+    return difference(documents, excluded)
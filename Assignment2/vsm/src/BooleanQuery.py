@@ -0,0 +1,191 @@
+from Bitmap import Bitmap, to_list, set_union, set_intersection, set_difference
+from TermDictionary import has_wildcard
+
+OPERATORS = ('AND', 'OR', 'NOT')
+
+class BooleanNode(object):
+    '''
+        Node of a parsed boolean query.
+
+        Attrs:
+            operator: str, one of 'TERM', 'AND', 'OR', 'NOT'.
+            term: str, the preprocessed keyword if operator is 'TERM'.
+            children: list, the operands of 'AND', 'OR' and 'NOT'.
+    '''
+    def __init__(self, operator, term = None, children = None):
+        self.operator = operator
+        self.term = term
+        self.children = children if children is not None else []
+
+class BooleanQuery(object):
+    '''
+        Boolean query with AND, OR, NOT and parentheses, e.g.
+        'bank AND (debt OR loan) AND NOT brazil'. Adjacent operands without an
+        operator are joined by AND, a wildcard keyword such as 'bank*' is the OR
+        of its expansions. Operators are only recognized in upper case so that
+        'not' and 'and' in free text are treated as ordinary words.
+
+        Attrs:
+            root: BooleanNode, the parsed query, None if no keyword remained
+            after preprocessing.
+            terms: list, the keywords appearing outside of a NOT, used to rank
+            the matched documents.
+            missing: list, the keywords which are not in the vocabulary.
+    '''
+    def __init__(self, text, normalize, expand = None):
+        self.__tokens = self.tokenize(text)
+        self.__pos = 0
+        self.__normalize = normalize
+        self.__expand = expand
+        self.__terms = []
+        self.missing = []
+        self.root = self.parse_or()
+        if self.__pos < len(self.__tokens):
+            raise ValueError('Unexpected token \'%s\' in boolean query.'
+                             % self.__tokens[self.__pos])
+        self.collect_terms(self.root, False)
+
+    def tokenize(self, text):
+        tokens = []
+        for chunk in text.replace('(', ' ( ').replace(')', ' ) ').split():
+            tokens.append(chunk)
+        return tokens
+
+    def peek(self):
+        if self.__pos < len(self.__tokens):
+            return self.__tokens[self.__pos]
+        return None
+
+    def combine(self, operator, children):
+        children = [child for child in children if child is not None]
+        if len(children) == 0:
+            return None
+        if len(children) == 1:
+            return children[0]
+        return BooleanNode(operator, children = children)
+
+    def parse_or(self):
+        children = [self.parse_and()]
+        while self.peek() == 'OR':
+            self.__pos += 1
+            children.append(self.parse_and())
+        return self.combine('OR', children)
+
+    def parse_and(self):
+        children = [self.parse_not()]
+        while self.peek() is not None and self.peek() not in ('OR', ')'):
+            if self.peek() == 'AND':
+                self.__pos += 1
+            children.append(self.parse_not())
+        return self.combine('AND', children)
+
+    def parse_not(self):
+        if self.peek() == 'NOT':
+            self.__pos += 1
+            child = self.parse_not()
+            if child is None:
+                return None
+            return BooleanNode('NOT', children = [child])
+        return self.parse_primary()
+
+    def parse_primary(self):
+        token = self.peek()
+        if token is None or token in OPERATORS or token == ')':
+            raise ValueError('Missing keyword in boolean query.')
+        self.__pos += 1
+
+        if token == '(':
+            node = self.parse_or()
+            if self.peek() != ')':
+                raise ValueError('Unbalanced parentheses in boolean query.')
+            self.__pos += 1
+            return node
+
+        if has_wildcard(token) and self.__expand is not None:
+            words = self.__expand(token)
+            if len(words) == 0:
+                return BooleanNode('TERM', term = token.lower())
+            return self.combine('OR', [BooleanNode('TERM', term = word) for word in words])
+
+        words = self.__normalize(token)
+        if len(words) == 0:
+            return None
+        return self.combine('AND', [BooleanNode('TERM', term = word) for word in words])
+
+    def collect_terms(self, node, negated):
+        if node is None:
+            return
+        if node.operator == 'TERM':
+            if not negated and node.term not in self.__terms:
+                self.__terms.append(node.term)
+            return
+        for child in node.children:
+            self.collect_terms(child, negated != (node.operator == 'NOT'))
+
+    def get_terms(self):
+        return self.__terms
+
+    def evaluate(self, inverted_file, num_documents):
+        '''
+            Evaluate the query over the sorted posting lists of the inverted file,
+            the dense terms being combined as bitmaps.
+
+            Args:
+                inverted_file: InvertedFile, the index to be searched.
+                num_documents: int, the number of documents, needed to complement
+                a query which is a pure negation.
+
+            Returns:
+                list, the sorted ids of the matched documents.
+        '''
+        self.missing = []
+        if self.root is None:
+            return []
+        if self.root.operator == 'NOT':
+            return to_list(self.complement(self.root, inverted_file, num_documents))
+        return to_list(self.evaluate_node(self.root, inverted_file, num_documents))
+
+    def complement(self, node, inverted_file, num_documents):
+        excluded = self.evaluate_node(node.children[0], inverted_file, num_documents)
+        return set_difference(Bitmap.full(num_documents), excluded, num_documents)
+
+    def evaluate_node(self, node, inverted_file, num_documents):
+        if node.operator == 'TERM':
+            postings = inverted_file.get_set(node.term)
+            if postings is None:
+                if node.term not in self.missing:
+                    self.missing.append(node.term)
+                return []
+            return postings
+
+        if node.operator == 'OR':
+            lists = []
+            for child in node.children:
+                if child.operator == 'NOT':
+                    lists.append(self.complement(child, inverted_file, num_documents))
+                else:
+                    lists.append(self.evaluate_node(child, inverted_file, num_documents))
+            return set_union(lists, num_documents)
+
+        if node.operator == 'NOT':
+            return self.complement(node, inverted_file, num_documents)
+
+        positive = []
+        negative = []
+        for child in node.children:
+            if child.operator == 'NOT':
+                negative.append(self.evaluate_node(child.children[0], inverted_file,
+                                                   num_documents))
+            else:
+                positive.append(self.evaluate_node(child, inverted_file, num_documents))
+
+        if len(positive) == 0:
+            ret = Bitmap.full(num_documents)
+        else:
+            ret = set_intersection(positive, num_documents)
+        for excluded in negative:
+            if not isinstance(ret, Bitmap) and len(ret) == 0:
+                break
+            ret = set_difference(ret, excluded, num_documents)
+
+        return ret
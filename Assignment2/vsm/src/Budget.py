@@ -0,0 +1,49 @@
+import time
+
+class Budget(object):
+    '''
+        The limits of the evaluation of one query: the time it may take from
+        start() and the number of postings it may process, either None for no
+        limit. The evaluation asks for an allowance before every chunk of
+        postings, spends what it processed, and stops with an approximate result
+        once nothing is allowed any more.
+
+        Attrs:
+            seconds: float, the time allowed to the query, None for no limit.
+            postings: int, the largest number of postings processed, None for no
+            limit.
+            deadline: float, the time.perf_counter() the query must end by.
+            processed: int, the number of postings processed since start().
+    '''
+    def __init__(self, seconds = None, postings = None):
+        self.__seconds = seconds
+        self.__postings = postings
+        self.__deadline = None
+        self.__processed = 0
+
+    def get_processed(self):
+        return self.__processed
+
+    def start(self):
+        if self.__seconds is not None:
+            self.__deadline = time.perf_counter() + self.__seconds
+        self.__processed = 0
+        return self
+
+    def allowance(self, count):
+        '''
+            Returns:
+                int, how many of the next count postings may be processed, 0 once
+                the deadline has passed or the postings are spent.
+        '''
+        if self.__deadline is not None and time.perf_counter() >= self.__deadline:
+            return 0
+        if self.__postings is not None:
+            return max(0, min(count, self.__postings - self.__processed))
+        return count
+
+    def spend(self, count):
+        self.__processed += count
+
+    def exhausted(self):
+        return self.allowance(1) == 0
@@ -0,0 +1,115 @@
+import time
+import secrets
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+class Cursor(object):
+    '''
+        The scored documents of one query, ranked lazily: the documents not
+        returned yet stay in an unsorted pool, and whenever a page needs more
+        ranked documents the next chunk is selected from the pool by partition
+        and only that chunk is sorted. Chunks double with the number of ranked
+        documents, so paging through the first k results costs a few passes over
+        the pool instead of a full sort or a new scoring pass per page.
+
+        Attrs:
+            dids: np.array, the document ids of the pool.
+            scores: np.array, the scores aligned with dids.
+            ranked: list, the (did, score) tuples selected so far, best first, ties
+            broken by document id.
+            position: int, the number of ranked documents already returned.
+    '''
+    def __init__(self, dids, scores):
+        self.__dids = dids
+        self.__scores = scores
+        self.__ranked = []
+        self.__position = 0
+
+    def get_position(self):
+        return self.__position
+
+    def exhausted(self):
+        return self.__position >= len(self.__ranked) and len(self.__dids) == 0
+
+    def select(self, k):
+        '''
+            Move the k best documents of the pool to the end of ranked.
+        '''
+        dids = self.__dids
+        scores = self.__scores
+        if k < len(dids):
+            threshold = -np.partition(-scores, k - 1)[k - 1]
+            selected = np.flatnonzero(scores >= threshold)
+        else:
+            selected = np.arange(len(dids))
+        selected = selected[np.lexsort((dids[selected], -scores[selected]))[: k]]
+        self.__ranked.extend((int(dids[i]), float(scores[i])) for i in selected)
+
+        remained = np.ones(len(dids), dtype = bool)
+        remained[selected] = False
+        self.__dids = dids[remained]
+        self.__scores = scores[remained]
+
+    def fetch(self, size):
+        '''
+            Returns:
+                list, the next size (did, score) tuples.
+        '''
+        while len(self.__ranked) - self.__position < size and len(self.__dids) > 0:
+            self.select(max(size, len(self.__ranked)))
+        page = self.__ranked[self.__position : self.__position + size]
+        self.__position += len(page)
+        return page
+
+class CursorCache(object):
+    '''
+        Open cursors by id, at most capacity of them, a cursor being dropped ttl
+        seconds after its last use or when the least recently used has to make
+        room for a new one.
+    '''
+    def __init__(self, capacity = 1000, ttl = 300.0):
+        self.__capacity = capacity
+        self.__ttl = ttl
+        self.__cursors = OrderedDict()
+        self.__lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.__cursors)
+
+    def expire(self, now):
+        while len(self.__cursors) > 0:
+            cursor_id, (expires, cursor) = next(iter(self.__cursors.items()))
+            if expires > now and len(self.__cursors) <= self.__capacity:
+                break
+            del self.__cursors[cursor_id]
+
+    def open(self, cursor):
+        with self.__lock:
+            cursor_id = secrets.token_hex(8)
+            now = time.time()
+            self.__cursors[cursor_id] = (now + self.__ttl, cursor)
+            self.expire(now)
+            return cursor_id
+
+    def fetch(self, cursor_id, size):
+        '''
+            Fetch the next page of an open cursor, which is closed once exhausted.
+
+            Returns:
+                page: list, the next size (did, score) tuples.
+                cursor_id: str, the id of the cursor for the next page, None if
+                there are no more documents.
+        '''
+        with self.__lock:
+            now = time.time()
+            self.expire(now)
+            if cursor_id not in self.__cursors:
+                raise ValueError('Unknown or expired cursor \'%s\'' % cursor_id)
+            expires, cursor = self.__cursors.pop(cursor_id)
+            page = cursor.fetch(size)
+            if cursor.exhausted():
+                return page, None
+            self.__cursors[cursor_id] = (now + self.__ttl, cursor)
+            return page, cursor_id
@@ -1,7 +1,29 @@
 import math
 
+import numpy as np
+
 from InvertedFile import InvertedFile
+from TermDictionary import TermDictionary
+from IndexStatistics import IndexStatistics
+from Scorer import SCORERS, create_scorer
+from Backend import BACKENDS, SparseBackend, create_backend, select_backend
+from ImpactIndex import ImpactIndex
 from QueryResult import QueryResult
+from PagedIndex import PagedDocuments
+from Cursor import Cursor, CursorCache
+from Budget import Budget
+
+def check_options(scorer, index = 'document', backend = 'auto'):
+    '''
+        Raise the ValueError an index with these options would raise when built,
+        without building it.
+    '''
+    if scorer in SCORERS and index == 'impact' and not SCORERS[scorer].supports_impacts():
+        raise ValueError('Scorer \'%s\' does not support impact ordered postings.'
+                         % scorer)
+    if backend in BACKENDS and not BACKENDS[backend].supports(scorer):
+        raise ValueError('Backend \'%s\' does not support the scorer \'%s\'.'
+                         % (backend, scorer))
 
 class DataManager(object):
     '''
@@ -9,20 +31,148 @@ class DataManager(object):
 
         Attrs:
             documents: list, storing all the documents in the system.
-            inverted_file: InvertedFile, the inverted file index for the documents.
+            inverted_file: InvertedFile, the inverted file index for the documents,
+            the keywords in many documents also kept as bitmaps.
+            dictionary: TermDictionary, the sorted vocabulary for wildcard expansion
+            and spelling suggestions.
+            statistics: IndexStatistics, the precomputed statistics of the index.
+            scorer: Scorer, the retrieval model ranking the documents.
+            backend: Backend, the query engine computing the scores of the
+            scorer, chosen from the collection statistics when backend is 'auto'.
+            impact_index: ImpactIndex, the impact ordered postings, None if queries
+            are evaluated over the document ordered inverted file.
+            budget: int, the largest number of postings a query may process, None
+            for no limit.
+            deadline: float, the number of seconds a query may take, None for no
+            limit. A query with a budget or a deadline is evaluated in decreasing
+            idf order and may return an approximate result, see Scorer.top_budget.
+            stopwords: frozenset, the keywords skipped when the candidate documents
+            are generated, their weights still count in the scores.
+            cursors: CursorCache, the scored documents of the paged queries.
+            clusters: np.array, the representative of the near-duplicate cluster
+            of every document, only the best scored document of a cluster being
+            ranked, None to rank them all.
+            related: RelatedTerms, the related keywords the ranked queries are
+            expanded with, None for no expansion.
+            unpruned: DataManager, the index this one is a pruned copy of, None
+            if it is not pruned. Its vocabulary and posting lists are the ones
+            reported and displayed, a keyword whose postings were all pruned
+            being still known.
+
+        The collection wide statistics (collection_size, document_frequency, ...)
+        can be given in collection when the documents are only one shard of the
+        collection, see IndexStatistics. The documents may also be the
+        PagedDocuments of an index file, in which case collection holds all the
+        statistics and every document is weighted when it is loaded.
     '''
-    def __init__(self, word_file_map, documents):
+    def __init__(self, word_file_map, documents, scorer = 'cosine', index = 'document',
+                 budget = None, collection = None, workers = 1, stopwords = (),
+                 backend = 'auto', clusters = None, deadline = None, unpruned = None):
+        check_options(scorer, index, backend)
         self.__documents = documents
-        self.__inverted_file = InvertedFile(word_file_map)
+        self.__clusters = clusters
+        self.__related = None
+        self.__stopwords = frozenset(stopwords)
+        self.__unpruned = unpruned
+        paged = isinstance(documents, PagedDocuments)
+        if unpruned is not None:
+            self.__dictionary = unpruned.get_dictionary()
+        else:
+            self.__dictionary = TermDictionary(
+                word_file_map, frequency = collection['document_frequency'] if paged else None)
+        self.__statistics = IndexStatistics(word_file_map, documents, collection)
+        self.__inverted_file = InvertedFile(word_file_map, self.__statistics)
+        self.__scorer = create_scorer(scorer, self.__statistics)
+        self.__scorer.set_workers(workers)
+        if backend == 'auto':
+            if paged:
+                # the other backends would read the whole index into memory
+                backend = SparseBackend.name
+            else:
+                document_frequency = self.__statistics.get('document_frequency')
+                backend = select_backend(scorer, len(documents), len(document_frequency),
+                                         sum(document_frequency.values()), workers)
+        self.__backend = create_backend(backend, self.__scorer)
+        self.__cursors = CursorCache()
+        self.__impact_index = None
+        self.__budget = budget
+        self.__deadline = deadline
+        if index == 'impact':
+            self.__impact_index = ImpactIndex(self.__scorer)
+
+        if paged:
+            documents.set_weighting(self.set_weights)
+        else:
+            self.set_all_weights()
+
+    def set_weights(self, document):
+        idf_map = self.__statistics.get('idf')
+        for word in document.get_terms():
+            idf = idf_map[word]
+            max_tf = document.get_max_tf()
+            tf = document.get_tf(word)
+            weight = tf / max_tf * idf
+            document.set_weight(word, weight)
 
+    def set_all_weights(self):
+        '''
+            Weight every document from the weights statistic, computed over the
+            flat triplets of the collection in a few array passes.
+        '''
+        weights = self.__statistics.get('weights').tolist()
+        start = 0
         for document in self.__documents:
-            did = document.get_id()
-            for word in document.get_terms():
-                idf = math.log(len(documents) / len(word_file_map[word]), 2)
-                max_tf = document.get_max_tf()
-                tf = document.get_tf(word)
-                weight = tf / max_tf * idf
-                self.__documents[did].set_weight(word, weight)
+            end = start + len(document.get_terms())
+            document.set_weights(weights[start : end])
+            start = end
+
+    def get_documents(self):
+        return self.__documents
+
+    def get_statistics(self):
+        return self.__statistics
+
+    def get_dictionary(self):
+        return self.__dictionary
+
+    def get_scorer(self):
+        return self.__scorer
+
+    def get_backend(self):
+        return self.__backend
+
+    def get_stopwords(self):
+        return self.__stopwords
+
+    def get_clusters(self):
+        return self.__clusters
+
+    def get_deadline(self):
+        return self.__deadline
+
+    def get_related(self):
+        return self.__related
+
+    def set_related(self, related):
+        self.__related = related
+
+    def expand_query(self, query):
+        '''
+            Add the keywords related to the query keywords to the query, see
+            RelatedTerms.expand.
+
+            Returns:
+                list, the (keyword, weight) tuples added, empty without related
+                keywords.
+        '''
+        if self.__related is None:
+            return []
+        return self.__related.expand(query)
+
+    def close(self):
+        self.__scorer.close()
+        if self.__unpruned is not None:
+            self.__unpruned.close()
 
     def magnitude(self, vector):
         accumulate = 0
@@ -38,27 +188,168 @@ class DataManager(object):
         sim /= self.magnitude(vec1) * self.magnitude(vec2)
         return sim
 
-    def get_query_result(self, query):
+    def make_budget(self, deadline = None, budget = None):
+        '''
+            Start the Budget of a query, with the deadline and budget of the index
+            unless given.
+
+            Returns:
+                Budget, None if the query has no limit.
+        '''
+        if deadline is None:
+            deadline = self.__deadline
+        if budget is None:
+            budget = self.__budget
+        if deadline is None and budget is None:
+            return None
+        return Budget(deadline, budget).start()
+
+    def get_query_result(self, query, deadline = None, budget = None):
         '''
             Compute and generate query result.
 
             Args:
                 query: Vector, the vector instance of current query.
+                deadline: float, the seconds the query may take, by default the
+                deadline of the index.
+                budget: int, the postings the query may process, by default the
+                budget of the index.
 
             Returns:
                 ret: list, list containing n QueryResult instance. According to the
                 requirement, the value of n here is 3.
         '''
-        ret = []
-        rank_list = {}
+        budget = self.make_budget(deadline, budget)
+        if self.__impact_index is not None or budget is not None:
+            self.report_missing_terms(query.get_terms())
+            result, approximate = self.collapse(lambda k: self.rank(query, k, budget), 3)
+            return self.build_results(result, approximate)
+
         candidates = self.get_documents_by_terms(query.get_terms())
-        for did in candidates:
-            document = self.__documents[did]
-            sim = self.similarity(document, query)
-            rank_list[did] = sim
+        result, approximate = self.collapse(
+            lambda k: (self.__backend.top(query, k, candidates), False), 3)
+        return self.build_results(result)
 
-        result = sorted(rank_list.items(), key = lambda x: x[1], reverse = True)[:3]
+    def top(self, query, n, deadline = None, budget = None, generating = None):
+        '''
+            Find the n highest scored documents without displaying anything, see
+            get_query_result for deadline and budget. The candidate documents are
+            those of the generating keywords, by default the query keywords left
+            by skip_stopwords; a shard is given those of the whole collection.
 
+            Returns:
+                result: list, containing n (did, score) tuples.
+                approximate: bool, True if the evaluation was cut by the budget.
+        '''
+        budget = self.make_budget(deadline, budget)
+        return self.collapse(lambda k: self.rank(query, k, budget, generating), n)
+
+    def collapse(self, rank, n):
+        '''
+            Keep the best scored document of every near-duplicate cluster among
+            the ranking of rank(k), asking for twice as many documents as long as
+            the duplicates leave fewer than n. An approximate ranking is not asked
+            again, its budget is spent.
+
+            Args:
+                rank: function, returns the k highest scored documents and whether
+                the ranking is approximate.
+        '''
+        if self.__clusters is None:
+            return rank(n)
+        k = n
+        while True:
+            result, approximate = rank(k)
+            kept = []
+            seen = set()
+            for did, score in result:
+                if self.__clusters[did] in seen:
+                    continue
+                seen.add(self.__clusters[did])
+                kept.append((did, score))
+            if len(kept) >= n or len(result) < k or approximate:
+                return kept[: n], approximate
+            k *= 2
+
+    def rank(self, query, n, budget = None, generating = None):
+        if self.__impact_index is not None:
+            return self.__impact_index.top(query, n, budget)
+        words = query.get_terms()
+        if generating is None and len(self.__stopwords) > 0:
+            generating = self.skip_stopwords(words)
+        if budget is not None:
+            skip = frozenset()
+            if generating is not None:
+                skip = frozenset(words) - frozenset(generating)
+            return self.__scorer.top_budget(query, n, budget, skip)
+        if generating is None:
+            return self.__backend.top(query, n), False
+        candidates = self.__inverted_file.get_union(generating)
+        return self.__backend.top(query, n, candidates), False
+
+    def search_page(self, query, size):
+        '''
+            Score a query once and return its first page of documents together
+            with a cursor for the next pages, see next_page. With clusters only
+            the best document of every near-duplicate cluster is paged.
+
+            Returns:
+                page: list, containing size (did, score) tuples.
+                cursor_id: str, the cursor of the next page, None if there is none.
+        '''
+        candidates = None
+        if len(self.__stopwords) > 0:
+            candidates = self.get_candidates(query.get_terms())
+        dids, scores = self.__scorer.score(query, candidates)
+        if self.__clusters is not None:
+            # the best scored document of every cluster, ties broken by document
+            # id as in the pages
+            order = np.lexsort((dids, -scores))
+            _, first = np.unique(self.__clusters[dids[order]], return_index = True)
+            kept = order[first]
+            dids, scores = dids[kept], scores[kept]
+        return self.__cursors.fetch(self.__cursors.open(Cursor(dids, scores)), size)
+
+    def next_page(self, cursor_id, size):
+        '''
+            Return the next page of a query from its cursor without scoring it
+            again. Raises ValueError if the cursor is unknown or expired.
+        '''
+        return self.__cursors.fetch(cursor_id, size)
+
+    def get_boolean_result(self, boolean_query, query, rank = True, n = 3, report = True):
+        '''
+            Compute and generate the result of a boolean query.
+
+            Args:
+                boolean_query: BooleanQuery, the parsed boolean query.
+                query: Vector, the vector of the non-negated query terms, used to
+                rank the matched documents.
+                rank: bool, rank the matched documents by the scorer if True,
+                otherwise keep them in document id order.
+                n: int, the number of results to be generated.
+                report: bool, display the keywords missing from the vocabulary.
+
+            Returns:
+                ret: list, containing at most n QueryResult instances.
+                num_matched: int, the total number of matched documents.
+        '''
+        matched = boolean_query.evaluate(self.__inverted_file, len(self.__documents))
+        if report:
+            for word in boolean_query.missing:
+                if word not in self.__dictionary:
+                    self.report_missing(word)
+
+        if rank:
+            result = self.__backend.top(query, n, matched)
+        else:
+            dids, scores = self.__scorer.score(query, matched[:n])
+            result = [(int(did), float(score)) for did, score in zip(dids, scores)]
+
+        return self.build_results(result), len(matched)
+
+    def build_results(self, result, approximate = False):
+        ret = []
         for did, sim in result:
             document = self.__documents[did]
             magnitude = self.magnitude(document)
@@ -68,11 +359,13 @@ class DataManager(object):
             for word, weight in words:
                 dids = self.get_documents_by_term(word)
                 postinglist.append([word, dids])
-            ret.append(QueryResult(did, postinglist, num_terms, magnitude, sim))
+            ret.append(QueryResult(did, postinglist, num_terms, magnitude, sim, approximate))
 
         return ret
 
     def get_documents_by_term(self, word):
+        if self.__unpruned is not None:
+            return self.__unpruned.get_documents_by_term(word)
         return self.__inverted_file.get_documents(word)
 
     def get_documents_by_terms(self, words):
@@ -84,23 +377,47 @@ class DataManager(object):
                 words: list, containing the preprocessed words in query text.
 
             Returns:
-                candidates: set, containing the retrieved document ids.
+                candidates: np.array, containing the sorted retrieved document ids.
         '''
-        candidates = set()
-        have_illegal_words = False
-        illegal_words = []
-        for word in words:
+        words = self.skip_stopwords(words)
+        self.report_missing_terms(words)
+
+        return self.__inverted_file.get_union(words)
+
+    def get_candidates(self, words):
+        return self.__inverted_file.get_union(self.skip_stopwords(words))
+
+    def skip_stopwords(self, words):
+        '''
+            Drop the stopwords from the query words generating the candidate
+            documents, unless no other query word is in the vocabulary.
+        '''
+        remained = [word for word in words if word not in self.__stopwords]
+        for word in remained:
             if self.__inverted_file.exist(word):
-                candidates.update(self.__inverted_file.get_documents(word))
-            else:
-                have_illegal_words = True
-                illegal_words.append(word)
+                return remained
+        return list(words)
+
+    def report_missing_terms(self, words):
+        for word in words:
+            if word not in self.__dictionary:
+                self.report_missing(word)
+
+    def report_missing(self, word):
+        print('\'%s\' has not been collected in the vocabulary.' % word, end = '')
+        suggestions = self.__dictionary.suggest(word)
+        if len(suggestions) > 0:
+            print(' Did you mean: %s?' % ', '.join(suggestions), end = '')
+        print()
+
+    def expand_terms(self, pattern):
+        return self.__dictionary.expand(pattern)
 
-        if have_illegal_words:
-            for word in illegal_words:
-                print('\'%s\' has not been collected in the vocabulary.' % word)
+    def suggest_terms(self, word, n = 3):
+        return self.__dictionary.suggest(word, n)
 
-        return candidates
+    def distance(self, word1, word2):
+        return self.__dictionary.distance(word1, word2, max(len(word1), len(word2)))
 
     def display_posting_list(self, word, dids):
         for did in dids:
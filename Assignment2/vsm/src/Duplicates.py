@@ -0,0 +1,116 @@
+import numpy as np
+
+DUPLICATE_MODES = ('drop', 'collapse')
+
+# signature of a document without any keyword, above every 32 bit hash value
+EMPTY = np.uint64(1 << 32)
+
+def shingle_keys(texts, size = 3):
+    '''
+        One 64 bit key for every run of size consecutive words of the documents,
+        a document shorter than size being a single run padded at its end.
+
+        Returns:
+            keys: np.array, the uint64 keys of all the documents, concatenated.
+            counts: np.array, the number of keys of every document.
+    '''
+    word_ids = {}
+    ids = []
+    counts = []
+    pad = [0] * (size - 1)
+    for words in texts:
+        ids.extend(word_ids.setdefault(word, len(word_ids) + 1) for word in words)
+        ids.extend(pad)
+        counts.append(max(len(words) - size + 1, 1) if len(words) > 0 else 0)
+    ids = np.array(ids, dtype = np.uint64)
+    counts = np.array(counts, dtype = np.int64)
+
+    # the runs start at every word of a document but its size - 1 last ones
+    lengths = np.array([len(words) for words in texts], dtype = np.int64) + size - 1
+    starts = np.cumsum(lengths) - lengths
+    offsets = np.repeat(starts, counts) + (np.arange(counts.sum())
+                                           - np.repeat(np.cumsum(counts) - counts, counts))
+    base = np.uint64(len(word_ids) + 1)
+    keys = np.zeros(len(offsets), dtype = np.uint64)
+    for i in range(size):
+        keys = keys * base + ids[offsets + i]
+    return keys, counts
+
+def minhash_signatures(texts, num_hashes = 128, size = 3, seed = 0, batch = 32768):
+    '''
+        MinHash signature of every document over its runs of size words: for
+        each of num_hashes random multiply-shift hash functions, the smallest
+        hash of the runs of the document. Two documents agree on a hash with a
+        probability close to the Jaccard similarity of their sets of runs.
+
+        Args:
+            texts: list, the preprocessed words of every document.
+            batch: int, the number of runs hashed at once, bounding the memory to
+            num_hashes x batch hashes.
+
+        Returns:
+            np.array, a num_documents x num_hashes matrix of uint64 below 2^32,
+            the rows of the empty documents being all EMPTY.
+    '''
+    generator = np.random.RandomState(seed)
+    # the hash is the top 32 bits of a * key + b modulo 2^64, a odd
+    a = (generator.randint(0, 1 << 62, size = num_hashes).astype(np.uint64)
+         << np.uint64(2)) | np.uint64(1)
+    b = generator.randint(0, 1 << 62, size = num_hashes).astype(np.uint64) << np.uint64(2)
+    signatures = np.full((len(texts), num_hashes), EMPTY, dtype = np.uint64)
+
+    keys, counts = shingle_keys(texts, size)
+    dids = np.flatnonzero(counts > 0)
+    ends = np.cumsum(counts[dids])
+    starts = ends - counts[dids]
+    first = 0
+    while first < len(dids):
+        # the next documents whose runs fit in the batch, at least one
+        last = max(first + 1, int(np.searchsorted(ends, starts[first] + batch, side = 'right')))
+        segment = keys[starts[first] : ends[last - 1]]
+        values = (a[:, None] * segment[None, :] + b[:, None]) >> np.uint64(32)
+        signatures[dids[first : last]] = np.minimum.reduceat(
+            values, starts[first : last] - starts[first], axis = 1).T
+        first = last
+    return signatures
+
+def find_duplicates(signatures, bands = 16, threshold = 0.8):
+    '''
+        Cluster the near-duplicate documents by locality sensitive hashing: the
+        signatures are cut into bands of rows, documents sharing all the rows of
+        a band fall in the same bucket, and a document is joined to the first
+        document of its bucket when their signatures agree on at least threshold
+        of the hashes. Every band is bucketed by one sort, so the cost is about
+        linear in the documents.
+
+        Returns:
+            np.array, the representative of the cluster of every document, the
+            smallest document id in it, a document without duplicate being its
+            own representative.
+    '''
+    num_documents, num_hashes = signatures.shape
+    rows = num_hashes // bands
+    parent = np.arange(num_documents)
+
+    def find(did):
+        while parent[did] != did:
+            parent[did] = parent[parent[did]]
+            did = parent[did]
+        return did
+
+    empty = np.all(signatures == EMPTY, axis = 1)
+    for band in range(bands):
+        keys = np.ascontiguousarray(signatures[:, band * rows : (band + 1) * rows])
+        keys = keys.view(np.dtype((np.void, rows * signatures.itemsize))).ravel()
+        # the first document of the bucket of every document
+        _, first, inverse = np.unique(keys, return_index = True, return_inverse = True)
+        first = first[inverse.ravel()]
+        dids = np.flatnonzero((first != np.arange(num_documents)) & ~empty)
+        if len(dids) == 0:
+            continue
+        agreement = np.mean(signatures[first[dids]] == signatures[dids], axis = 1)
+        for did in dids[agreement >= threshold]:
+            root, other = find(first[did]), find(did)
+            parent[max(root, other)] = min(root, other)
+
+    return np.array([find(did) for did in range(num_documents)])
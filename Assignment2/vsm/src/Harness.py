@@ -0,0 +1,330 @@
+#!/usr/bin/python
+
+import io
+import os
+import sys
+import time
+import tempfile
+import argparse
+import importlib.util
+from contextlib import redirect_stdout
+
+from VectorSpace import VSM
+from ShardedVectorSpace import ShardedVSM
+
+OTHER_SOLUTIONS_FOLDER = '../../other_solutions'
+OUTPUT_FOLDER = '../output'
+
+class Engine(object):
+    '''
+        Adapter running one implementation of the vector space model for the
+        harness. Every engine preprocesses the raw query text itself, unless the
+        harness shares the preprocessing of this program, and reports documents
+        numbered from 1, whatever its own numbering is.
+
+        Attrs:
+            name: str, the name of the engine on the command line.
+            id_offset: int, added to the document ids of the engine to number
+            them from 1.
+            max_k: int, the largest number of results the engine can produce,
+            None for no limit.
+    '''
+    name = None
+    id_offset = 0
+    max_k = None
+
+    def build(self, collection):
+        raise NotImplementedError
+
+    def pre_process(self, line):
+        raise NotImplementedError
+
+    def search(self, words, k):
+        '''
+            Returns:
+                list, containing k (did, score) tuples, did numbered from 1.
+        '''
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+class SourceEngine(Engine):
+    '''
+        The VSM of this program, with the stopwords derived from max_df and
+        min_idf.
+    '''
+    name = 'src'
+    id_offset = 1
+
+    def __init__(self, scorer = 'cosine', max_df = None, min_idf = None):
+        self.scorer = scorer
+        self.max_df = max_df
+        self.min_idf = min_idf
+
+    def build(self, collection):
+        self.__vsm = VSM(collection, self.scorer, max_df = self.max_df,
+                         min_idf = self.min_idf)
+
+    def pre_process(self, line):
+        return self.__vsm.pre_process(line)
+
+    def search(self, words, k):
+        result, approximate = self.__vsm.search(words, k)
+        return [(did + self.id_offset, score) for did, score in result]
+
+class ShardedEngine(SourceEngine):
+    '''
+        The VSM of this program split into shards served by worker processes,
+        which must rank as the single process does.
+    '''
+    name = 'sharded'
+    num_shards = 3
+
+    def build(self, collection):
+        self.__vsm = ShardedVSM(collection, self.num_shards, self.scorer,
+                                max_df = self.max_df, min_idf = self.min_idf)
+
+    def pre_process(self, line):
+        return self.__vsm.pre_process(line)
+
+    def search(self, words, k):
+        return [(did + self.id_offset, score) for did, score, *others
+                in self.__vsm.search(words, k)]
+
+    def close(self):
+        self.__vsm.close()
+
+class ScriptEngine(Engine):
+    '''
+        A single file solution of other_solutions, which only produces the top
+        three documents, numbers the documents from 0 and does not lowercase the
+        keywords.
+    '''
+    id_offset = 1
+    max_k = 3
+    script = None
+
+    def build(self, collection):
+        spec = importlib.util.spec_from_file_location(
+            'harness_%s' % self.name, '%s/%s' % (OTHER_SOLUTIONS_FOLDER, self.script))
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        self.module = module
+        self.engine = module.VSM(collection)
+
+    def pre_process(self, line):
+        return self.engine.pre_process(line)
+
+    def get_query_result(self, words):
+        raise NotImplementedError
+
+    def search(self, words, k):
+        with redirect_stdout(io.StringIO()):
+            query_result = self.get_query_result(words)
+        return [(result.get_id() + self.id_offset, float(result.get_sim_score()))
+                for result in query_result[: k]]
+
+class DictScriptEngine(ScriptEngine):
+    name = 'vsm'
+    script = 'vsm.py'
+
+    def get_query_result(self, words):
+        query = self.module.Vector(words)
+        for word in query.get_terms():
+            query.set_weight(word, query.get_tf(word))
+        return self.engine.data_manager.get_query_result(query)
+
+class NumpyScriptEngine(ScriptEngine):
+    name = 'np'
+    script = 'vsm_np.py'
+
+    def get_query_result(self, words):
+        return self.engine.get_data_manager().get_query_result(self.module.Vector(words))
+
+class GoldenEngine(Engine):
+    '''
+        The recorded output of output/vsm.out, written by save.sh with this
+        program, matched to the queries by their order. The recorded document ids
+        are numbered from 1 and the scores are rounded to two decimals.
+    '''
+    name = 'golden'
+    id_offset = 0
+    max_k = 3
+
+    def __init__(self, path = '%s/vsm.out' % OUTPUT_FOLDER):
+        self.__path = path
+
+    def build(self, collection):
+        self.__results = []
+        did = None
+        for line in open(self.__path, 'r'):
+            if line.startswith('Query'):
+                self.__results.append([])
+            elif line.startswith('DID: '):
+                did = int(line[len('DID: ') :])
+            elif line.startswith('Similarity score: '):
+                score = float(line[len('Similarity score: ') :])
+                self.__results[-1].append((did + self.id_offset, score))
+        self.__next = 0
+
+    def pre_process(self, line):
+        return line
+
+    def search(self, words, k):
+        if self.__next >= len(self.__results):
+            return []
+        result = self.__results[self.__next][: k]
+        self.__next += 1
+        return result
+
+ENGINES = {}
+for engine in (SourceEngine, ShardedEngine, DictScriptEngine, NumpyScriptEngine,
+               GoldenEngine):
+    ENGINES[engine.name] = engine
+
+def lowercase_copy(collection):
+    '''
+        Write the lowercased documents of collection to a temporary file, so that
+        the engines which do not lowercase index the keywords preprocessed by this
+        program.
+
+        Returns:
+            str, the path of the temporary file, to be removed by the caller.
+    '''
+    handle, path = tempfile.mkstemp(suffix = '.txt')
+    with os.fdopen(handle, 'w') as output:
+        for line in open(collection, 'r'):
+            output.write(line.lower())
+    return path
+
+def compare(reference, result, tolerance):
+    '''
+        Compare the ranking of an engine with the reference ranking.
+
+        Returns:
+            list, the description of every divergence, empty if they agree.
+    '''
+    divergences = []
+    reference_ids = [did for did, score in reference]
+    result_ids = [did for did, score in result]
+    if reference_ids != result_ids:
+        divergences.append('documents %s instead of %s' % (result_ids, reference_ids))
+    for (did, score), (other_did, other_score) in zip(reference, result):
+        if did == other_did and abs(score - other_score) > tolerance:
+            divergences.append('D%d scored %.4f instead of %.4f' % (did, other_score, score))
+    return divergences
+
+def main():
+    parser = argparse.ArgumentParser(
+        description = 'Run several VSM implementations on the same collection and '
+                      'queries, diff their top documents and time them')
+    parser.add_argument('-c', '--collection', type = str, required = True,
+                        help = 'Path of the documents collection file')
+    parser.add_argument('-q', '--query', type = str, required = True,
+                        help = 'Path of the queries collection file')
+    parser.add_argument('-e', '--engines', type = str, nargs = '+',
+                        default = ['src', 'vsm', 'np', 'golden'],
+                        choices = sorted(ENGINES.keys()),
+                        help = 'Engines to be compared')
+    parser.add_argument('-r', '--reference', type = str, default = 'src',
+                        choices = sorted(ENGINES.keys()),
+                        help = 'Engine the others are compared with')
+    parser.add_argument('-k', '--top', type = int, default = 3,
+                        help = 'Number of top documents compared')
+    parser.add_argument('--tolerance', type = float, default = 0.005,
+                        help = 'Largest accepted score difference')
+    parser.add_argument('--max-df', type = float, default = None,
+                        help = 'Stopwords of the src and sharded engines, see Main.py')
+    parser.add_argument('--min-idf', type = float, default = None,
+                        help = 'Stopwords of the src and sharded engines, see Main.py')
+    parser.add_argument('--shared-preprocessing', action = 'store_true',
+                        help = 'Feed every engine the keywords preprocessed by src, '
+                               'to separate scoring from preprocessing divergences')
+    args = parser.parse_args()
+    COLLECTION_FOLDER = '../collection'
+    QUERY_FOLDER = '../query'
+    collections = '%s/%s' % (COLLECTION_FOLDER, args.collection)
+    queries = '%s/%s' % (QUERY_FOLDER, args.query)
+
+    names = [args.reference] + [name for name in args.engines if name != args.reference]
+    lowered = None
+    if args.shared_preprocessing and any(issubclass(ENGINES[name], ScriptEngine)
+                                         for name in names):
+        lowered = lowercase_copy(collections)
+    engines = {}
+    build_time = {}
+    for name in names:
+        if issubclass(ENGINES[name], SourceEngine):
+            engine = ENGINES[name](max_df = args.max_df, min_idf = args.min_idf)
+        else:
+            engine = ENGINES[name]()
+        start = time.time()
+        with redirect_stdout(io.StringIO()):
+            if lowered is not None and isinstance(engine, ScriptEngine):
+                engine.build(lowered)
+            else:
+                engine.build(collections)
+        build_time[name] = time.time() - start
+        engines[name] = engine
+    if lowered is not None:
+        os.remove(lowered)
+
+    shared = engines['src'] if args.shared_preprocessing and 'src' in engines else None
+    if args.shared_preprocessing and shared is None:
+        shared = SourceEngine()
+        shared.build(collections)
+
+    lines = [line.strip() for line in open(queries, 'r') if len(line.strip()) > 0]
+    query_time = dict((name, 0.0) for name in names)
+    num_divergences = 0
+    for num, line in enumerate(lines, 1):
+        results = {}
+        for name in names:
+            engine = engines[name]
+            k = args.top if engine.max_k is None else min(args.top, engine.max_k)
+            start = time.time()
+            if shared is not None and name != 'golden':
+                words = shared.pre_process(line)
+            else:
+                words = engine.pre_process(line)
+            results[name] = (words, engine.search(words, k))
+            query_time[name] += time.time() - start
+
+        reference_words, reference = results[args.reference]
+        reported = False
+        for name in names[1 :]:
+            words, result = results[name]
+            k = min(len(reference), len(result))
+            divergences = compare(reference[: k], result[: k], args.tolerance)
+            if len(result) != len(reference) and args.top <= min(
+                    ENGINES[name].max_k or args.top, ENGINES[args.reference].max_k or args.top):
+                divergences.append('%d documents instead of %d' % (len(result), len(reference)))
+            if len(divergences) > 0:
+                num_divergences += 1
+                if not reported:
+                    print('Query %d: %s' % (num, line))
+                    reported = True
+                print('  %s vs %s: %s' % (name, args.reference, '; '.join(divergences)))
+                if name != 'golden' and words != reference_words:
+                    print('  %s keywords %s, %s keywords %s'
+                          % (name, words, args.reference, reference_words))
+
+    for engine in engines.values():
+        engine.close()
+
+    print()
+    print('%d queries, %d engine divergences' % (len(lines), num_divergences))
+    print('%-8s %12s %14s %14s' % ('engine', 'build (s)', 'queries (s)', 'per query (ms)'))
+    for name in names:
+        if name == 'golden':
+            continue
+        print('%-8s %12.4f %14.4f %14.4f'
+              % (name, build_time[name], query_time[name],
+                 1000 * query_time[name] / max(len(lines), 1)))
+
+    if num_divergences > 0:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
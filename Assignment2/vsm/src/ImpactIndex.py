@@ -0,0 +1,136 @@
+import numpy as np
+
+class ImpactIndex(object):
+    '''
+        Impact ordered index, an alternative layout of the inverted file where the
+        postings of every term are sorted by their precomputed impact (the
+        contribution of the posting to the document score) and grouped into
+        blocks of equal quantized impact.
+
+        A query is evaluated score at a time: the blocks of all the query terms
+        are processed from the highest impact * query weight down, so the
+        postings which matter most are seen first. Evaluation stops as soon as the
+        remaining blocks can no longer change the top n documents, or when the
+        Budget of the query is spent, in which case the result is approximate.
+
+        Attrs:
+            scorer: Scorer, the retrieval model providing the impacts.
+            levels: int, the number of quantized impact levels.
+            unit: float, the impact of one quantization level.
+            blocks: dictionary, map keywords to a tuple (levels, offsets, dids):
+            the quantized impact of every block in decreasing order, the start of
+            every block in dids plus the end, and the document ids sorted by
+            decreasing impact.
+    '''
+    def __init__(self, scorer, levels = 255):
+        self.__scorer = scorer
+        self.__levels = levels
+        self.__num_documents = scorer.statistics.get_num_documents()
+        postings = scorer.statistics.get('postings')
+        frequencies = scorer.statistics.get('term_frequencies')
+
+        impacts = {}
+        max_impact = 0.0
+        for word, dids in postings.items():
+            impacts[word] = scorer.impacts(word, dids, frequencies[word])
+            if len(dids) > 0:
+                max_impact = max(max_impact, float(np.max(impacts[word])))
+        self.__unit = max_impact / levels if max_impact > 0 else 1.0
+
+        self.__blocks = {}
+        for word, dids in postings.items():
+            quantized = np.clip(np.ceil(impacts[word] / self.__unit), 1, levels).astype(np.int32)
+            order = np.lexsort((dids, -quantized))
+            quantized = quantized[order]
+            starts = np.flatnonzero(np.diff(quantized)) + 1
+            offsets = np.concatenate(([0], starts, [len(dids)]))
+            self.__blocks[word] = (quantized[offsets[: -1]], offsets, dids[order])
+
+    def get_unit(self):
+        return self.__unit
+
+    def get_blocks(self, word):
+        return self.__blocks.get(word)
+
+    def stable(self, accumulator, n, bound, error):
+        '''
+            Check whether the top n documents are settled. A quantized level
+            overstates an impact by less than one level, so the exact score of a
+            document is at least its accumulated score - error, the query weights
+            summed, and every other document can gain at most bound: the set is
+            final once the n-th score - error reaches the (n + 1)-th score + bound.
+        '''
+        if n >= len(accumulator):
+            return bound == 0
+        top = np.partition(accumulator, len(accumulator) - n - 1)[len(accumulator) - n - 1 :]
+        return np.min(top[1 :]) - error >= top[0] + bound
+
+    def top(self, query, n, budget = None):
+        '''
+            Find the n highest scored documents by score at a time evaluation.
+
+            Args:
+                query: Vector, the vector instance of current query.
+                n: int, the number of documents to be found.
+                budget: Budget, the started limits of the query, None for no limit.
+
+            Returns:
+                result: list, containing n (did, score) tuples with exact scores.
+                approximate: bool, True if the budget ran out before the top n
+                documents were settled.
+        '''
+        segments = []
+        heads = {}
+        error = 0.0
+        for word in query.get_terms():
+            if word not in self.__blocks:
+                continue
+            query_weight = self.__scorer.query_weight(query, word)
+            if query_weight <= 0:
+                continue
+            levels, offsets, dids = self.__blocks[word]
+            for i in range(len(levels)):
+                segments.append((levels[i] * query_weight, word, i))
+            heads[word] = levels[0] * query_weight
+            error += query_weight
+        segments.sort(key = lambda x: x[0], reverse = True)
+
+        accumulator = np.zeros(self.__num_documents)
+        bound = sum(heads.values())
+        checked_bound = bound
+        approximate = False
+        for contribution, word, i in segments:
+            if budget is not None and budget.exhausted():
+                approximate = True
+                break
+
+            levels, offsets, dids = self.__blocks[word]
+            block = dids[offsets[i] : offsets[i + 1]]
+            accumulator[block] += contribution
+            if budget is not None:
+                budget.spend(len(block))
+
+            if i + 1 < len(levels):
+                next_head = levels[i + 1] * contribution / levels[i]
+            else:
+                next_head = 0.0
+            bound -= heads[word] - next_head
+            heads[word] = next_head
+
+            # checking is a pass over the accumulator, do it when the bound halves
+            if bound <= checked_bound / 2:
+                checked_bound = bound
+                if self.stable(accumulator, n, bound, error):
+                    break
+
+        touched = np.flatnonzero(accumulator)
+        if len(touched) > n:
+            nth = -np.partition(-accumulator[touched], n - 1)[n - 1]
+            if approximate:
+                # rescore the documents tied with the n-th quantized score
+                touched = touched[accumulator[touched] >= nth]
+            else:
+                # the n-th exact score is at least nth - error, rescore every
+                # document whose exact score may reach it
+                touched = touched[accumulator[touched] + bound >= nth - error]
+        return self.__scorer.top(query, n, touched.tolist()), approximate
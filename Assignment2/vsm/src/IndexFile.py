@@ -0,0 +1,94 @@
+import json
+import struct
+
+import numpy as np
+
+from Vector import Vector
+
+MAGIC = b'VSMINDEX'
+VERSION = 2
+FOOTER = struct.Struct('<QQ')
+
+def is_index_file(path):
+    with open(path, 'rb') as index_file:
+        return index_file.read(len(MAGIC)) == MAGIC
+
+def write_index(path, word_file_map, documents, statistics, stopwords = (), cutoff = None):
+    '''
+        Persist an index to a single file: the magic bytes, then the postings of
+        every keyword as int32 document ids followed by the int32 term
+        frequencies, then every document as its preprocessed keywords in
+        position order, then the float64 per-document statistics and the int64
+        offsets of the documents, then a JSON header locating all of them, and
+        finally the offset and length of the header.
+
+        Args:
+            word_file_map: dictionary, map keywords to a list of document id.
+            documents: list, the Vector instances of the documents.
+            statistics: IndexStatistics, the statistics of the index, providing
+            the per-document max_tf, document_length and magnitude.
+            stopwords: sequence, the stopwords derived when the index was built.
+            cutoff: dictionary, the max_df and min_idf the stopwords were derived
+            with.
+    '''
+    header = {
+        'version': VERSION,
+        'num_documents': len(documents),
+        'collection_size': statistics.get('collection_size'),
+        'stopwords': sorted(stopwords),
+        'cutoff': cutoff or {},
+        'terms': {},
+        'statistics': {},
+    }
+    with open(path, 'wb') as index_file:
+        index_file.write(MAGIC)
+        for word, dids in word_file_map.items():
+            tfs = [documents[did].get_tf(word) for did in dids]
+            header['terms'][word] = [index_file.tell(), len(dids), sum(tfs)]
+            index_file.write(np.array(dids, dtype = np.int32).tobytes())
+            index_file.write(np.array(tfs, dtype = np.int32).tobytes())
+
+        offsets = []
+        for document in documents:
+            words = [None] * sum(document.get_tf(word) for word in document.get_terms())
+            for word in document.get_terms():
+                for position in document.get_term_index(word):
+                    words[position] = word
+            offsets.append(index_file.tell())
+            index_file.write(' '.join(words).encode('utf-8'))
+        offsets.append(index_file.tell())
+
+        for name in ('max_tf', 'document_length', 'magnitude'):
+            header['statistics'][name] = index_file.tell()
+            index_file.write(np.asarray(statistics.get(name), dtype = np.float64).tobytes())
+        header['statistics']['document_offsets'] = index_file.tell()
+        index_file.write(np.array(offsets, dtype = np.int64).tobytes())
+
+        offset = index_file.tell()
+        data = json.dumps(header).encode('utf-8')
+        index_file.write(data)
+        index_file.write(FOOTER.pack(offset, len(data)))
+
+def read_header(index_file):
+    if index_file.read(len(MAGIC)) != MAGIC:
+        raise ValueError('\'%s\' is not an index file' % index_file.name)
+    index_file.seek(-FOOTER.size, 2)
+    offset, length = FOOTER.unpack(index_file.read(FOOTER.size))
+    index_file.seek(offset)
+    header = json.loads(index_file.read(length).decode('utf-8'))
+    if header['version'] != VERSION:
+        raise ValueError('Unsupported index file version %d, expected %d'
+                         % (header['version'], VERSION))
+    return header
+
+def read_array(index_file, offset, count, dtype):
+    index_file.seek(offset)
+    return np.frombuffer(index_file.read(count * np.dtype(dtype).itemsize), dtype = dtype)
+
+def read_postings(index_file, offset, df):
+    postings = read_array(index_file, offset, 2 * df, np.int32)
+    return postings[: df], postings[df :].astype(np.float64)
+
+def read_document(index_file, start, end, did):
+    index_file.seek(start)
+    return Vector(index_file.read(end - start).decode('utf-8').split(), did)
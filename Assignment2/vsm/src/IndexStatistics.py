@@ -0,0 +1,169 @@
+import math
+import numpy as np
+
+class IndexStatistics(object):
+    '''
+        Per-document and per-term statistics of the index, kept as numpy arrays so
+        that scoring runs as array operations over whole posting lists. Every
+        statistic is computed once, on the first prepare() asking for it.
+
+        When the collection is split into shards, the collection wide statistics
+        are aggregated over all the shards and passed in as overrides, so that
+        every shard weights its documents exactly as a single index would.
+
+        The weighting statistics are computed in a few array passes over the
+        triplets, the flat (document id, term id, count) arrays of all the
+        (document, keyword) pairs, instead of a Python loop over the pairs.
+
+        Available statistics:
+            collection_size: int, the number of documents in the collection.
+            term_ids: dictionary, map the keywords of the documents to term ids
+            numbered in order of first occurrence.
+            triplets: tuple, the int document ids, int term ids and float counts
+            of every (document, keyword) pair, in document order and in the term
+            order of every document.
+            term_triplets: tuple, the triplets grouped by term id, as the bounds of
+            every term id and the reordered document ids and counts.
+            weights: array, the tf / max_tf * idf weight of every triplet.
+            postings: dictionary, map keywords to an int array of document ids.
+            term_frequencies: dictionary, map keywords to an array of the term
+            frequencies aligned with postings.
+            document_frequency: dictionary, map keywords to their document frequency.
+            idf: dictionary, map keywords to log2(N / df), N the collection size.
+            max_tf: array, the largest term frequency of every document.
+            document_length: array, the number of keywords of every document.
+            average_length: float, the mean document length.
+            collection_frequency: dictionary, map keywords to their total frequency.
+            collection_length: int, the total number of keywords in the collection.
+            magnitude: array, the magnitude of every tf / max_tf * idf document vector.
+
+        Attrs:
+            num_documents: int, the number of documents.
+            values: dictionary, map the name of a prepared statistic to its value.
+    '''
+    def __init__(self, word_file_map, documents, collection = None):
+        self.__word_file_map = word_file_map
+        self.__documents = documents
+        self.__num_documents = len(documents)
+        self.__values = {}
+        if collection is not None:
+            self.__values.update(collection)
+
+    def get_num_documents(self):
+        return self.__num_documents
+
+    def prepare(self, names):
+        for name in names:
+            self.get(name)
+
+    def get(self, name):
+        if name not in self.__values:
+            self.__values[name] = getattr(self, 'compute_' + name)()
+        return self.__values[name]
+
+    def compute_collection_size(self):
+        return self.__num_documents
+
+    def compute_term_ids(self):
+        term_ids = {}
+        for document in self.__documents:
+            for word in document.get_terms():
+                if word not in term_ids:
+                    term_ids[word] = len(term_ids)
+        return term_ids
+
+    def compute_triplets(self):
+        term_ids = self.get('term_ids')
+        documents = self.__documents
+        sizes = [len(document.get_terms()) for document in documents]
+        dids = np.repeat(np.arange(self.__num_documents, dtype = np.int32), sizes)
+        tids = np.fromiter((term_ids[word] for document in documents
+                            for word in document.get_terms()),
+                           dtype = np.int32, count = len(dids))
+        counts = np.fromiter((tf for document in documents
+                              for tf in document.get_term_frequency().values()),
+                             dtype = np.float64, count = len(dids))
+        return dids, tids, counts
+
+    def compute_term_triplets(self):
+        dids, tids, counts = self.get('triplets')
+        # stable, so the document ids stay increasing within every term
+        order = np.argsort(tids, kind = 'stable')
+        bounds = np.searchsorted(tids[order], np.arange(len(self.get('term_ids')) + 1))
+        return bounds, dids[order], counts[order]
+
+    def term_slice(self, word, dids):
+        '''
+            The positions in term_triplets of the postings dids of a keyword, a
+            contiguous range unless the posting list is pruned.
+        '''
+        bounds, term_dids, counts = self.get('term_triplets')
+        tid = self.get('term_ids')[word]
+        start, end = bounds[tid], bounds[tid + 1]
+        if end - start == len(dids):
+            return slice(start, end)
+        return start + np.searchsorted(term_dids[start : end], dids)
+
+    def compute_postings(self):
+        bounds, term_dids, counts = self.get('term_triplets')
+        postings = {}
+        for word, dids in self.__word_file_map.items():
+            postings[word] = term_dids[self.term_slice(word, dids)]
+        return postings
+
+    def compute_term_frequencies(self):
+        bounds, term_dids, counts = self.get('term_triplets')
+        frequencies = {}
+        for word, dids in self.__word_file_map.items():
+            frequencies[word] = counts[self.term_slice(word, dids)]
+        return frequencies
+
+    def compute_document_frequency(self):
+        frequency = {}
+        for word, dids in self.__word_file_map.items():
+            frequency[word] = len(dids)
+        return frequency
+
+    def compute_idf(self):
+        idf = {}
+        collection_size = self.get('collection_size')
+        for word, df in self.get('document_frequency').items():
+            idf[word] = math.log(collection_size / df, 2)
+        return idf
+
+    def compute_max_tf(self):
+        dids, tids, counts = self.get('triplets')
+        max_tf = np.ones(self.__num_documents)
+        np.maximum.at(max_tf, dids, counts)
+        return max_tf
+
+    def compute_document_length(self):
+        dids, tids, counts = self.get('triplets')
+        return np.bincount(dids, counts, minlength = self.__num_documents).astype(np.float64)
+
+    def compute_weights(self):
+        dids, tids, counts = self.get('triplets')
+        idf = self.get('idf')
+        term_idf = np.array([idf[word] for word in self.get('term_ids')], dtype = np.float64)
+        return counts / self.get('max_tf')[dids] * term_idf[tids]
+
+    def compute_average_length(self):
+        if self.get('collection_size') == 0:
+            return 0.0
+        return self.get('collection_length') / self.get('collection_size')
+
+    def compute_collection_frequency(self):
+        frequency = {}
+        for word, tfs in self.get('term_frequencies').items():
+            frequency[word] = float(np.sum(tfs))
+        return frequency
+
+    def compute_collection_length(self):
+        return float(np.sum(self.get('document_length')))
+
+    def compute_magnitude(self):
+        # bincount sums the squares in the term order of every document, so that
+        # a document has the same magnitude whichever shard it is indexed in
+        dids, tids, counts = self.get('triplets')
+        return np.sqrt(np.bincount(dids, self.get('weights') ** 2,
+                                   minlength = self.__num_documents))
@@ -1,3 +1,10 @@
+import numpy as np
+
+from Bitmap import Bitmap, set_union
+
+# a bitmap takes num_documents / 8 bytes and a posting list 4 bytes per document,
+# so the bitmap is the smaller one above this fraction of the documents
+BITMAP_DENSITY = 1.0 / 32
 
 class InvertedFile(object):
     '''
@@ -5,9 +12,19 @@ class InvertedFile(object):
 
         Attrs:
             index: dictionary, map keywords to a list of document id.
+            statistics: IndexStatistics, the document frequencies and the posting
+            arrays of the index, None to keep the lists only.
+            threshold: float, the document frequency from which a keyword is dense.
+            bitmaps: dictionary, map the dense keywords to their Bitmap, built
+            on the first use.
     '''
-    def __init__(self, word_file_map):
+    def __init__(self, word_file_map, statistics = None, density = BITMAP_DENSITY):
         self.__index = word_file_map
+        self.__statistics = statistics
+        self.__threshold = None
+        self.__bitmaps = {}
+        if statistics is not None:
+            self.__threshold = max(1.0, density * statistics.get_num_documents())
 
     def get_documents(self, term):
         if term in self.__index.keys():
@@ -20,3 +37,54 @@ class InvertedFile(object):
             return True
         else:
             return False
+
+    def is_dense(self, term):
+        if self.__threshold is None:
+            return False
+        return self.__statistics.get('document_frequency').get(term, 0) >= self.__threshold
+
+    def get_bitmap(self, term):
+        bitmap = self.__bitmaps.get(term)
+        if bitmap is None:
+            bitmap = Bitmap.from_postings(self.__statistics.get('postings')[term],
+                                          self.__statistics.get_num_documents())
+            self.__bitmaps[term] = bitmap
+        return bitmap
+
+    def get_set(self, term):
+        '''
+            Returns:
+                Bitmap or list, the documents of a dense term as a Bitmap, the
+                sorted document ids of a rare one, None if the term is missing.
+        '''
+        if not self.exist(term):
+            return None
+        if self.is_dense(term):
+            return self.get_bitmap(term)
+        return self.__index[term]
+
+    def get_union(self, terms):
+        '''
+            Returns:
+                np.array, the sorted ids of the documents containing one of the
+                terms, the dense terms being merged as bitmaps.
+        '''
+        bitmaps = []
+        arrays = []
+        for term in terms:
+            if not self.exist(term):
+                continue
+            if self.is_dense(term):
+                bitmaps.append(self.get_bitmap(term))
+            elif self.__statistics is not None:
+                arrays.append(self.__statistics.get('postings')[term])
+            else:
+                arrays.append(np.asarray(self.__index[term], dtype = np.int32))
+
+        if len(bitmaps) > 0:
+            return set_union(bitmaps + arrays, self.__statistics.get_num_documents()).to_array()
+        if len(arrays) == 0:
+            return np.zeros(0, dtype = np.int32)
+        if len(arrays) == 1:
+            return arrays[0]
+        return np.unique(np.concatenate(arrays))
@@ -0,0 +1,308 @@
+#!/usr/bin/python
+
+import json
+import math
+import time
+import random
+import argparse
+import threading
+from collections import OrderedDict
+from urllib.parse import urlencode
+from urllib.request import urlopen
+from concurrent.futures import ThreadPoolExecutor
+
+from VectorSpace import VSM
+from Scorer import SCORERS
+from Backend import BACKENDS
+from TermDictionary import has_wildcard
+
+class LocalTarget(object):
+    '''
+        Run the queries against a VSM in this process, through VSM.search so that
+        nothing is displayed and only the cost of the engine is measured.
+    '''
+    def __init__(self, vsm):
+        self.__vsm = vsm
+
+    def query(self, text, n):
+        if has_wildcard(text):
+            words = self.__vsm.expand_wildcards(text)
+        else:
+            words = self.__vsm.pre_process(text)
+        return self.__vsm.search(words, n)
+
+class ServerTarget(object):
+    '''
+        Run the queries against a running Server.py.
+    '''
+    def __init__(self, url):
+        self.__url = url.rstrip('/')
+
+    def query(self, text, n):
+        url = '%s/search?%s' % (self.__url, urlencode({'q': text, 'n': n}))
+        with urlopen(url) as response:
+            return json.loads(response.read().decode('utf-8'))
+
+def zipf_queries(vocabulary, count, exponent = 1.0, max_terms = 3, seed = 0):
+    '''
+        Sample count queries of 1 to max_terms keywords, the keyword of rank r in
+        the vocabulary being drawn with probability proportional to 1 / r ^ exponent.
+
+        Args:
+            vocabulary: list, the keywords from the most to the least frequent.
+    '''
+    generator = random.Random(seed)
+    weights = [1.0 / (rank ** exponent) for rank in range(1, len(vocabulary) + 1)]
+    queries = []
+    for _ in range(count):
+        num_terms = generator.randint(1, max_terms)
+        queries.append(' '.join(generator.choices(vocabulary, weights, k = num_terms)))
+    return queries
+
+class Errors(object):
+    '''
+        The failed queries of a run, counted, with the type and message of their
+        exceptions, so that a bug of the engine is told apart from the failures
+        of an overloaded target.
+
+        Attrs:
+            count: int, the number of failed queries.
+            kinds: OrderedDict, map the first max_kinds distinct exception
+            descriptions to the number of queries which failed with them.
+            max_kinds: int, the largest number of descriptions kept.
+    '''
+    def __init__(self, max_kinds = 5):
+        self.__count = 0
+        self.__kinds = OrderedDict()
+        self.__max_kinds = max_kinds
+        self.__lock = threading.Lock()
+
+    def get_count(self):
+        return self.__count
+
+    def get_kinds(self):
+        return list(self.__kinds.items())
+
+    def add(self, error):
+        description = '%s: %s' % (type(error).__name__, error)
+        with self.__lock:
+            self.__count += 1
+            if description in self.__kinds:
+                self.__kinds[description] += 1
+            elif len(self.__kinds) < self.__max_kinds:
+                self.__kinds[description] = 1
+
+def run_closed(target, queries, concurrency, n, qps = None):
+    '''
+        Closed loop: concurrency clients each send their next query when the
+        previous one is answered, paced to qps in total if given.
+
+        Returns:
+            latencies: list, the latency of every answered query in seconds.
+            errors: Errors, the failed queries.
+            elapsed: float, the duration of the run in seconds.
+    '''
+    latencies = []
+    errors = Errors()
+    lock = threading.Lock()
+    next_query = [0]
+    interval = concurrency / qps if qps else 0.0
+
+    def client():
+        while True:
+            with lock:
+                if next_query[0] >= len(queries):
+                    return
+                text = queries[next_query[0]]
+                next_query[0] += 1
+            start = time.perf_counter()
+            try:
+                target.query(text, n)
+            except Exception as e:
+                errors.add(e)
+                continue
+            latency = time.perf_counter() - start
+            with lock:
+                latencies.append(latency)
+            if interval > latency:
+                time.sleep(interval - latency)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target = client) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, errors, time.perf_counter() - start
+
+def run_open(target, queries, concurrency, n, qps, seed = 0):
+    '''
+        Open loop: the queries arrive as a Poisson process of rate qps whether or
+        not the previous ones are answered, and are served by concurrency workers.
+        The latency is measured from the arrival, so it includes the time a query
+        waits for a worker when the engine falls behind.
+    '''
+    generator = random.Random(seed)
+    latencies = []
+    errors = Errors()
+    lock = threading.Lock()
+
+    def serve(text, arrival):
+        try:
+            target.query(text, n)
+        except Exception as e:
+            errors.add(e)
+            return
+        latency = time.perf_counter() - arrival
+        with lock:
+            latencies.append(latency)
+
+    executor = ThreadPoolExecutor(max_workers = concurrency)
+    start = time.perf_counter()
+    arrival = start
+    for text in queries:
+        arrival += generator.expovariate(qps)
+        delay = arrival - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        executor.submit(serve, text, arrival)
+    executor.shutdown(wait = True)
+    return latencies, errors, time.perf_counter() - start
+
+def percentile(values, fraction):
+    if len(values) == 0:
+        return 0.0
+    return values[min(len(values) - 1, int(math.ceil(fraction * len(values))) - 1)]
+
+def report(latencies, errors, elapsed, width = 40):
+    latencies = sorted(latencies)
+    print('%d queries answered, %d errors in %.3fs, throughput %.1f queries/s'
+          % (len(latencies), errors.get_count(), elapsed,
+             len(latencies) / max(elapsed, 1e-9)))
+    others = errors.get_count()
+    for description, count in errors.get_kinds():
+        print('  %d x %s' % (count, description))
+        others -= count
+    if others > 0:
+        print('  %d x other errors' % others)
+    if len(latencies) == 0:
+        return
+    print('latency (ms): mean %.3f  p50 %.3f  p90 %.3f  p99 %.3f  p99.9 %.3f  max %.3f'
+          % tuple(1000 * value for value in (
+              sum(latencies) / len(latencies), percentile(latencies, 0.5),
+              percentile(latencies, 0.9), percentile(latencies, 0.99),
+              percentile(latencies, 0.999), latencies[-1])))
+
+    # buckets doubling from 10 microseconds
+    bounds = [0.00001]
+    while bounds[-1] < latencies[-1]:
+        bounds.append(bounds[-1] * 2)
+    counts = [0] * len(bounds)
+    bucket = 0
+    for latency in latencies:
+        while latency > bounds[bucket]:
+            bucket += 1
+        counts[bucket] += 1
+    largest = max(counts)
+    print('%12s %8s' % ('<= ms', 'count'))
+    for bound, count in zip(bounds, counts):
+        if count == 0 and bound < latencies[0]:
+            continue
+        print('%12.3f %8d %s' % (1000 * bound, count, '#' * int(round(width * count / largest))))
+
+def main():
+    parser = argparse.ArgumentParser(
+        description = 'Replay a query log or a Zipfian query mix against the VSM and '
+                      'report the throughput and the latency distribution')
+    parser.add_argument('-c', '--collection', type = str, default = None,
+                        help = 'Path of the documents collection file, queried in this '
+                               'process unless --url is given')
+    parser.add_argument('--load-index', type = str, default = None,
+                        help = 'Load the index from this file instead of the collection')
+    parser.add_argument('--url', type = str, default = None,
+                        help = 'Query a running Server.py, e.g. http://localhost:8000')
+    parser.add_argument('-q', '--query', type = str, default = None,
+                        help = 'Query log replayed in order, one query per line')
+    parser.add_argument('--zipf', type = float, default = None,
+                        help = 'Sample the queries from the vocabulary of the collection '
+                               'with this Zipf exponent instead of a log')
+    parser.add_argument('--terms', type = int, default = 3,
+                        help = 'Largest number of keywords of a sampled query')
+    parser.add_argument('-r', '--requests', type = int, default = 1000,
+                        help = 'Number of queries sent, the log is repeated as needed')
+    parser.add_argument('-w', '--concurrency', type = int, default = 1,
+                        help = 'Number of concurrent clients or workers')
+    parser.add_argument('--qps', type = float, default = None,
+                        help = 'Target rate of queries per second, required in open loop')
+    parser.add_argument('-m', '--mode', type = str, default = 'closed',
+                        choices = ['closed', 'open'],
+                        help = 'Closed loop clients waiting for their answers, or open '
+                               'loop Poisson arrivals')
+    parser.add_argument('-n', '--top', type = int, default = 3,
+                        help = 'Number of documents asked per query')
+    parser.add_argument('-s', '--scorer', type = str, default = 'cosine',
+                        choices = sorted(SCORERS.keys()),
+                        help = 'Retrieval model of the local VSM')
+    parser.add_argument('--backend', type = str, default = 'auto',
+                        choices = ['auto'] + sorted(BACKENDS.keys()),
+                        help = 'Query engine of the local VSM')
+    parser.add_argument('-t', '--threads', type = int, default = 1,
+                        help = 'Number of threads scoring the queries with many postings')
+    parser.add_argument('--seed', type = int, default = 0,
+                        help = 'Seed of the sampled queries and arrivals')
+    args = parser.parse_args()
+    COLLECTION_FOLDER = '../collection'
+    QUERY_FOLDER = '../query'
+    if args.load_index is not None:
+        collections = args.load_index
+    elif args.collection is not None:
+        collections = '%s/%s' % (COLLECTION_FOLDER, args.collection)
+    else:
+        collections = None
+    if args.mode == 'open' and args.qps is None:
+        parser.error('--qps is required in open loop')
+    if (args.query is None) == (args.zipf is None):
+        parser.error('exactly one of the arguments -q/--query --zipf is required')
+    if collections is None and (args.url is None or args.zipf is not None):
+        parser.error('a collection or --load-index is required to query in this process '
+                     'or to sample from its vocabulary')
+
+    vsm_object = None
+    if collections is not None:
+        try:
+            vsm_object = VSM(collections, args.scorer, workers = args.threads,
+                             backend = args.backend)
+        except ValueError as e:
+            parser.error(str(e))
+
+    if args.query is not None:
+        lines = [line.strip() for line in open('%s/%s' % (QUERY_FOLDER, args.query), 'r')
+                 if len(line.strip()) > 0]
+        if len(lines) == 0:
+            parser.error('the query file \'%s\' has no query' % args.query)
+        queries = [lines[i % len(lines)] for i in range(args.requests)]
+    else:
+        frequency = vsm_object.get_data_manager().get_statistics().get('collection_frequency')
+        vocabulary = sorted(frequency, key = lambda word: (-frequency[word], word))
+        if len(vocabulary) == 0:
+            parser.error('the collection has no keyword to sample --zipf queries from')
+        queries = zipf_queries(vocabulary, args.requests, args.zipf, args.terms, args.seed)
+
+    if args.url is not None:
+        target = ServerTarget(args.url)
+    else:
+        target = LocalTarget(vsm_object)
+
+    print('%s loop, %d queries, concurrency %d, target %s'
+          % (args.mode, len(queries), args.concurrency,
+             '%.1f queries/s' % args.qps if args.qps else 'unlimited'))
+    if args.mode == 'closed':
+        latencies, errors, elapsed = run_closed(target, queries, args.concurrency, args.top,
+                                                args.qps)
+    else:
+        latencies, errors, elapsed = run_open(target, queries, args.concurrency, args.top,
+                                              args.qps, args.seed)
+    report(latencies, errors, elapsed)
+
+if __name__ == '__main__':
+    main()
@@ -4,21 +4,130 @@ import sys
 import argparse
 
 from VectorSpace import VSM
+from ShardedVectorSpace import ShardedVSM
+from Scorer import SCORERS
+from Backend import BACKENDS
+from Pruning import PRUNING_MODES
+from Duplicates import DUPLICATE_MODES
+from Related import RELATED_METHODS
 
 def main():
     parser = argparse.ArgumentParser()
-    parser.add_argument('-c', '--collection', type = str, required = True,
+    parser.add_argument('-c', '--collection', type = str, default = None,
                         help = 'Path of the documents collection file')
     parser.add_argument('-q', '--query', type = str, required = True,
                         help = 'Path of the queries collection file')
+    parser.add_argument('-b', '--boolean', action = 'store_true',
+                        help = 'Treat every query as a boolean query with AND, OR, NOT')
+    parser.add_argument('--no-rank', action = 'store_true',
+                        help = 'List boolean matches by document id instead of similarity')
+    parser.add_argument('-s', '--scorer', type = str, default = 'cosine',
+                        choices = sorted(SCORERS.keys()),
+                        help = 'Retrieval model used to rank the documents')
+    parser.add_argument('--backend', type = str, default = 'auto',
+                        choices = ['auto'] + sorted(BACKENDS.keys()),
+                        help = 'Query engine: Python dictionaries, dense numpy matrix or '
+                               'sparse posting lists, chosen from the collection by default')
+    parser.add_argument('-i', '--index', type = str, default = 'document',
+                        choices = ['document', 'impact'],
+                        help = 'Postings ordered by document id, or by impact for '
+                               'early terminated score at a time evaluation')
+    parser.add_argument('--budget', type = int, default = None,
+                        help = 'Largest number of postings processed per query, the '
+                               'result of a query cut short is approximate')
+    parser.add_argument('--deadline', type = float, default = None,
+                        help = 'Largest time in milliseconds spent scoring a query, '
+                               'the result of a query cut short is approximate')
+    parser.add_argument('--shards', type = int, default = 0,
+                        help = 'Split the collection into SHARDS shards, each served '
+                               'by its own worker process')
+    parser.add_argument('-t', '--threads', type = int, default = 1,
+                        help = 'Number of threads scoring the queries with many postings')
+    parser.add_argument('--prune', type = float, default = None,
+                        help = 'Remove the postings weighing less than PRUNE, see --prune-mode')
+    parser.add_argument('--prune-mode', type = str, default = 'term',
+                        choices = PRUNING_MODES,
+                        help = 'Pruning threshold relative to the largest weight of the '
+                               'keyword, of the document, or an absolute weight')
+    parser.add_argument('--max-df', type = float, default = None,
+                        help = 'Make the keywords occurring in more than this fraction '
+                               'of the documents stopwords')
+    parser.add_argument('--min-idf', type = float, default = None,
+                        help = 'Make the keywords whose idf is below MIN_IDF stopwords')
+    parser.add_argument('--save-index', type = str, default = None,
+                        help = 'Write the index and its stopwords to this file')
+    parser.add_argument('--load-index', type = str, default = None,
+                        help = 'Load the index from this file instead of the collection')
+    parser.add_argument('--cache-size', type = int, default = 1000000,
+                        help = 'Number of postings and of document keywords kept in '
+                               'memory when reading a loaded index on demand')
+    parser.add_argument('--duplicates', type = str, default = None,
+                        choices = DUPLICATE_MODES,
+                        help = 'Find the near-duplicate documents by MinHash and drop '
+                               'them from the index or collapse them in the results')
+    parser.add_argument('--related', type = str, default = None,
+                        choices = RELATED_METHODS,
+                        help = 'Relate the keywords by co-occurrence or LSI and expand '
+                               'the ranked queries with the related keywords')
+    parser.add_argument('--neighbours', type = int, default = 5,
+                        help = 'Number of related keywords kept for every keyword')
+    parser.add_argument('--expansion', type = float, default = 0.5,
+                        help = 'Weight of a related keyword relative to the query '
+                               'keyword, times their similarity')
     args = parser.parse_args()
     COLLECTION_FOLDER = '../collection'
     QUERY_FOLDER = '../query'
-    collections = '%s/%s' % (COLLECTION_FOLDER, args.collection)
+    if args.load_index is not None:
+        collections = args.load_index
+    elif args.collection is not None:
+        collections = '%s/%s' % (COLLECTION_FOLDER, args.collection)
+    else:
+        parser.error('one of the arguments -c/--collection --load-index is required')
     queries = '%s/%s' % (QUERY_FOLDER, args.query)
+    if args.duplicates is not None and (args.load_index is not None or args.shards > 0):
+        parser.error('--duplicates cannot be used with --load-index or --shards')
+    if args.related is not None and args.shards > 0:
+        parser.error('--related cannot be used with --shards')
 
-    vsm_object = VSM(collections)
-    vsm_object.batch_query(queries)
+    if args.shards > 0:
+        if args.load_index is not None:
+            parser.error('--load-index cannot be used with --shards')
+        if args.deadline is not None:
+            parser.error('--deadline cannot be used with --shards')
+        try:
+            vsm_object = ShardedVSM(collections, args.shards, args.scorer, args.index,
+                                    args.budget, args.max_df, args.min_idf, args.backend)
+        except ValueError as e:
+            parser.error(str(e))
+        except RuntimeError as e:
+            sys.exit('error: %s' % e)
+        if len(vsm_object.get_stopwords()) > 0:
+            vsm_object.report_stopwords()
+        vsm_object.batch_query(queries, args.boolean, not args.no_rank)
+        vsm_object.close()
+        return
+
+    deadline = None
+    if args.deadline is not None:
+        deadline = args.deadline / 1000.0
+    try:
+        vsm_object = VSM(collections, args.scorer, args.index, args.budget, args.threads,
+                         args.max_df, args.min_idf, args.cache_size, args.backend,
+                         args.duplicates, deadline, args.related, args.neighbours,
+                         args.expansion)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.save_index is not None:
+        vsm_object.save_index(args.save_index)
+    if len(vsm_object.get_stopwords()) > 0:
+        vsm_object.report_stopwords()
+    if args.duplicates is not None:
+        vsm_object.report_duplicates()
+    if args.related is not None:
+        vsm_object.report_related()
+    if args.prune is not None:
+        vsm_object.prune(args.prune_mode, args.prune)
+    vsm_object.batch_query(queries, args.boolean, not args.no_rank)
 
 if __name__ == '__main__':
     main()
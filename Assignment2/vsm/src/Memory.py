@@ -0,0 +1,96 @@
+#!/usr/bin/python
+
+import argparse
+
+from VectorSpace import VSM
+from Scorer import SCORERS
+from Backend import BACKENDS
+from Accounting import measure, term_sizes, estimate_beta, project, DEFAULT_BETA
+from PagedIndex import PagedDocuments
+
+def format_size(size):
+    if size < 1024:
+        return '%dB' % size
+    for unit in ('KB', 'MB', 'GB'):
+        size /= 1024.0
+        if size < 1024 or unit == 'GB':
+            return '%.1f%s' % (size, unit)
+
+def main():
+    parser = argparse.ArgumentParser(
+        description = 'Account the memory of a loaded index by structure and project '
+                      'it to larger collections')
+    parser.add_argument('-c', '--collection', type = str, default = None,
+                        help = 'Path of the documents collection file')
+    parser.add_argument('--load-index', type = str, default = None,
+                        help = 'Account an index file instead, only its cached part '
+                               'is in memory')
+    parser.add_argument('-s', '--scorer', type = str, default = 'cosine',
+                        choices = sorted(SCORERS.keys()),
+                        help = 'Retrieval model used to rank the documents')
+    parser.add_argument('--backend', type = str, default = 'auto',
+                        choices = ['auto'] + sorted(BACKENDS.keys()),
+                        help = 'Query engine whose structures are accounted')
+    parser.add_argument('-i', '--index', type = str, default = 'document',
+                        choices = ['document', 'impact'],
+                        help = 'Also account the impact ordered index')
+    parser.add_argument('-t', '--targets', type = int, nargs = '+',
+                        default = [10000, 100000, 1000000],
+                        help = 'Numbers of documents the memory is projected to')
+    parser.add_argument('-n', '--top', type = int, default = 10,
+                        help = 'Number of largest keywords listed')
+    args = parser.parse_args()
+    COLLECTION_FOLDER = '../collection'
+    if args.load_index is not None:
+        collections = args.load_index
+    elif args.collection is not None:
+        collections = '%s/%s' % (COLLECTION_FOLDER, args.collection)
+    else:
+        parser.error('one of the arguments -c/--collection --load-index is required')
+
+    try:
+        vsm_object = VSM(collections, args.scorer, args.index, backend = args.backend)
+    except ValueError as e:
+        parser.error(str(e))
+    data_manager = vsm_object.get_data_manager()
+    documents = data_manager.get_documents()
+    num_documents = len(documents)
+    vocabulary = len(data_manager.get_statistics().get('document_frequency'))
+
+    sizes, growth = measure(data_manager)
+    total = sum(sizes.values())
+    if isinstance(documents, PagedDocuments):
+        beta = DEFAULT_BETA
+    else:
+        beta = estimate_beta(documents)
+    projections = [project(sizes, growth, num_documents, target, beta)
+                   for target in args.targets]
+
+    print('%d documents, %d keywords, backend %s, total %s, vocabulary growth N^%.2f'
+          % (num_documents, vocabulary, data_manager.get_backend().name,
+             format_size(total), beta))
+    print('%-36s %10s %7s %10s %10s %-8s' % ('structure', 'size', 'share', 'per doc',
+                                             'per term', 'grows')
+          + ''.join(' %10s' % ('@%d' % target) for target in args.targets))
+    for name in sorted(sizes, key = lambda name: -sizes[name]):
+        if sizes[name] == 0:
+            continue
+        print('%-36s %10s %6.1f%% %10s %10s %-8s'
+              % (name, format_size(sizes[name]), 100.0 * sizes[name] / total,
+                 format_size(sizes[name] / max(num_documents, 1)),
+                 format_size(sizes[name] / max(vocabulary, 1)), growth[name])
+              + ''.join(' %10s' % format_size(projected[name]) for projected in projections))
+    print('%-36s %10s %7s %10s %10s %-8s'
+          % ('total', format_size(total), '100.0%', format_size(total / max(num_documents, 1)),
+             format_size(total / max(vocabulary, 1)), '')
+          + ''.join(' %10s' % format_size(sum(projected.values()))
+                    for projected in projections))
+
+    print()
+    print('Largest keywords:')
+    print('%-16s %12s %12s' % ('keyword', 'postings', 'positions'))
+    for word, postings, positions in term_sizes(data_manager, args.top):
+        print('%-16s %12s %12s' % (word, format_size(postings), format_size(positions)))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,200 @@
+import threading
+from collections import OrderedDict
+from collections.abc import Mapping, Sequence
+
+import numpy as np
+
+from IndexFile import read_header, read_array, read_postings, read_document
+
+class BoundedCache(object):
+    '''
+        Least recently used cache holding at most capacity units, the size of an
+        entry being given by size(value). Entries are evicted from the least
+        recently used until the new entry fits; an entry larger than the whole
+        cache is returned without being kept.
+
+        Attrs:
+            capacity: int, the largest total size of the cached entries.
+            size: function, the size of a value in units.
+            entries: OrderedDict, map keys to values, least recently used first.
+            used: int, the total size of the cached entries.
+            hits: int, the number of lookups answered by the cache.
+            misses: int, the number of lookups which loaded their value.
+    '''
+    def __init__(self, capacity, size = len):
+        self.__capacity = capacity
+        self.__size = size
+        self.__entries = OrderedDict()
+        self.__used = 0
+        self.__lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.__entries)
+
+    def get_used(self):
+        return self.__used
+
+    def get(self, key, load):
+        with self.__lock:
+            if key in self.__entries:
+                self.__entries.move_to_end(key)
+                self.hits += 1
+                return self.__entries[key]
+
+            self.misses += 1
+            value = load(key)
+            size = self.__size(value)
+            if size > self.__capacity:
+                return value
+            while self.__used + size > self.__capacity:
+                evicted, evicted_value = self.__entries.popitem(last = False)
+                self.__used -= self.__size(evicted_value)
+            self.__entries[key] = value
+            self.__used += size
+            return value
+
+class PagedMapping(Mapping):
+    '''
+        Read only dictionary over the keywords of an index file whose values are
+        loaded on access.
+    '''
+    def __init__(self, keys, load):
+        self.__keys = keys
+        self.__load = load
+
+    def __getitem__(self, word):
+        if word not in self.__keys:
+            raise KeyError(word)
+        return self.__load(word)
+
+    def __contains__(self, word):
+        return word in self.__keys
+
+    def __iter__(self):
+        return iter(self.__keys)
+
+    def __len__(self):
+        return len(self.__keys)
+
+class PagedDocuments(Sequence):
+    '''
+        Read only list of the documents of an index file, every document vector is
+        loaded on access and weighted by the function given to set_weighting.
+    '''
+    def __init__(self, reader):
+        self.__reader = reader
+
+    def __getitem__(self, did):
+        if did < 0 or did >= len(self):
+            raise IndexError('document id %d out of range' % did)
+        return self.__reader.get_document(did)
+
+    def __len__(self):
+        return self.__reader.get_num_documents()
+
+    def set_weighting(self, weighting):
+        self.__reader.set_weighting(weighting)
+
+class IndexReader(object):
+    '''
+        Index file opened for on demand loading, see IndexFile.write_index. Only
+        the header with the term dictionary and the per-document statistics is
+        read when the file is opened; the postings and the document vectors are
+        read on their first access and kept in two bounded caches, so the memory
+        follows the keywords and documents the queries actually touch.
+
+        Attrs:
+            header: dictionary, the header of the index file.
+            postings: BoundedCache, the (dids, tfs) arrays by keyword, sized in
+            postings.
+            documents: BoundedCache, the document vectors by id, sized in unique
+            keywords.
+            weighting: function, called on every loaded document vector to set
+            its weights.
+    '''
+    def __init__(self, path, cache_size = 1000000):
+        self.__file = open(path, 'rb')
+        self.__lock = threading.Lock()
+        self.__header = read_header(self.__file)
+        self.__terms = self.__header['terms']
+        num_documents = self.__header['num_documents']
+        self.__statistics = {}
+        for name in ('max_tf', 'document_length', 'magnitude'):
+            self.__statistics[name] = read_array(
+                self.__file, self.__header['statistics'][name], num_documents, np.float64)
+        self.__document_offsets = read_array(
+            self.__file, self.__header['statistics']['document_offsets'],
+            num_documents + 1, np.int64)
+
+        self.__postings = BoundedCache(cache_size, lambda value: len(value[0]))
+        self.__documents = BoundedCache(cache_size,
+                                        lambda document: len(document.get_terms()) + 1)
+        self.__weighting = None
+
+    def close(self):
+        self.__file.close()
+
+    def get_num_documents(self):
+        return self.__header['num_documents']
+
+    def get_stopwords(self):
+        return self.__header['stopwords']
+
+    def get_cutoff(self):
+        return self.__header['cutoff']
+
+    def get_caches(self):
+        return self.__postings, self.__documents
+
+    def set_weighting(self, weighting):
+        self.__weighting = weighting
+
+    def load_postings(self, word):
+        offset, df, cf = self.__terms[word]
+        with self.__lock:
+            return read_postings(self.__file, offset, df)
+
+    def load_document(self, did):
+        with self.__lock:
+            document = read_document(self.__file, int(self.__document_offsets[did]),
+                                     int(self.__document_offsets[did + 1]), did)
+        if self.__weighting is not None:
+            self.__weighting(document)
+        return document
+
+    def get_postings(self, word):
+        return self.__postings.get(word, self.load_postings)
+
+    def get_document(self, did):
+        return self.__documents.get(did, self.load_document)
+
+    def get_word_file_map(self):
+        return PagedMapping(self.__terms, lambda word: self.get_postings(word)[0].tolist())
+
+    def get_documents(self):
+        return PagedDocuments(self)
+
+    def get_collection(self):
+        '''
+            The statistics which IndexStatistics would otherwise compute by
+            reading every posting and document, see IndexStatistics.
+        '''
+        document_frequency = {}
+        collection_frequency = {}
+        for word, (offset, df, cf) in self.__terms.items():
+            document_frequency[word] = df
+            collection_frequency[word] = float(cf)
+        collection = {
+            'collection_size': self.__header.get('collection_size',
+                                                 self.get_num_documents()),
+            'document_frequency': document_frequency,
+            'collection_frequency': collection_frequency,
+            'collection_length': float(np.sum(self.__statistics['document_length'])),
+            'postings': PagedMapping(self.__terms, lambda word: self.get_postings(word)[0]),
+            'term_frequencies': PagedMapping(self.__terms,
+                                             lambda word: self.get_postings(word)[1]),
+        }
+        collection.update(self.__statistics)
+        return collection
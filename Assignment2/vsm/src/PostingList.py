@@ -0,0 +1,103 @@
+from bisect import bisect_left
+
+def gallop(postings, target, lo = 0):
+    '''
+        Find the first position in a sorted posting list whose document id is
+        not smaller than target, starting the search at position lo. The probe
+        distance doubles until it overshoots (the skip), then a binary search
+        finishes the job inside the last skipped block.
+
+        Args:
+            postings: list, sorted document ids.
+            target: int, the document id to look for.
+            lo: int, the position to start searching from.
+
+        Returns:
+            int, the insertion position of target in postings[lo:].
+    '''
+    n = len(postings)
+    if lo >= n or postings[lo] >= target:
+        return lo
+
+    step = 1
+    hi = lo + 1
+    while hi < n and postings[hi] < target:
+        lo = hi
+        step *= 2
+        hi = lo + step
+
+    return bisect_left(postings, target, lo + 1, min(hi, n))
+
+def intersect(short, long):
+    '''
+        Intersect two sorted posting lists. Every document id of the shorter
+        list is located in the longer list by galloping forward from the
+        previous match, so the cost is O(|short| * log(|long| / |short|))
+        rather than O(|short| + |long|).
+
+        Args:
+            short: list, sorted document ids, should be the rarer term.
+            long: list, sorted document ids.
+
+        Returns:
+            ret: list, sorted document ids contained in both lists.
+    '''
+    if len(short) > len(long):
+        short, long = long, short
+
+    ret = []
+    pos = 0
+    n = len(long)
+    for did in short:
+        pos = gallop(long, did, pos)
+        if pos == n:
+            break
+        if long[pos] == did:
+            ret.append(did)
+            pos += 1
+
+    return ret
+
+def intersect_all(lists):
+    '''
+        Conjunctive evaluation of several posting lists, rarest list first so
+        that the intermediate result never grows beyond the shortest list.
+    '''
+    if len(lists) == 0:
+        return []
+
+    lists = sorted(lists, key = len)
+    ret = lists[0]
+    for postings in lists[1:]:
+        if len(ret) == 0:
+            break
+        ret = intersect(ret, postings)
+
+    return list(ret)
+
+def difference(postings, excluded):
+    '''
+        Remove the document ids of excluded from postings, both sorted. Gallops
+        through excluded so a rare postings list stays cheap against a very
+        common excluded list.
+    '''
+    ret = []
+    pos = 0
+    n = len(excluded)
+    for did in postings:
+        pos = gallop(excluded, did, pos)
+        if pos < n and excluded[pos] == did:
+            continue
+        ret.append(did)
+
+    return ret
+
+def union(lists):
+    '''
+        Disjunctive evaluation of several sorted posting lists.
+    '''
+    candidates = set()
+    for postings in lists:
+        candidates.update(postings)
+
+    return sorted(candidates)
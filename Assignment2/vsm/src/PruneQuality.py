@@ -0,0 +1,85 @@
+#!/usr/bin/python
+
+import argparse
+
+from VectorSpace import VSM
+from Scorer import SCORERS
+from Pruning import prune, count_postings, PRUNING_MODES
+
+def compare(baseline, pruned, n):
+    '''
+        Compare the top n documents of the pruned index with the unpruned one.
+
+        Returns:
+            overlap: float, the fraction of the unpruned top n which is retrieved.
+            deltas: list, the absolute score difference at every rank.
+    '''
+    if len(baseline) == 0:
+        return 1.0, []
+    baseline_ids = set(did for did, score in baseline)
+    pruned_ids = set(did for did, score in pruned)
+    overlap = len(baseline_ids & pruned_ids) / len(baseline_ids)
+    deltas = []
+    for i in range(len(baseline)):
+        score = pruned[i][1] if i < len(pruned) else 0.0
+        deltas.append(abs(baseline[i][1] - score))
+    return overlap, deltas
+
+def main():
+    parser = argparse.ArgumentParser(
+        description = 'Statically prune the postings with small weights and measure '
+                      'the index size against the ranking quality')
+    parser.add_argument('-c', '--collection', type = str, required = True,
+                        help = 'Path of the documents collection file')
+    parser.add_argument('-q', '--query', type = str, required = True,
+                        help = 'Path of the queries collection file')
+    parser.add_argument('-m', '--mode', type = str, default = 'term',
+                        choices = PRUNING_MODES,
+                        help = 'Threshold relative to the largest weight of the keyword, '
+                               'of the document, or an absolute weight')
+    parser.add_argument('-t', '--thresholds', type = float, nargs = '+',
+                        default = [0.1, 0.2, 0.3, 0.4, 0.5],
+                        help = 'Pruning thresholds to be measured')
+    parser.add_argument('-s', '--scorer', type = str, default = 'cosine',
+                        choices = sorted(SCORERS.keys()),
+                        help = 'Retrieval model used to rank the documents')
+    parser.add_argument('-n', '--top', type = int, default = 3,
+                        help = 'Number of top documents compared')
+    args = parser.parse_args()
+    COLLECTION_FOLDER = '../collection'
+    QUERY_FOLDER = '../query'
+    collections = '%s/%s' % (COLLECTION_FOLDER, args.collection)
+    queries = '%s/%s' % (QUERY_FOLDER, args.query)
+
+    vsm_object = VSM(collections, args.scorer)
+    query_words = []
+    for line in open(queries, 'r'):
+        words = vsm_object.pre_process(line.strip())
+        if len(words) > 0:
+            query_words.append(words)
+
+    data_manager = vsm_object.get_data_manager()
+    baselines = [vsm_object.search(words, args.top)[0] for words in query_words]
+    total = count_postings(data_manager)
+
+    print('Pruning mode: %s, %d postings, %d queries, top %d'
+          % (args.mode, total, len(query_words), args.top))
+    print('%-10s %10s %10s %10s %12s %12s'
+          % ('threshold', 'postings', 'reduction', 'overlap', 'mean delta', 'max delta'))
+    for threshold in args.thresholds:
+        pruned = prune(data_manager, args.mode, threshold, args.scorer)
+        remaining = count_postings(pruned)
+        overlaps = []
+        deltas = []
+        for words, baseline in zip(query_words, baselines):
+            result, approximate = pruned.top(vsm_object.make_query(words), args.top)
+            overlap, delta = compare(baseline, result, args.top)
+            overlaps.append(overlap)
+            deltas.extend(delta)
+        print('%-10.3f %10d %9.1f%% %10.3f %12.4f %12.4f'
+              % (threshold, remaining, 100.0 * (1 - remaining / max(total, 1)),
+                 sum(overlaps) / max(len(overlaps), 1),
+                 sum(deltas) / max(len(deltas), 1), max(deltas + [0.0])))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+import numpy as np
+
+from DataManager import DataManager
+
+# statistics of the unpruned index which the pruned index keeps, so that the
+# remaining postings are weighted and normalized exactly as before
+COLLECTION_STATISTICS = ('collection_size', 'document_frequency', 'collection_frequency',
+                         'collection_length', 'document_length', 'max_tf', 'magnitude')
+
+PRUNING_MODES = ('term', 'document', 'weight')
+
+def posting_weights(statistics):
+    '''
+        The tf / max_tf * idf weight of every posting, by keyword.
+    '''
+    postings = statistics.get('postings')
+    frequencies = statistics.get('term_frequencies')
+    max_tf = statistics.get('max_tf')
+    idf = statistics.get('idf')
+    weights = {}
+    for word, dids in postings.items():
+        weights[word] = frequencies[word] / max_tf[dids] * idf[word]
+    return weights
+
+def prune_postings(statistics, mode, threshold):
+    '''
+        Remove the postings with a small tf-idf weight.
+
+        Args:
+            statistics: IndexStatistics, the statistics of the unpruned index.
+            mode: str, 'term' keeps the postings weighing at least threshold times
+            the largest weight of their keyword, 'document' at least threshold
+            times the largest weight of their document, 'weight' at least threshold.
+            threshold: float, the pruning threshold.
+
+        Returns:
+            word_file_map: dictionary, map keywords to the list of remaining
+            document ids, keywords without any remaining posting are dropped.
+    '''
+    if mode not in PRUNING_MODES:
+        raise ValueError('Unknown pruning mode \'%s\', expected one of: %s'
+                         % (mode, ', '.join(PRUNING_MODES)))
+
+    postings = statistics.get('postings')
+    weights = posting_weights(statistics)
+    if mode == 'document':
+        document_max = np.zeros(statistics.get_num_documents())
+        for word, dids in postings.items():
+            np.maximum.at(document_max, dids, weights[word])
+
+    word_file_map = {}
+    for word, dids in postings.items():
+        if mode == 'term':
+            keep = weights[word] >= threshold * np.max(weights[word])
+        elif mode == 'document':
+            keep = weights[word] >= threshold * document_max[dids]
+        else:
+            keep = weights[word] >= threshold
+        if np.any(keep):
+            word_file_map[word] = dids[keep].tolist()
+
+    return word_file_map
+
+def prune(data_manager, mode, threshold, scorer = 'cosine', index = 'document',
+          budget = None, workers = 1):
+    '''
+        Build a statically pruned copy of an index. The documents, their
+        magnitudes and the collection statistics are those of the unpruned index,
+        only the posting lists are shorter; the vocabulary and the posting lists
+        displayed with the results stay those of the unpruned index.
+
+        Returns:
+            DataManager, the pruned index.
+    '''
+    statistics = data_manager.get_statistics()
+    statistics.prepare(COLLECTION_STATISTICS)
+    collection = {}
+    for name in COLLECTION_STATISTICS:
+        collection[name] = statistics.get(name)
+
+    word_file_map = prune_postings(statistics, mode, threshold)
+    pruned = DataManager(word_file_map, data_manager.get_documents(), scorer, index, budget,
+                         collection, workers, data_manager.get_stopwords(),
+                         data_manager.get_backend().name, data_manager.get_clusters(),
+                         data_manager.get_deadline(), data_manager)
+    pruned.set_related(data_manager.get_related())
+    return pruned
+
+def count_postings(data_manager):
+    return sum(len(dids) for dids in data_manager.get_statistics().get('postings').values())
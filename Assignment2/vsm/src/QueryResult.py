@@ -11,13 +11,17 @@ class QueryResult(object):
             num_keywords: int, number of unique keywords in document.
             magnitude: float, magnitude of the document vector.
             sim_score: float, similarity score.
+            approximate: bool, True if the query evaluation stopped before every
+            posting was processed, so the result may differ from the exact ranking.
     '''
-    def __init__(self, did, postinglist, numkeywords, magnitude, simscore):
+    def __init__(self, did, postinglist, numkeywords, magnitude, simscore,
+                 approximate = False):
         self.__did = did
         self.__posting_list = postinglist
         self.__num_keywords = numkeywords
         self.__magnitude = magnitude
         self.__sim_score = simscore
+        self.__approximate = approximate
 
     def get_id(self):
         return self.__did
@@ -33,3 +37,6 @@ class QueryResult(object):
 
     def get_sim_score(self):
         return self.__sim_score
+
+    def is_approximate(self):
+        return self.__approximate
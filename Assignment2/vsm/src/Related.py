@@ -0,0 +1,334 @@
+import numpy as np
+from Stopwords import derive_stopwords
+
+RELATED_METHODS = ('cooccurrence', 'lsi')
+
+# the suffixes stripped by stem, the longest first
+STEM_SUFFIXES = ('ing', 'ed', 'er', 'ly', 'e')
+
+class RelatedTerms(object):
+    '''
+        The related keywords of every keyword of the vocabulary, computed once at
+        index time and kept as two num_terms x n arrays, so that expanding a query
+        keyword is one row lookup instead of a similarity computation.
+
+        Attrs:
+            terms: list, the keywords by term id.
+            term_ids: dictionary, map keywords to their term id.
+            neighbours: np.array, the int32 term ids of the n keywords most related
+            to every keyword, best first, -1 after the last one.
+            similarities: np.array, the float32 similarities aligned with neighbours.
+            weight: float, the weight of an expansion relative to the query keyword
+            it is related to.
+    '''
+    def __init__(self, term_ids, neighbours, similarities, weight = 0.5):
+        self.__term_ids = term_ids
+        self.__terms = [None] * len(term_ids)
+        for word, tid in term_ids.items():
+            self.__terms[tid] = word
+        self.__neighbours = neighbours
+        self.__similarities = similarities
+        self.__weight = weight
+
+    def get_num_neighbours(self):
+        return self.__neighbours.shape[1]
+
+    def get_num_terms(self):
+        return len(self.__terms)
+
+    def get_nbytes(self):
+        return self.__neighbours.nbytes + self.__similarities.nbytes
+
+    def get_related(self, word):
+        '''
+            Returns:
+                list, the (keyword, similarity) tuples of the keywords related to
+                word, best first, empty for a word out of the vocabulary.
+        '''
+        tid = self.__term_ids.get(word)
+        if tid is None:
+            return []
+        ret = []
+        for other, similarity in zip(self.__neighbours[tid].tolist(),
+                                     self.__similarities[tid].tolist()):
+            if other < 0:
+                break
+            ret.append((self.__terms[other], similarity))
+        return ret
+
+    def expand(self, query):
+        '''
+            Add to the query the keywords related to its keywords, weighted by
+            weight * similarity * the weight of the query keyword, the largest one
+            for a keyword related to several of them.
+
+            Returns:
+                list, the (keyword, weight) tuples added to the query.
+        '''
+        extra = {}
+        for word in list(query.get_terms()):
+            base = query.get_weight(word) * self.__weight
+            for other, similarity in self.get_related(word):
+                if other in query.get_terms():
+                    continue
+                extra[other] = max(extra.get(other, 0.0), base * similarity)
+        for word, weight in extra.items():
+            query.add_term(word, weight)
+        return list(extra.items())
+
+def top_neighbours(similarities, n):
+    '''
+        The n largest positive similarities of every row, best first.
+
+        Returns:
+            neighbours: np.array, rows x n int32 column ids, -1 after the last one.
+            similarities: np.array, rows x n float32 similarities.
+    '''
+    rows, width = similarities.shape
+    neighbours = np.full((rows, n), -1, dtype = np.int32)
+    values = np.zeros((rows, n), dtype = np.float32)
+    k = min(n, width)
+    if k == 0:
+        return neighbours, values
+    columns = np.argpartition(-similarities, k - 1, axis = 1)[:, : k]
+    best = np.take_along_axis(similarities, columns, axis = 1)
+    order = np.argsort(-best, axis = 1, kind = 'stable')
+    neighbours[:, : k] = np.take_along_axis(columns, order, axis = 1)
+    values[:, : k] = np.take_along_axis(best, order, axis = 1)
+    neighbours[values <= 0] = -1
+    values[values <= 0] = 0
+    return neighbours, values
+
+def cooccurrence_neighbours(statistics, n = 5, excluded = (), sample = 500,
+                            min_documents = 2, cells = 1 << 22):
+    '''
+        Relate the keywords occurring in the same documents: the similarity of
+        two keywords is the cosine of their tf / max_tf * idf weights over the
+        documents, summed from the triplets of the documents of every keyword.
+        A keyword contributes only its sample highest weighted documents, its
+        weights elsewhere taken as 0, which bounds the work to sample * the
+        document length per keyword, and two keywords sharing fewer than
+        min_documents of them are not related.
+
+        Args:
+            statistics: IndexStatistics, providing the triplets and the weights.
+            excluded: collection, the term ids never proposed, the stopwords.
+            cells: int, the size of the block of similarities computed at once.
+
+        Returns:
+            neighbours, similarities: np.array, see top_neighbours.
+    '''
+    dids, tids = statistics.get('triplets')[: 2]
+    weights = statistics.get('weights')
+    num_terms = len(statistics.get('term_ids'))
+    lengths = np.bincount(dids, minlength = statistics.get_num_documents())
+    starts = np.cumsum(lengths) - lengths
+    norms = np.sqrt(np.bincount(tids, weights ** 2, minlength = num_terms))
+
+    # the triplets of every keyword, its sample highest weighted first
+    order = np.lexsort((-weights, tids))
+    bounds = np.concatenate(([0], np.cumsum(np.bincount(tids, minlength = num_terms))))
+    kept = np.minimum(bounds[1 :] - bounds[: -1], sample)
+    sampled = np.repeat(np.arange(num_terms), kept)
+    sampled = np.sqrt(np.bincount(sampled, weights[order[
+        np.repeat(bounds[: -1], kept) + np.arange(len(sampled))
+        - np.repeat(np.cumsum(kept) - kept, kept)]] ** 2, minlength = num_terms))
+    excluded = np.array(sorted(excluded), dtype = np.int64)
+
+    block = max(1, cells // max(num_terms, 1))
+    neighbours = np.full((num_terms, n), -1, dtype = np.int32)
+    similarities = np.zeros((num_terms, n), dtype = np.float32)
+    for first in range(0, num_terms, block):
+        last = min(first + block, num_terms)
+        sources = np.repeat(np.arange(last - first), kept[first : last])
+        positions = order[np.repeat(bounds[first : last], kept[first : last])
+                          + np.arange(len(sources))
+                          - np.repeat(np.cumsum(kept[first : last]) - kept[first : last],
+                                      kept[first : last])]
+        # every triplet of the documents of every source keyword
+        spans = lengths[dids[positions]]
+        others = (np.repeat(starts[dids[positions]], spans) + np.arange(spans.sum())
+                  - np.repeat(np.cumsum(spans) - spans, spans))
+        keys = np.repeat(sources, spans) * num_terms + tids[others]
+        products = np.repeat(weights[positions], spans) * weights[others]
+        scores = np.bincount(keys, products, minlength = (last - first) * num_terms)
+        shared = np.bincount(keys, minlength = (last - first) * num_terms)
+        scores = scores.reshape(last - first, num_terms)
+        scores[shared.reshape(last - first, num_terms) < min_documents] = 0
+        norm = sampled[first : last, None] * norms[None, :]
+        scores = np.divide(scores, norm, out = np.zeros_like(scores), where = norm > 0)
+        scores[np.arange(last - first), np.arange(first, last)] = 0
+        scores[:, excluded] = 0
+        neighbours[first : last], similarities[first : last] = top_neighbours(scores, n)
+    return neighbours, similarities
+
+def multiply(rows, columns, values, matrix, num_rows, chunk = 4096):
+    '''
+        Product of the sparse matrix of the (rows, columns, values) triplets,
+        sorted by row, by a dense matrix, chunk triplets at a time.
+    '''
+    ret = np.zeros((num_rows, matrix.shape[1]))
+    for start in range(0, len(rows), chunk):
+        end = min(start + chunk, len(rows))
+        products = values[start : end, None] * matrix[columns[start : end]]
+        heads = np.flatnonzero(np.diff(rows[start : end])) + 1
+        heads = np.concatenate(([0], heads))
+        ret[rows[start : end][heads]] += np.add.reduceat(products, heads, axis = 0)
+    return ret
+
+def gram(rows, columns, values, num_rows, num_columns, chunk = 256):
+    '''
+        The num_rows x num_rows product S * S^T of the sparse matrix S of the
+        (rows, columns, values) triplets, sorted by row, chunk columns at a time.
+    '''
+    ret = np.zeros((num_rows, num_rows))
+    bounds = np.searchsorted(rows, np.arange(0, num_rows + chunk, chunk))
+    for first in range(0, num_rows, chunk):
+        last = min(first + chunk, num_rows)
+        start, end = bounds[first // chunk], bounds[first // chunk + 1]
+        block = np.zeros((num_columns, last - first))
+        block[columns[start : end], rows[start : end] - first] = values[start : end]
+        ret[:, first : last] = multiply(rows, columns, values, block, num_rows)
+    return ret
+
+def lsi_vectors(statistics, rank = 100, oversampling = None, iterations = 7, seed = 0,
+                exact = 2000):
+    '''
+        The LSI vectors of the keywords, the rows of U_k * Sigma_k for the rank
+        k truncated SVD of the keywords x documents matrix A of the tf / max_tf *
+        idf weights. When there are at most exact documents or keywords, the SVD
+        is exact, from the eigenvectors of A^T * A or A * A^T over the smaller
+        side. Otherwise it is computed by a randomized range finder of rank +
+        oversampling columns, rank by default, over the sparse triplets, with
+        iterations power iterations to separate the singular values: on 2000
+        documents forced through this path, 7 iterations give 97% of the top 5
+        neighbours of the exact SVD at rank 100 and 80% at rank 20, a single one
+        46% and 17%.
+
+        Returns:
+            np.array, num_terms x rank keyword vectors.
+    '''
+    dids, tids = statistics.get('triplets')[: 2]
+    weights = statistics.get('weights')
+    num_documents = statistics.get_num_documents()
+    num_terms = len(statistics.get('term_ids'))
+    by_term = np.argsort(tids, kind = 'stable')
+    t_tids, t_dids, t_weights = tids[by_term], dids[by_term], weights[by_term]
+    rank = max(1, min(rank, num_documents, num_terms))
+
+    if min(num_documents, num_terms) <= exact:
+        if num_documents <= num_terms:
+            values, vectors = np.linalg.eigh(gram(dids, tids, weights, num_documents,
+                                                  num_terms))
+            # A * V_k = U_k * Sigma_k
+            return multiply(t_tids, t_dids, t_weights, vectors[:, : : -1][:, : rank],
+                            num_terms)
+        values, vectors = np.linalg.eigh(gram(t_tids, t_dids, t_weights, num_terms,
+                                              num_documents))
+        singular = np.sqrt(np.maximum(values[: : -1][: rank], 0))
+        return vectors[:, : : -1][:, : rank] * singular
+
+    if oversampling is None:
+        oversampling = rank
+    width = min(rank + oversampling, num_documents, num_terms)
+    generator = np.random.RandomState(seed)
+    # the documents x width basis of the range of the documents x keywords matrix
+    basis = multiply(dids, tids, weights, generator.normal(size = (num_terms, width)),
+                     num_documents)
+    basis = np.linalg.qr(basis)[0]
+    for _ in range(iterations):
+        basis = np.linalg.qr(multiply(t_tids, t_dids, t_weights, basis, num_terms))[0]
+        basis = np.linalg.qr(multiply(dids, tids, weights, basis, num_documents))[0]
+    projected = multiply(t_tids, t_dids, t_weights, basis, num_terms)
+    u, s = np.linalg.svd(projected, full_matrices = False)[: 2]
+    return u[:, : rank] * s[: rank]
+
+def vector_neighbours(vectors, n = 5, excluded = (), cells = 1 << 22):
+    '''
+        Relate the keywords by the cosine of their vectors, a block of rows at
+        a time.
+    '''
+    num_terms = len(vectors)
+    lengths = np.linalg.norm(vectors, axis = 1)
+    vectors = vectors / np.where(lengths > 0, lengths, 1.0)[:, None]
+    excluded = np.array(sorted(excluded), dtype = np.int64)
+    block = max(1, cells // max(num_terms, 1))
+    neighbours = np.full((num_terms, n), -1, dtype = np.int32)
+    similarities = np.zeros((num_terms, n), dtype = np.float32)
+    for first in range(0, num_terms, block):
+        last = min(first + block, num_terms)
+        scores = np.dot(vectors[first : last], vectors.T)
+        scores[np.arange(last - first), np.arange(first, last)] = 0
+        scores[:, excluded] = 0
+        neighbours[first : last], similarities[first : last] = top_neighbours(scores, n)
+    return neighbours, similarities
+
+def stem(word):
+    '''
+        A light stem grouping the inflections the preprocessing keeps apart, e.g.
+        'bank', 'banking' and 'banker': strip one of STEM_SUFFIXES and a final
+        doubled consonant, keeping at least 4 characters.
+    '''
+    for suffix in STEM_SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 4:
+            word = word[: -len(suffix)]
+            break
+    if len(word) > 4 and word[-1] == word[-2] and word[-1] not in 'aeiouls':
+        word = word[: -1]
+    return word
+
+def add_variants(term_ids, neighbours, similarities, excluded):
+    '''
+        Put the keywords sharing the stem of every keyword first among its
+        neighbours, with similarity 1, the statistical neighbours filling the
+        rest of the row.
+    '''
+    excluded = set(excluded)
+    groups = {}
+    for word, tid in term_ids.items():
+        groups.setdefault(stem(word), []).append(tid)
+    n = neighbours.shape[1]
+    for group in groups.values():
+        if len(group) < 2:
+            continue
+        for tid in group:
+            variants = sorted(other for other in group
+                              if other != tid and other not in excluded)[: n]
+            rest = [(other, similarity) for other, similarity
+                    in zip(neighbours[tid].tolist(), similarities[tid].tolist())
+                    if other >= 0 and other not in variants]
+            row = [(other, 1.0) for other in variants] + rest
+            row = row[: n] + [(-1, 0.0)] * (n - len(row))
+            neighbours[tid] = [other for other, similarity in row]
+            similarities[tid] = [similarity for other, similarity in row]
+
+def build_related(method, statistics, stopwords = (), n = 5, weight = 0.5, rank = 100,
+                  min_idf = 1.5, variants = True):
+    '''
+        Compute the related keywords of the vocabulary by co-occurrence or by
+        the cosine of the LSI vectors at rank. The stopwords and the keywords
+        whose idf = log2(N / df) is below min_idf are never related: without
+        stopwords, the keywords of nearly every document such as 'said' would
+        be the neighbours of most keywords. With variants, the keywords sharing
+        a stem come first.
+
+        Returns:
+            RelatedTerms, the table of the n keywords related to every keyword.
+    '''
+    if method not in RELATED_METHODS:
+        raise ValueError('Unknown related terms method \'%s\', expected one of: %s'
+                         % (method, ', '.join(RELATED_METHODS)))
+    term_ids = statistics.get('term_ids')
+    # the idf of the scores and the stopwords, over the documents left indexed
+    frequent = derive_stopwords(statistics.get('document_frequency'),
+                                statistics.get('collection_size'), None, min_idf)
+    excluded = [term_ids[word] for word in set(stopwords) | set(frequent)
+                if word in term_ids]
+    if method == 'cooccurrence':
+        neighbours, similarities = cooccurrence_neighbours(statistics, n, excluded)
+    else:
+        neighbours, similarities = vector_neighbours(lsi_vectors(statistics, rank),
+                                                     n, excluded)
+    if variants:
+        add_variants(term_ids, neighbours, similarities, excluded)
+    return RelatedTerms(term_ids, neighbours, similarities, weight)
@@ -0,0 +1,370 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+def sorted_ids(candidates):
+    '''
+        The candidate document ids as a sorted array, an array being already
+        sorted as it comes from the inverted file or a boolean query.
+    '''
+    if isinstance(candidates, np.ndarray):
+        return candidates.astype(np.int32, copy = False)
+    return np.array(sorted(candidates), dtype = np.int32)
+
+class Scorer(object):
+    '''
+        Interface of a retrieval model. A scorer declares the statistics it
+        needs in requires, the index computes them once in prepare(), and a query
+        is then scored term at a time: the contribution of every query term is
+        computed for its whole posting list in one array operation and added to
+        a dense accumulator, and finalize() applies the per-document part of the
+        model to the candidates.
+
+        Attrs:
+            name: str, the name used to select the scorer on the command line.
+            requires: tuple, the names of the IndexStatistics the scorer uses.
+            statistics: IndexStatistics, the statistics of the index.
+            workers: int, the number of threads scoring a heavy query.
+            threshold: int, the number of postings from which a query is heavy.
+    '''
+    name = None
+    requires = ('postings', 'term_frequencies')
+
+    def __init__(self, statistics):
+        self.statistics = statistics
+        statistics.prepare(self.requires)
+        self.prepare()
+        self.set_workers(1)
+
+    def prepare(self):
+        pass
+
+    def term_scores(self, word, dids, tfs, query_weight):
+        raise NotImplementedError
+
+    def finalize(self, scores, dids, query):
+        return scores
+
+    def impacts(self, word, dids, tfs):
+        '''
+            Query independent contribution of every posting of a term, such that
+            the score of a document is the sum of impact * query weight over the
+            query terms, up to a factor depending only on the query. Used to build
+            the impact ordered index, models whose score has a per-document part
+            outside the query terms do not support it.
+        '''
+        raise NotImplementedError('Scorer \'%s\' does not support impact ordered postings.'
+                                  % self.name)
+
+    @classmethod
+    def supports_impacts(cls):
+        return cls.impacts is not Scorer.impacts
+
+    def query_weight(self, query, word):
+        return query.get_weight(word)
+
+    def set_workers(self, workers, threshold = 100000):
+        '''
+            Score the queries touching at least threshold postings on workers
+            threads, each over its own range of document ids. The array kernels
+            release the GIL, so the ranges are scored in parallel.
+        '''
+        self.__workers = workers
+        self.__threshold = threshold
+        self.__executor = None
+        if workers > 1:
+            self.__executor = ThreadPoolExecutor(max_workers = workers)
+
+    def get_workers(self):
+        return self.__workers
+
+    def close(self):
+        if self.__executor is not None:
+            self.__executor.shutdown(wait = False)
+            self.__executor = None
+            self.__workers = 1
+
+    def score(self, query, candidates = None):
+        '''
+            Score the documents for a query.
+
+            Args:
+                query: Vector, the vector instance of current query.
+                candidates: sequence, the document ids to be scored, by default all
+                the documents containing at least one of the query terms.
+
+            Returns:
+                dids: np.array, the ids of the scored documents in increasing order.
+                scores: np.array, the scores aligned with dids.
+        '''
+        if candidates is not None:
+            candidates = sorted_ids(candidates)
+        return self.score_range(query, 0, self.statistics.get_num_documents(), candidates)
+
+    def score_range(self, query, lo, hi, candidates = None):
+        '''
+            Score the documents whose id is in [lo, hi), every posting list is cut
+            to the range by binary search.
+
+            Args:
+                candidates: np.array, the sorted document ids to be scored, None for
+                the documents of the range containing one of the query terms.
+        '''
+        postings = self.statistics.get('postings')
+        frequencies = self.statistics.get('term_frequencies')
+        full = lo == 0 and hi == self.statistics.get_num_documents()
+        accumulator = np.zeros(hi - lo)
+        touched = np.zeros(hi - lo, dtype = bool) if candidates is None else None
+        selected = None
+        if candidates is not None:
+            start, end = np.searchsorted(candidates, (lo, hi))
+            selected = candidates[start : end]
+        for word in query.get_terms():
+            if word not in postings:
+                continue
+            dids = postings[word]
+            tfs = frequencies[word]
+            if not full:
+                start, end = np.searchsorted(dids, (lo, hi))
+                dids = dids[start : end]
+                tfs = tfs[start : end]
+            if selected is not None and len(dids) > len(selected):
+                # a long list such as the one of a stopword, look the candidates
+                # up in it instead of scoring all of its postings
+                dids, tfs = self.gather(dids, tfs, selected)
+            accumulator[dids - lo] += self.term_scores(word, dids, tfs,
+                                                       self.query_weight(query, word))
+            if touched is not None:
+                touched[dids - lo] = True
+
+        if candidates is None:
+            dids = (np.flatnonzero(touched) + lo).astype(np.int32)
+        else:
+            dids = selected
+
+        return dids, self.finalize(accumulator[dids - lo], dids, query)
+
+    def gather(self, dids, tfs, selected):
+        '''
+            Restrict a posting list to the selected document ids by binary search,
+            in O(len(selected) * log(len(dids))).
+        '''
+        positions = np.searchsorted(dids, selected)
+        found = positions < len(dids)
+        found[found] = dids[positions[found]] == selected[found]
+        return selected[found], tfs[positions[found]]
+
+    def top_range(self, query, n, lo, hi, candidates = None):
+        dids, scores = self.score_range(query, lo, hi, candidates)
+        if len(dids) > n:
+            # keep the documents tied with the n-th score for the tie break
+            threshold = -np.partition(-scores, n - 1)[n - 1]
+            selected = scores >= threshold
+            dids = dids[selected]
+            scores = scores[selected]
+        order = np.lexsort((dids, -scores))[: n]
+        return [(int(dids[i]), float(scores[i])) for i in order]
+
+    def top_budget(self, query, n, budget, skip = (), chunk = 16384, rescore = 4):
+        '''
+            Find the n highest scored documents within a Budget. The query terms
+            are processed in decreasing idf order, so the rare terms weighing most
+            in the scores come first, and every posting list chunk postings at a
+            time, the budget being checked before every chunk. When the budget
+            runs out, the documents with the rescore * n highest partial scores
+            are scored again over all the query terms, by binary search in the
+            posting lists left out, and ranked on their exact scores. Runs on the
+            calling thread.
+
+            Args:
+                budget: Budget, the started limits of the query.
+                skip: collection, the query terms only adding to the scores of the
+                documents containing another query term, the stopwords.
+
+            Returns:
+                result: list, containing n (did, score) tuples.
+                approximate: bool, True if the budget ran out before every posting
+                was processed.
+        '''
+        postings = self.statistics.get('postings')
+        frequencies = self.statistics.get('term_frequencies')
+        document_frequency = self.statistics.get('document_frequency')
+        num_documents = self.statistics.get_num_documents()
+        words = [word for word in query.get_terms() if word in postings]
+        words.sort(key = lambda word: (word in skip, document_frequency[word], word))
+
+        accumulator = np.zeros(num_documents)
+        touched = np.zeros(num_documents, dtype = bool)
+        approximate = False
+        for word in words:
+            dids = postings[word]
+            tfs = frequencies[word]
+            if word in skip:
+                # the stopwords come last, once every candidate is touched
+                selected = np.flatnonzero(touched).astype(np.int32)
+                if len(dids) > len(selected):
+                    dids, tfs = self.gather(dids, tfs, selected)
+            query_weight = self.query_weight(query, word)
+            start = 0
+            while start < len(dids):
+                end = start + budget.allowance(min(chunk, len(dids) - start))
+                if end == start:
+                    approximate = True
+                    break
+                accumulator[dids[start : end]] += self.term_scores(
+                    word, dids[start : end], tfs[start : end], query_weight)
+                if word not in skip:
+                    touched[dids[start : end]] = True
+                budget.spend(end - start)
+                start = end
+            if approximate:
+                break
+
+        dids = np.flatnonzero(touched).astype(np.int32)
+        scores = self.finalize(accumulator[dids], dids, query)
+        # the partial scores miss the terms left out, rescore a deeper pool
+        depth = n * rescore if approximate else n
+        if len(dids) > depth:
+            threshold = -np.partition(-scores, depth - 1)[depth - 1]
+            selected = scores >= threshold
+            dids = dids[selected]
+            scores = scores[selected]
+        if approximate:
+            return self.top_range(query, n, 0, num_documents, dids), True
+        order = np.lexsort((dids, -scores))[: n]
+        return [(int(dids[i]), float(scores[i])) for i in order], False
+
+    def workload(self, query):
+        postings = self.statistics.get('postings')
+        return sum(len(postings[word]) for word in query.get_terms() if word in postings)
+
+    def top(self, query, n, candidates = None):
+        '''
+            Find the n highest scored documents, ties broken by document id. Heavy
+            queries are split into document id ranges scored on the worker threads,
+            every range keeps its own top n and the partial results are merged.
+
+            Returns:
+                list, containing n (did, score) tuples.
+        '''
+        num_documents = self.statistics.get_num_documents()
+        if candidates is not None:
+            candidates = sorted_ids(candidates)
+
+        workers = self.get_workers()
+        if workers <= 1 or self.workload(query) < self.__threshold:
+            return self.top_range(query, n, 0, num_documents, candidates)
+
+        bounds = np.linspace(0, num_documents, workers + 1).astype(int)
+        futures = [self.__executor.submit(self.top_range, query, n, bounds[i],
+                                          bounds[i + 1], candidates)
+                   for i in range(workers)]
+        results = []
+        for future in futures:
+            results.extend(future.result())
+        results.sort(key = lambda x: (-x[1], x[0]))
+        return results[: n]
+
+class CosineScorer(Scorer):
+    '''
+        The tf / max_tf * idf weighted vector space model with cosine similarity,
+        idf = log2(N / df) and the raw query term frequencies as query weights.
+    '''
+    name = 'cosine'
+    requires = ('postings', 'term_frequencies', 'idf', 'max_tf', 'magnitude')
+
+    def prepare(self):
+        self.__idf = self.statistics.get('idf')
+        self.__max_tf = self.statistics.get('max_tf')
+        self.__magnitude = self.statistics.get('magnitude')
+
+    def term_scores(self, word, dids, tfs, query_weight):
+        return tfs / self.__max_tf[dids] * (self.__idf[word] * query_weight)
+
+    def finalize(self, scores, dids, query):
+        query_magnitude = np.sqrt(sum(weight ** 2 for weight in query.get_weights()))
+        norm = self.__magnitude[dids] * query_magnitude
+        return np.divide(scores, norm, out = np.zeros(len(dids)), where = norm > 0)
+
+    def impacts(self, word, dids, tfs):
+        norm = self.__magnitude[dids]
+        weights = self.term_scores(word, dids, tfs, 1.0)
+        return np.divide(weights, norm, out = np.zeros(len(dids)), where = norm > 0)
+
+class BM25Scorer(Scorer):
+    '''
+        Okapi BM25 with idf = ln(1 + (N - df + 0.5) / (df + 0.5)). The length
+        normalization k1 * (1 - b + b * dl / avgdl) of every document is computed
+        once when the scorer is created.
+    '''
+    name = 'bm25'
+    requires = ('postings', 'term_frequencies', 'collection_size', 'document_frequency',
+                'document_length', 'average_length')
+
+    def __init__(self, statistics, k1 = 1.2, b = 0.75):
+        self.__k1 = k1
+        self.__b = b
+        Scorer.__init__(self, statistics)
+
+    def prepare(self):
+        collection_size = self.statistics.get('collection_size')
+        document_frequency = self.statistics.get('document_frequency')
+        self.__idf = {}
+        for word in self.statistics.get('postings').keys():
+            df = document_frequency[word]
+            self.__idf[word] = np.log(1 + (collection_size - df + 0.5) / (df + 0.5))
+
+        average_length = max(self.statistics.get('average_length'), 1.0)
+        length = self.statistics.get('document_length')
+        self.__norm = self.__k1 * (1 - self.__b + self.__b * length / average_length)
+
+    def term_scores(self, word, dids, tfs, query_weight):
+        return (tfs * (self.__k1 + 1) / (tfs + self.__norm[dids])
+                * (self.__idf[word] * query_weight))
+
+    def impacts(self, word, dids, tfs):
+        return self.term_scores(word, dids, tfs, 1.0)
+
+class DirichletScorer(Scorer):
+    '''
+        Query likelihood language model with Dirichlet prior smoothing, in the
+        rank equivalent form sum(qtf * ln(1 + tf / (mu * P(t|C)))) +
+        |q| * ln(mu / (dl + mu)).
+    '''
+    name = 'dirichlet'
+    requires = ('postings', 'term_frequencies', 'collection_frequency',
+                'collection_length', 'document_length')
+
+    def __init__(self, statistics, mu = 2000.0):
+        self.__mu = mu
+        Scorer.__init__(self, statistics)
+
+    def prepare(self):
+        collection_length = max(self.statistics.get('collection_length'), 1.0)
+        collection_frequency = self.statistics.get('collection_frequency')
+        self.__collection_frequency = collection_frequency
+        self.__background = {}
+        for word in self.statistics.get('postings').keys():
+            self.__background[word] = self.__mu * collection_frequency[word] / collection_length
+        self.__length_prior = np.log(self.__mu / (self.statistics.get('document_length')
+                                                  + self.__mu))
+
+    def term_scores(self, word, dids, tfs, query_weight):
+        return np.log1p(tfs / self.__background[word]) * query_weight
+
+    def finalize(self, scores, dids, query):
+        query_length = 0.0
+        for word in query.get_terms():
+            if word in self.__collection_frequency:
+                query_length += query.get_weight(word)
+        return scores + query_length * self.__length_prior[dids]
+
+SCORERS = {}
+for scorer in (CosineScorer, BM25Scorer, DirichletScorer):
+    SCORERS[scorer.name] = scorer
+
+def create_scorer(name, statistics):
+    if name not in SCORERS:
+        raise ValueError('Unknown scorer \'%s\', expected one of: %s'
+                         % (name, ', '.join(sorted(SCORERS.keys()))))
+    return SCORERS[name](statistics)
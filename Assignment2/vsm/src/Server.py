@@ -0,0 +1,204 @@
+#!/usr/bin/python
+
+import json
+import signal
+import argparse
+from urllib.parse import urlparse, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from VectorSpace import VSM
+from Snapshot import LiveIndex
+from Scorer import SCORERS
+from Backend import BACKENDS
+from Related import RELATED_METHODS
+from TermDictionary import has_wildcard
+
+class SearchHandler(BaseHTTPRequestHandler):
+    '''
+        Answer GET /search?q=<query text>&n=<number of documents> with the JSON
+        object {"query": keywords, "results": [{"did": did, "score": score}, ...],
+        "approximate": bool}, the document ids numbered from 1 as in the output
+        of Main.py. The optional deadline=<milliseconds> and budget=<postings>
+        limit the query instead of the limits of the server, "approximate" being
+        true when the query was cut short.
+
+        GET /page?q=<query text>&size=<page size> answers the first page of the
+        ranking and a cursor, GET /page?cursor=<cursor>&size=<page size> the next
+        one, as {"results": [...], "cursor": cursor or null after the last page}.
+
+        POST /reload?path=<collection or index file> loads the index again, by
+        default from the same path, in the background and swaps it in without
+        interrupting the queries; the cursors opened before the swap expire. The
+        path must be the one the server started from or lie inside a folder
+        given with --reload-folder, else the answer is 403.
+        GET /status answers the version and source of the serving index.
+    '''
+    index = None
+
+    def send_json(self, status, value):
+        data = json.dumps(value).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def get_words(self, vsm, text):
+        if has_wildcard(text):
+            return vsm.expand_wildcards(text)
+        return vsm.pre_process(text)
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != '/reload':
+            self.send_json(404, {'error': 'unknown path \'%s\'' % url.path})
+            return
+        path = parse_qs(url.query).get('path', [None])[0]
+        try:
+            version = self.index.reload(path)
+        except PermissionError as e:
+            self.send_json(403, {'error': str(e)})
+            return
+        except ValueError as e:
+            self.send_json(409, {'error': str(e)})
+            return
+        self.send_json(202, {'version': version})
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == '/status':
+            self.send_json(200, self.index.get_status())
+            return
+        if url.path not in ('/search', '/page'):
+            self.send_json(404, {'error': 'unknown path \'%s\'' % url.path})
+            return
+        parameters = parse_qs(url.query)
+        if 'q' not in parameters and (url.path == '/search' or 'cursor' not in parameters):
+            self.send_json(400, {'error': 'missing parameter \'q\''})
+            return
+        try:
+            n = int(parameters.get('n', ['3'])[0])
+            size = int(parameters.get('size', ['10'])[0])
+            budget = parameters.get('budget', [None])[0]
+            if budget is not None:
+                budget = int(budget)
+        except ValueError:
+            self.send_json(400, {'error': 'parameters \'n\', \'size\' and \'budget\' '
+                                          'are integers'})
+            return
+        deadline = parameters.get('deadline', [None])[0]
+        try:
+            if deadline is not None:
+                deadline = float(deadline) / 1000.0
+        except ValueError:
+            self.send_json(400, {'error': 'parameter \'deadline\' is a number'})
+            return
+
+        if url.path == '/page':
+            try:
+                with self.index.reading() as vsm:
+                    if 'cursor' in parameters:
+                        page, cursor = vsm.next_page(parameters['cursor'][0], size)
+                    else:
+                        page, cursor = vsm.search_page(
+                            self.get_words(vsm, parameters['q'][0]), size)
+            except ValueError as e:
+                self.send_json(404, {'error': str(e)})
+                return
+            self.send_json(200, {
+                'results': [{'did': did + 1, 'score': score} for did, score in page],
+                'cursor': cursor,
+            })
+            return
+
+        with self.index.reading() as vsm:
+            words = self.get_words(vsm, parameters['q'][0])
+            result, approximate = vsm.search(words, n, deadline, budget)
+        self.index.remember(words, n)
+        self.send_json(200, {
+            'query': words,
+            'results': [{'did': did + 1, 'score': score} for did, score in result],
+            'approximate': approximate,
+        })
+
+    def log_message(self, format, *args):
+        pass
+
+class SearchServer(ThreadingHTTPServer):
+    # the default backlog of 5 drops connections under concurrent clients
+    request_queue_size = 128
+    daemon_threads = True
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Serve the VSM search over HTTP')
+    parser.add_argument('-c', '--collection', type = str, default = None,
+                        help = 'Path of the documents collection file')
+    parser.add_argument('--load-index', type = str, default = None,
+                        help = 'Load the index from this file instead of the collection')
+    parser.add_argument('-s', '--scorer', type = str, default = 'cosine',
+                        choices = sorted(SCORERS.keys()),
+                        help = 'Retrieval model used to rank the documents')
+    parser.add_argument('--backend', type = str, default = 'auto',
+                        choices = ['auto'] + sorted(BACKENDS.keys()),
+                        help = 'Query engine, chosen from the collection by default')
+    parser.add_argument('-i', '--index', type = str, default = 'document',
+                        choices = ['document', 'impact'],
+                        help = 'Postings ordered by document id, or by impact')
+    parser.add_argument('--budget', type = int, default = None,
+                        help = 'Largest number of postings processed per query')
+    parser.add_argument('--deadline', type = float, default = None,
+                        help = 'Largest time in milliseconds spent scoring a query')
+    parser.add_argument('-t', '--threads', type = int, default = 1,
+                        help = 'Number of threads scoring the queries with many postings')
+    parser.add_argument('--related', type = str, default = None,
+                        choices = RELATED_METHODS,
+                        help = 'Relate the keywords by co-occurrence or LSI and expand '
+                               'the queries with the related keywords')
+    parser.add_argument('--reload-folder', type = str, action = 'append',
+                        default = [],
+                        help = 'Folder POST /reload may read other collection or index '
+                               'files from, repeatable')
+    parser.add_argument('--host', type = str, default = 'localhost',
+                        help = 'Address the server listens on')
+    parser.add_argument('-p', '--port', type = int, default = 8000,
+                        help = 'Port the server listens on')
+    args = parser.parse_args()
+    COLLECTION_FOLDER = '../collection'
+    if args.load_index is not None:
+        collections = args.load_index
+    elif args.collection is not None:
+        collections = '%s/%s' % (COLLECTION_FOLDER, args.collection)
+    else:
+        parser.error('one of the arguments -c/--collection --load-index is required')
+
+    deadline = None
+    if args.deadline is not None:
+        deadline = args.deadline / 1000.0
+
+    def build(source):
+        return VSM(source, args.scorer, args.index, args.budget, args.threads,
+                   backend = args.backend, deadline = deadline, related = args.related)
+
+    try:
+        SearchHandler.index = LiveIndex(build, collections, folders = args.reload_folder)
+    except ValueError as e:
+        parser.error(str(e))
+    def reload(signum, frame):
+        try:
+            SearchHandler.index.reload()
+        except ValueError:
+            pass
+
+    if hasattr(signal, 'SIGHUP'):
+        # kill -HUP reloads from the same path
+        signal.signal(signal.SIGHUP, reload)
+    server = SearchServer((args.host, args.port), SearchHandler)
+    print('Serving on http://%s:%d/search' % server.server_address[: 2])
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    server.server_close()
+
+if __name__ == '__main__':
+    main()
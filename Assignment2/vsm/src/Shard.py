@@ -0,0 +1,136 @@
+from multiprocessing.connection import Client
+
+from Vector import Vector
+from VectorSpace import VSM
+from BooleanQuery import BooleanQuery
+from DataManager import DataManager
+
+class Shard(VSM):
+    '''
+        One partition of the collection, served by its own worker process. The
+        shard keeps the documents whose number modulo num_shards is shard_id and
+        answers the requests of the coordinator, see ShardedVSM.
+
+        Attrs:
+            shard_id: int, the number of this shard.
+            num_shards: int, the number of shards the collection is split into.
+            word_file_map: dictionary, map keywords to a list of local document id.
+            documents: list, the documents of this shard.
+            data_manager: DataManager, built once the collection wide statistics
+            are known.
+    '''
+    def __init__(self, input_path, shard_id, num_shards, scorer = 'cosine',
+                 index = 'document', budget = None, backend = 'auto'):
+        self.__shard_id = shard_id
+        self.__num_shards = num_shards
+        self.__scorer = scorer
+        self.__index = index
+        self.__budget = budget
+        self.__backend = backend
+        self.__word_file_map, self.__documents = self.load_documents(input_path, shard_id,
+                                                                     num_shards)
+        self.__data_manager = None
+
+    def get_global_id(self, did):
+        return did * self.__num_shards + self.__shard_id
+
+    def get_statistics(self):
+        '''
+            Statistics of this shard which are summed over all the shards into the
+            collection wide statistics.
+        '''
+        document_frequency = {}
+        collection_frequency = {}
+        for word, dids in self.__word_file_map.items():
+            document_frequency[word] = len(dids)
+            collection_frequency[word] = sum(self.__documents[did].get_tf(word)
+                                             for did in dids)
+        return {
+            'collection_size': len(self.__documents),
+            'document_frequency': document_frequency,
+            'collection_frequency': collection_frequency,
+            'collection_length': sum(collection_frequency.values()),
+        }
+
+    def build(self, collection, stopwords = ()):
+        self.__data_manager = DataManager(self.__word_file_map, self.__documents,
+                                          self.__scorer, self.__index, self.__budget,
+                                          collection, stopwords = stopwords,
+                                          backend = self.__backend)
+        return len(self.__documents)
+
+    def describe(self, query_result):
+        return (self.get_global_id(query_result.get_id()), query_result.get_sim_score(),
+                query_result.get_num(), query_result.get_magnitude(),
+                [word for word, dids in query_result.get_list()],
+                query_result.is_approximate())
+
+    def search(self, words, n, generating = None):
+        query = Vector(words)
+        for word in query.get_terms():
+            query.set_weight(word, query.get_tf(word))
+
+        result, approximate = self.__data_manager.top(query, n, generating = generating)
+        return [self.describe(query_result) for query_result
+                in self.__data_manager.build_results(result, approximate)]
+
+    def boolean_search(self, text, n, rank):
+        boolean_query = BooleanQuery(text, self.pre_process)
+        query = Vector(boolean_query.get_terms())
+        for word in query.get_terms():
+            query.set_weight(word, query.get_tf(word))
+
+        query_result, num_matched = self.__data_manager.get_boolean_result(
+            boolean_query, query, rank, n, False)
+        return [self.describe(result) for result in query_result], num_matched
+
+    def expand(self, pattern):
+        return self.__data_manager.expand_terms(pattern)
+
+    def suggest(self, word, n):
+        suggestions = self.__data_manager.suggest_terms(word, n)
+        return [(self.__data_manager.distance(word, term), term) for term in suggestions]
+
+    def positions(self, word):
+        dids = self.__data_manager.get_documents_by_term(word)
+        if dids is None:
+            return []
+        return [(self.get_global_id(did), self.__documents[did].get_term_index(word))
+                for did in dids]
+
+HANDLERS = {
+    'statistics': Shard.get_statistics,
+    'build': Shard.build,
+    'search': Shard.search,
+    'boolean': Shard.boolean_search,
+    'expand': Shard.expand,
+    'suggest': Shard.suggest,
+    'positions': Shard.positions,
+}
+
+def serve(address, authkey, input_path, shard_id, num_shards, scorer, index, budget,
+          backend = 'auto'):
+    '''
+        Entry of a shard worker process: connect to the coordinator listening on
+        address, load the shard, report whether it loaded and answer the requests
+        of the coordinator until 'close'. The connection is opened first, so that
+        a shard failing to load tells the coordinator instead of leaving it waiting.
+    '''
+    connection = Client(address, authkey = authkey)
+    connection.send(shard_id)
+    try:
+        shard = Shard(input_path, shard_id, num_shards, scorer, index, budget, backend)
+    except Exception as e:
+        connection.send(('error', '%s: %s' % (type(e).__name__, e)))
+        connection.close()
+        return
+    connection.send(('ok', None))
+    while True:
+        message = connection.recv()
+        if message[0] == 'close':
+            break
+        try:
+            connection.send(('ok', HANDLERS[message[0]](shard, *message[1:])))
+        except Exception as e:
+            connection.send(('error', '%s: %s' % (type(e).__name__, e)))
+    connection.close()
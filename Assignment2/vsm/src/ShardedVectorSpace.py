@@ -0,0 +1,282 @@
+import os
+import time
+from multiprocessing import Process
+from multiprocessing.connection import Listener
+
+from Shard import serve
+from VectorSpace import VSM
+from DataManager import check_options
+from BooleanQuery import BooleanQuery
+from Stopwords import derive_stopwords
+from TermDictionary import WILDCARDS, has_wildcard
+
+class ShardedVSM(VSM):
+    '''
+        Coordinator of a sharded deployment. The collection is partitioned into
+        num_shards shards, document number i going to shard i % num_shards, and
+        every shard is loaded and served by its own worker process connected over
+        a local socket.
+
+        Before the shards build their index, the coordinator sums the document
+        frequencies, collection frequencies and sizes of all the shards and sends
+        them back, so that every shard weights its documents with the collection
+        wide idf, and the stopwords derived from the collection wide document
+        frequencies. A query is broadcast to all the shards, which score it in
+        parallel and return their own top n, and the coordinator merges them; the
+        result is identical to the one of a single VSM over the whole collection.
+
+        A shard failing to load or exiting is reported as a RuntimeError, after
+        the other workers are stopped.
+
+        Attrs:
+            connections: list, the connections to the shards, by shard id.
+            processes: list, the worker processes, by shard id.
+            document_frequency: dictionary, the collection wide document frequency
+            of every keyword.
+            stopwords: list, the stopwords of the collection.
+    '''
+    def __init__(self, input_path, num_shards, scorer = 'cosine', index = 'document',
+                 budget = None, max_df = None, min_idf = None, backend = 'auto'):
+        check_options(scorer, index, backend)
+        authkey = os.urandom(16)
+        listener = Listener(('localhost', 0), backlog = num_shards, authkey = authkey)
+        self.__processes = []
+        for shard_id in range(num_shards):
+            process = Process(target = serve,
+                              args = (listener.address, authkey, input_path, shard_id,
+                                      num_shards, scorer, index, budget, backend))
+            process.daemon = True
+            process.start()
+            self.__processes.append(process)
+
+        # every worker connects before loading its shard, then reports the load
+        self.__connections = [None] * num_shards
+        for _ in range(num_shards):
+            connection = listener.accept()
+            self.__connections[connection.recv()] = connection
+        listener.close()
+        for shard_id in range(num_shards):
+            status, value = self.receive(shard_id)
+            if status == 'error':
+                self.terminate()
+                raise RuntimeError('Shard %d failed to load: %s' % (shard_id, value))
+
+        collection = {'collection_size': 0, 'document_frequency': {},
+                      'collection_frequency': {}, 'collection_length': 0}
+        for statistics in self.broadcast('statistics'):
+            collection['collection_size'] += statistics['collection_size']
+            collection['collection_length'] += statistics['collection_length']
+            for key in ('document_frequency', 'collection_frequency'):
+                total = collection[key]
+                for word, value in statistics[key].items():
+                    total[word] = total.get(word, 0) + value
+        self.__document_frequency = collection['document_frequency']
+        self.__stopwords = derive_stopwords(self.__document_frequency,
+                                            collection['collection_size'], max_df, min_idf)
+        self.broadcast('build', collection, self.__stopwords)
+
+    def broadcast(self, *message):
+        '''
+            Send a request to all the shards, then wait for all the replies, so
+            that the shards work on it in parallel.
+
+            Returns:
+                list, the replies by shard id.
+        '''
+        for shard_id, connection in enumerate(self.__connections):
+            try:
+                connection.send(message)
+            except OSError:
+                self.fail(shard_id)
+        ret = []
+        for shard_id in range(len(self.__connections)):
+            status, value = self.receive(shard_id)
+            if status == 'error':
+                raise RuntimeError('Shard request \'%s\' failed: %s' % (message[0], value))
+            ret.append(value)
+        return ret
+
+    def receive(self, shard_id, interval = 0.5):
+        '''
+            Wait for the next reply of a shard, checking every interval seconds
+            that its worker is still alive. Raises RuntimeError if it exited.
+        '''
+        connection = self.__connections[shard_id]
+        process = self.__processes[shard_id]
+        try:
+            while not connection.poll(interval):
+                if not process.is_alive() and not connection.poll():
+                    raise EOFError
+            return connection.recv()
+        except (EOFError, OSError):
+            self.fail(shard_id, interval)
+
+    def fail(self, shard_id, interval = 0.5):
+        '''
+            Stop all the workers after the worker of a shard was lost, and raise
+            RuntimeError.
+        '''
+        process = self.__processes[shard_id]
+        process.join(interval)
+        exitcode = process.exitcode
+        self.terminate()
+        raise RuntimeError('Shard %d exited with code %s' % (shard_id, exitcode))
+
+    def terminate(self):
+        for process in self.__processes:
+            process.terminate()
+            process.join()
+        for connection in self.__connections:
+            if connection is not None:
+                connection.close()
+        self.__connections = []
+        self.__processes = []
+
+    def close(self):
+        for connection in self.__connections:
+            connection.send(('close',))
+            connection.close()
+        for process in self.__processes:
+            process.join()
+        self.__connections = []
+        self.__processes = []
+
+    def get_num_shards(self):
+        return len(self.__connections)
+
+    def get_stopwords(self):
+        return self.__stopwords
+
+    def merge(self, replies, n, rank = True):
+        results = []
+        for reply in replies:
+            results.extend(reply)
+        if rank:
+            results.sort(key = lambda x: (-x[1], x[0]))
+        else:
+            results.sort(key = lambda x: x[0])
+        return results[: n]
+
+    def search(self, words, n = 3):
+        '''
+            Find the n highest scored documents of the collection.
+
+            Returns:
+                list, containing n tuples (did, score, number of unique keywords,
+                magnitude, top five keywords, approximate) with collection wide
+                document ids.
+        '''
+        return self.merge(self.broadcast('search', words, n, self.skip_stopwords(words)), n)
+
+    def skip_stopwords(self, words):
+        '''
+            Drop the stopwords from the query words generating the candidate
+            documents, unless no other query word is in the collection, decided
+            over the whole collection since a shard only knows its own keywords.
+
+            Returns:
+                list, the generating keywords, None when there is no stopword.
+        '''
+        if len(self.__stopwords) == 0:
+            return None
+        stopwords = frozenset(self.__stopwords)
+        remained = [word for word in words if word not in stopwords]
+        for word in remained:
+            if word in self.__document_frequency:
+                return remained
+        return list(words)
+
+    def expand_pattern(self, token):
+        pattern = ''
+        for char in token.lower():
+            if char.isalpha() or char in WILDCARDS:
+                pattern += char
+        words = set()
+        for expansion in self.broadcast('expand', pattern):
+            words.update(expansion)
+        return sorted(words)
+
+    def report_missing_terms(self, words):
+        for word in words:
+            if word not in self.__document_frequency:
+                self.report_missing(word)
+
+    def report_missing(self, word, n = 3):
+        print('\'%s\' has not been collected in the vocabulary.' % word, end = '')
+        # a shard ranks equally close terms by its own frequencies, ask for more
+        # than n and rank them again with the collection wide frequencies
+        ranked = set()
+        for reply in self.broadcast('suggest', word, 10 * n):
+            for distance, term in reply:
+                ranked.add((distance, -self.__document_frequency[term], term))
+        suggestions = [term for distance, frequency, term in sorted(ranked)[: n]]
+        if len(suggestions) > 0:
+            print(' Did you mean: %s?' % ', '.join(suggestions), end = '')
+        print()
+
+    def display_results(self, results):
+        positions = {}
+        for did, sim, num_terms, magnitude, words, approximate in results:
+            for word in words:
+                if word not in positions:
+                    postings = []
+                    for reply in self.broadcast('positions', word):
+                        postings.extend(reply)
+                    positions[word] = sorted(postings)
+
+        for did, sim, num_terms, magnitude, words, approximate in results:
+            print('DID: %d' % (did + 1))
+            for word in words:
+                print('%-8s -> |' % word, end = '')
+                for posting_did, term_index in positions[word]:
+                    print(' D%d:%s |' % (posting_did + 1,
+                                         ','.join(str(i) for i in term_index)), end = '')
+                print()
+            print('Number of unique keywords in document: %s' % num_terms)
+            print('Magnitude of the document vector: %.2f' % magnitude)
+            if approximate:
+                print('Similarity score: %.2f (approximate)' % sim)
+            else:
+                print('Similarity score: %.2f' % sim)
+            print('----------------------------------------')
+
+    def do_query(self, query):
+        print('----------------------------------------')
+        start = time.time()
+
+        self.report_missing_terms(query)
+        self.display_results(self.search(query))
+
+        end = time.time()
+        print('Spended Time: %.6fs\n' % (end - start))
+
+    def boolean_query(self, text, rank = True):
+        print('----------------------------------------')
+        start = time.time()
+
+        # expand the wildcards over the whole vocabulary, a shard only knows its own
+        tokens = []
+        for token in text.replace('(', ' ( ').replace(')', ' ) ').split():
+            if has_wildcard(token):
+                expansions = self.expand_pattern(token)
+                if len(expansions) > 0:
+                    token = '( %s )' % ' OR '.join(expansions)
+            tokens.append(token)
+        text = ' '.join(tokens)
+
+        try:
+            boolean_query = BooleanQuery(text, self.pre_process)
+        except ValueError as e:
+            print(e)
+            print()
+            return
+        self.report_missing_terms(boolean_query.get_terms())
+
+        replies = self.broadcast('boolean', text, 3, rank)
+        num_matched = sum(reply[1] for reply in replies)
+        print('Number of matched documents: %d' % num_matched)
+        print('----------------------------------------')
+        self.display_results(self.merge([reply[0] for reply in replies], 3, rank))
+
+        end = time.time()
+        print('Spended Time: %.6fs\n' % (end - start))
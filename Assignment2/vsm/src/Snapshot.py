@@ -0,0 +1,226 @@
+import os
+import gc
+import time
+import threading
+from itertools import islice
+from collections import deque
+from contextlib import contextmanager
+
+from Accounting import is_component
+
+def dismantle(value, chunk = 1000):
+    '''
+        Free the structures of a retired index chunk items at a time, letting
+        the other threads run in between: freeing a large index at once holds
+        the interpreter for as long as its millions of objects take to free.
+    '''
+    if is_component(value):
+        attributes = vars(value)
+        for item in list(attributes.values()):
+            dismantle(item, chunk)
+        attributes.clear()
+    elif isinstance(value, list):
+        while len(value) > 0:
+            for item in value[-chunk :]:
+                if isinstance(item, (list, dict)) and len(item) > chunk:
+                    dismantle(item, chunk)
+            del value[-chunk :]
+            time.sleep(0)
+    elif isinstance(value, dict):
+        while len(value) > 0:
+            for key in list(islice(value, chunk)):
+                item = value.pop(key)
+                if is_component(item) or (isinstance(item, (list, dict))
+                                          and len(item) > chunk):
+                    dismantle(item, chunk)
+            time.sleep(0)
+
+class Snapshot(object):
+    '''
+        One loaded VSM and the number of references to it: one held by the
+        LiveIndex while the snapshot is current and one per query reading it.
+        The VSM is closed when the last reference is released.
+
+        Attrs:
+            vsm: VSM, the index of this snapshot.
+            version: int, increasing with every reload.
+            source: str, the collection or index file the VSM was loaded from.
+            references: int, the number of holders of the snapshot.
+    '''
+    def __init__(self, vsm, version, source):
+        self.vsm = vsm
+        self.version = version
+        self.source = source
+        self.__references = 1
+        self.__lock = threading.Lock()
+
+    def get_references(self):
+        return self.__references
+
+    def acquire(self):
+        with self.__lock:
+            self.__references += 1
+
+    def release(self):
+        with self.__lock:
+            self.__references -= 1
+            closed = self.__references == 0
+        if closed:
+            vsm = self.vsm
+            self.vsm = None
+            vsm.close()
+            threading.Thread(target = dismantle, args = (vsm,), daemon = True).start()
+
+class LiveIndex(object):
+    '''
+        A VSM that can be reloaded while it is serving. The new index is built or
+        opened on a background thread while the queries keep reading the current
+        snapshot, warmed up with the recent queries, then swapped in under a lock
+        held only for the assignment. A query acquires the snapshot current when
+        it starts and finishes on it, and a replaced snapshot is closed when its
+        last query releases it. The caches belong to a snapshot, so the open
+        cursors and the loaded postings of the old index are dropped with it.
+
+        A full collection of the garbage collector walks every object of the
+        index and stops all the threads for as long, so the automatic collections
+        are suspended during a build and the loaded index is frozen out of them.
+        gc.freeze() is process-wide: it moves every object alive at the time,
+        not only the index, to the permanent generation, and it is applied again
+        after every successful reload, so the objects frozen with a replaced
+        snapshot are only freed by their reference counts, never by a collection
+        of cycles, see load.
+
+        A reload reads the source the index was first loaded from, or a file
+        inside one of the allowed folders, so a client cannot make the server
+        open any other file.
+
+        Attrs:
+            build: function, loads a VSM from a source path.
+            sources: set, the real paths reloads may always read.
+            folders: list, the real paths of the folders reloads may read from.
+            current: Snapshot, the snapshot new queries read.
+            retired: list, the replaced snapshots still read by some query.
+            recent: deque, the words and n of the latest searches, replayed on
+            a new snapshot before the swap.
+            reloading: threading.Thread, the running reload, None if there is none.
+            error: str, the error of the last failed reload, None if it succeeded.
+    '''
+    def __init__(self, build, source, warm_queries = 100, folders = ()):
+        self.__build = build
+        self.__sources = {os.path.realpath(source)}
+        self.__folders = [os.path.realpath(folder) for folder in folders]
+        self.__lock = threading.Lock()
+        self.__current = Snapshot(build(source), 1, source)
+        gc.freeze()
+        self.__retired = []
+        self.__recent = deque(maxlen = warm_queries)
+        self.__reloading = None
+        self.__error = None
+
+    def acquire(self):
+        with self.__lock:
+            snapshot = self.__current
+            snapshot.acquire()
+        return snapshot
+
+    @contextmanager
+    def reading(self):
+        '''
+            Yield the VSM of the current snapshot, kept open until the block ends.
+        '''
+        snapshot = self.acquire()
+        try:
+            yield snapshot.vsm
+        finally:
+            snapshot.release()
+
+    def remember(self, words, n):
+        '''
+            Record a search to warm up the next snapshot with.
+        '''
+        self.__recent.append((words, n))
+
+    def allowed(self, source):
+        '''
+            Returns:
+                bool, whether source is the first source of the index or a file
+                inside one of the allowed folders, once the links and the .. of
+                the path are resolved.
+        '''
+        path = os.path.realpath(source)
+        if path in self.__sources:
+            return True
+        return any(os.path.commonpath([folder, path]) == folder
+                   for folder in self.__folders)
+
+    def reload(self, source = None, wait = False):
+        '''
+            Load a new snapshot from source, by default the source of the current
+            one, and swap it in. Raises PermissionError if source is not allowed
+            and ValueError if a reload is already running.
+
+            Returns:
+                int, the version the new snapshot will have.
+        '''
+        if source is not None and not self.allowed(source):
+            raise PermissionError('Reloading from \'%s\' is not allowed' % source)
+        with self.__lock:
+            if self.__reloading is not None:
+                raise ValueError('A reload is already running')
+            if source is None:
+                source = self.__current.source
+            version = self.__current.version + 1
+            self.__reloading = threading.Thread(target = self.load,
+                                                args = (source, version), daemon = True)
+            self.__reloading.start()
+            thread = self.__reloading
+        if wait:
+            thread.join()
+        return version
+
+    def load(self, source, version):
+        enabled = gc.isenabled()
+        gc.disable()
+        try:
+            try:
+                vsm = self.__build(source)
+                for words, n in list(self.__recent):
+                    vsm.search(words, n)
+            except Exception as e:
+                # not frozen, the collections take the garbage of the failed build
+                with self.__lock:
+                    self.__error = '%s: %s' % (type(e).__name__, e)
+                    self.__reloading = None
+                return
+            self.swap(Snapshot(vsm, version, source))
+            # frozen before the collections resume, else the first one would walk
+            # every object of the build. The permanent generation only keeps the
+            # objects still alive, the retired snapshots leave it as dismantle
+            # frees them by their reference counts, and it is emptied before it
+            # is filled again, so it holds about one index whatever the number
+            # of reloads.
+            gc.unfreeze()
+            gc.freeze()
+        finally:
+            if enabled:
+                gc.enable()
+
+    def swap(self, snapshot):
+        with self.__lock:
+            retired = self.__current
+            self.__current = snapshot
+            self.__retired = [old for old in self.__retired if old.get_references() > 0]
+            self.__retired.append(retired)
+            self.__reloading = None
+            self.__error = None
+        retired.release()
+
+    def get_status(self):
+        with self.__lock:
+            return {
+                'version': self.__current.version,
+                'source': self.__current.source,
+                'reloading': self.__reloading is not None,
+                'retired': sum(1 for old in self.__retired if old.get_references() > 0),
+                'error': self.__error,
+            }
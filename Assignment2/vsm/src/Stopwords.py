@@ -0,0 +1,29 @@
+import math
+
+def derive_stopwords(document_frequency, collection_size, max_df = None, min_idf = None):
+    '''
+        Derive a stopword list from the document frequencies of the collection:
+        the keywords occurring in so many documents that their posting lists are
+        nearly full while their idf weight is nearly zero.
+
+        Args:
+            document_frequency: dictionary, map keywords to their document frequency.
+            collection_size: int, the number of documents in the collection.
+            max_df: float, keywords occurring in more than this fraction of the
+            documents are stopwords, None for no cutoff.
+            min_idf: float, keywords whose idf = log2(N / df) is below min_idf are
+            stopwords, None for no cutoff.
+
+        Returns:
+            list, the sorted stopwords.
+    '''
+    if collection_size == 0:
+        return []
+
+    stopwords = []
+    for word, df in document_frequency.items():
+        if max_df is not None and df > max_df * collection_size:
+            stopwords.append(word)
+        elif min_idf is not None and math.log(collection_size / df, 2) < min_idf:
+            stopwords.append(word)
+    return sorted(stopwords)
@@ -0,0 +1,329 @@
+from bisect import bisect_left
+from fnmatch import fnmatchcase
+from itertools import combinations
+import numpy as np
+
+WILDCARDS = '*?'
+HASH_BASE = 1000003
+HASH_MASK = (1 << 64) - 1
+
+def has_wildcard(text):
+    return any(wildcard in text for wildcard in WILDCARDS)
+
+def encode(words, width):
+    '''
+        Returns:
+            np.array, len(words) x width int64 character codes, 0 after the end of
+            a word shorter than width.
+    '''
+    padded = ''.join(word[: width].ljust(width, '\0') for word in words)
+    return np.frombuffer(padded.encode('utf-32-le'), dtype = np.uint32).reshape(
+        len(words), width).astype(np.int64)
+
+class TermDictionary(object):
+    '''
+        Sorted term dictionary of the vocabulary, supporting prefix and wildcard
+        expansion and spelling suggestions for unknown words.
+
+        Prefix lookups are two binary searches over the sorted terms, suffix
+        lookups ('*ing') are the same over the sorted reversed terms. Spelling
+        suggestions use a symmetric delete index: every term is indexed under all
+        the strings obtained by deleting up to max_distance characters from its
+        first prefix_length characters, so candidates for an unknown word are
+        found by generating its own deletes and looking them up, without
+        scanning the vocabulary. The index is two flat arrays, the sorted hashes
+        of the delete variants and the term ids aligned with them, and the edit
+        distances of all the candidates are computed at once with bit vectors.
+
+        Attrs:
+            terms: list, the sorted vocabulary.
+            reversed_terms: list, the sorted reversed vocabulary.
+            frequency: dictionary, map keywords to their document frequency, used
+            to break ties between equally close suggestions.
+            deletes: tuple (keys, tids), the sorted uint64 hashes of the delete
+            variants and the int32 ids of the terms indexed under them, built on
+            the first suggestion with lengths, starts, chars and alphabet.
+            lengths: np.array, the length of every term.
+            starts: np.array, the start of every term in chars.
+            chars: np.array, the characters of all the terms concatenated, as ids
+            in alphabet.
+            alphabet: dictionary, map the characters of the vocabulary to their id.
+            max_distance: int, the largest edit distance of a suggestion.
+            prefix_length: int, the number of leading characters which are indexed.
+
+        The document frequencies can be given in frequency when the posting
+        lists are not in memory.
+    '''
+    def __init__(self, word_file_map, max_distance = 2, prefix_length = 7, frequency = None):
+        self.__terms = sorted(word_file_map.keys())
+        self.__reversed_terms = sorted(term[::-1] for term in self.__terms)
+        if frequency is None:
+            frequency = {}
+            for term in self.__terms:
+                frequency[term] = len(word_file_map[term])
+        self.__frequency = frequency
+
+        self.__max_distance = max_distance
+        self.__prefix_length = prefix_length
+        self.__deletes = None
+        self.__lengths = None
+        self.__starts = None
+        self.__chars = None
+        self.__alphabet = None
+
+    def get_deletes(self):
+        if self.__deletes is None:
+            terms = self.__terms
+            keys, kept = self.variants(encode(terms, self.__prefix_length))
+            tids = np.repeat(np.arange(len(terms)), keys.shape[1])[kept.ravel()]
+            keys = keys.ravel()[kept.ravel()]
+            order = np.lexsort((tids, keys))
+            keys, tids = keys[order], tids[order]
+            # deleting either of two equal characters gives the same variant twice
+            unique = np.concatenate(([True], (keys[1 :] != keys[: -1])
+                                     | (tids[1 :] != tids[: -1])))
+            self.__deletes = (keys[unique], tids[unique].astype(np.int32))
+
+            self.__lengths = np.array([len(term) for term in terms], dtype = np.int64)
+            self.__starts = np.cumsum(self.__lengths) - self.__lengths
+            chars = encode([''.join(terms)], int(self.__lengths.sum()))[0]
+            codes, chars = np.unique(chars, return_inverse = True)
+            self.__alphabet = dict((chr(code), i) for i, code in enumerate(codes.tolist()))
+            self.__chars = chars.astype(np.uint32)
+        return self.__deletes
+
+    def variants(self, codes):
+        '''
+            Hash every string obtained by deleting up to max_distance characters
+            from every row of codes, the padding being ignored.
+
+            Returns:
+                keys: np.array, rows x variants uint64 hashes.
+                kept: np.array, rows x variants bool, False for an empty variant
+                or one deleting past the end of its word.
+        '''
+        width = codes.shape[1]
+        lengths = np.count_nonzero(codes, axis = 1)
+        hashed = codes.astype(np.uint64)
+        keys = []
+        kept = []
+        for count in range(self.__max_distance + 1):
+            for deleted in combinations(range(width), count):
+                key = np.zeros(len(codes), dtype = np.uint64)
+                for column in range(width):
+                    if column not in deleted:
+                        key = np.where(hashed[:, column] > 0,
+                                       key * np.uint64(HASH_BASE) + hashed[:, column], key)
+                keys.append(key)
+                last = deleted[-1] if count > 0 else -1
+                kept.append((lengths > last) & (lengths > count))
+        return np.stack(keys, axis = 1), np.stack(kept, axis = 1)
+
+    def word_variants(self, word):
+        '''
+            The hashes of the delete variants of the prefix of one word, equal to
+            those of variants() without its per column array operations.
+        '''
+        prefix = word[: self.__prefix_length]
+        strings = set()
+        for count in range(min(self.__max_distance, len(prefix) - 1) + 1):
+            for chars in combinations(prefix, len(prefix) - count):
+                strings.add(chars)
+        keys = []
+        for string in strings:
+            key = 0
+            for char in string:
+                key = (key * HASH_BASE + ord(char)) & HASH_MASK
+            keys.append(key)
+        return np.array(sorted(keys), dtype = np.uint64)
+
+    def __len__(self):
+        return len(self.__terms)
+
+    def __contains__(self, term):
+        return term in self.__frequency
+
+    def prefix_range(self, terms, prefix):
+        lo = bisect_left(terms, prefix)
+        hi = bisect_left(terms, prefix + '\uffff', lo)
+        return terms[lo : hi]
+
+    def get_terms_by_prefix(self, prefix):
+        return self.prefix_range(self.__terms, prefix)
+
+    def get_terms_by_suffix(self, suffix):
+        return sorted(term[::-1] for term in
+                      self.prefix_range(self.__reversed_terms, suffix[::-1]))
+
+    def expand(self, pattern):
+        '''
+            Expand a wildcard pattern into the matching vocabulary terms, e.g.
+            'bank*', '*ing', 'st*ck'. A '*' matches any sequence of characters and
+            a '?' matches one character.
+
+            Args:
+                pattern: str, the lowercase pattern.
+
+            Returns:
+                list, the sorted matching terms.
+        '''
+        if not has_wildcard(pattern):
+            return [pattern] if pattern in self else []
+
+        head = pattern
+        for wildcard in '*?':
+            head = head.split(wildcard)[0]
+        tail = pattern
+        for wildcard in '*?':
+            tail = tail.split(wildcard)[-1]
+
+        if len(head) >= len(tail):
+            candidates = self.get_terms_by_prefix(head)
+        else:
+            candidates = self.get_terms_by_suffix(tail)
+
+        if pattern.count('*') == 1 and '?' not in pattern:
+            return [term for term in candidates
+                    if len(term) >= len(head) + len(tail)
+                    and term.startswith(head) and term.endswith(tail)]
+        return [term for term in candidates if fnmatchcase(term, pattern)]
+
+    def distance(self, word1, word2, limit):
+        '''
+            Optimal string alignment distance between two words, a transposition
+            of adjacent characters counts as one edit. The common prefix and
+            suffix are stripped first and only the diagonal band of width limit is
+            computed; returns limit + 1 as soon as the distance is known to exceed
+            limit.
+        '''
+        if abs(len(word1) - len(word2)) > limit:
+            return limit + 1
+
+        start = 0
+        while start < len(word1) and start < len(word2) and word1[start] == word2[start]:
+            start += 1
+        end1 = len(word1)
+        end2 = len(word2)
+        while end1 > start and end2 > start and word1[end1 - 1] == word2[end2 - 1]:
+            end1 -= 1
+            end2 -= 1
+        word1 = word1[start : end1]
+        word2 = word2[start : end2]
+        if len(word1) == 0 or len(word2) == 0:
+            return max(len(word1), len(word2))
+
+        outside = limit + 1
+        n = len(word2)
+        previous2 = None
+        previous = [j if j <= limit else outside for j in range(n + 1)]
+        for i in range(1, len(word1) + 1):
+            lo = max(1, i - limit)
+            hi = min(n, i + limit)
+            current = [outside] * (n + 1)
+            if i <= limit:
+                current[0] = i
+            row_min = current[0]
+            char1 = word1[i - 1]
+            for j in range(lo, hi + 1):
+                value = previous[j - 1] if char1 == word2[j - 1] else previous[j - 1] + 1
+                if previous[j] + 1 < value:
+                    value = previous[j] + 1
+                if current[j - 1] + 1 < value:
+                    value = current[j - 1] + 1
+                if (i > 1 and j > 1 and char1 == word2[j - 2]
+                        and word1[i - 2] == word2[j - 1] and previous2[j - 2] + 1 < value):
+                    value = previous2[j - 2] + 1
+                current[j] = value
+                if value < row_min:
+                    row_min = value
+            if row_min > limit:
+                return outside
+            previous2, previous = previous, current
+
+        return min(previous[n], outside)
+
+    def suggest(self, word, n = 3):
+        '''
+            Suggest the closest vocabulary terms of an unknown word.
+
+            Args:
+                word: str, the preprocessed word.
+                n: int, the number of suggestions.
+
+            Returns:
+                list, at most n terms within max_distance edits, closest first and
+                the more frequent first among equally close terms.
+        '''
+        limit = self.__max_distance
+        keys, tids = self.get_deletes()
+        variants = self.word_variants(word)
+        lo = np.searchsorted(keys, variants, side = 'left')
+        spans = np.searchsorted(keys, variants, side = 'right') - lo
+        # a term found under several variants is verified several times, which
+        # costs less than sorting the candidates
+        candidates = tids[np.repeat(lo, spans) + np.arange(spans.sum())
+                          - np.repeat(np.cumsum(spans) - spans, spans)]
+        candidates = candidates[np.abs(self.__lengths[candidates] - len(word)) <= limit]
+
+        if 0 < len(word) < 64:
+            distances = self.distances(word, candidates)
+        else:
+            distances = np.array([self.distance(word, self.__terms[tid], limit)
+                                  for tid in candidates.tolist()], dtype = np.int64)
+        ranked = set()
+        close = distances <= limit
+        for tid, dist in zip(candidates[close].tolist(), distances[close].tolist()):
+            term = self.__terms[tid]
+            ranked.add((dist, -self.__frequency[term], term))
+        ranked = sorted(ranked)
+        return [term for dist, freq, term in ranked[: n]]
+
+    def distances(self, word, tids):
+        '''
+            Optimal string alignment distances between word, shorter than 64
+            characters, and all the terms of tids at once, by the bit-parallel
+            algorithm of Hyyro: a column of the dynamic programming matrix is held
+            as bit vectors over the characters of word, so one character of every
+            term costs a few vector operations. Every term is run over as many
+            characters as the longest one and its distance is read at its length.
+
+            Returns:
+                np.array, the int64 distances aligned with tids.
+        '''
+        m = len(word)
+        one = np.uint64(1)
+        # the positions of every character of the vocabulary in word; the bits
+        # above m - 1 are never cleared, they carry no information downwards
+        masks = np.zeros(len(self.__alphabet), dtype = np.uint64)
+        for i, char in enumerate(word):
+            if char in self.__alphabet:
+                masks[self.__alphabet[char]] |= np.uint64(1 << i)
+
+        lengths = self.__lengths[tids]
+        width = int(lengths.max()) if len(tids) > 0 else 0
+        positions = self.__starts[tids][None, :] + np.arange(width)[:, None]
+        columns = masks[self.__chars[np.minimum(positions, len(self.__chars) - 1)]]
+        positive = np.full(len(tids), (1 << m) - 1, dtype = np.uint64)
+        negative = np.zeros(len(tids), dtype = np.uint64)
+        diagonal = np.zeros(len(tids), dtype = np.uint64)
+        previous = np.zeros(len(tids), dtype = np.uint64)
+        increments = np.empty((width, len(tids)), dtype = np.uint64)
+        decrements = np.empty((width, len(tids)), dtype = np.uint64)
+        for j in range(width):
+            matches = columns[j]
+            transposed = ((~diagonal & matches) << one) & previous
+            diagonal = ((((matches & positive) + positive) ^ positive)
+                        | matches | negative | transposed)
+            increments[j] = negative | ~(diagonal | positive)
+            decrements[j] = diagonal & positive
+            x = (increments[j] << one) | one
+            positive = (decrements[j] << one) | ~(diagonal | x)
+            negative = diagonal & x
+            previous = matches
+
+        # the last row of the matrix changes by the bit m - 1 of the increments
+        shift = np.uint64(m - 1)
+        steps = (((increments >> shift) & one).astype(np.int64)
+                 - ((decrements >> shift) & one).astype(np.int64))
+        scores = m + np.cumsum(steps, axis = 0)
+        return scores[np.maximum(lengths - 1, 0), np.arange(len(tids))]
@@ -31,6 +31,22 @@ class Vector(object):
     def set_weight(self, term, value):
         self.__weights[term] = value
 
+    def add_term(self, term, value):
+        '''
+            Add a keyword absent from the text, such as the expansion of a query,
+            with a zero frequency and the weight value.
+        '''
+        self.__term_frequency[term] = 0
+        self.__term_index[term] = []
+        self.__weights[term] = value
+
+    def set_weights(self, values):
+        '''
+            Set the weights of all the keywords at once, values being aligned with
+            get_terms().
+        '''
+        self.__weights = dict(zip(self.__term_frequency.keys(), values))
+
     def get_id(self):
         return self.__did
 
@@ -46,12 +62,21 @@ class Vector(object):
     def get_terms(self):
         return self.__term_frequency.keys()
 
+    def get_term_frequency(self):
+        return self.__term_frequency
+
     def get_weight(self, term):
         if term in self.__weights.keys():
             return self.__weights[term]
         else:
             return 0.0
 
+    def get_term_index(self, term):
+        if term in self.__term_index.keys():
+            return self.__term_index[term]
+        else:
+            return []
+
     def get_weights(self):
         return self.__weights.values()
 
@@ -1,19 +1,183 @@
 import time
 
+import numpy as np
+
 from Vector import Vector
+from BooleanQuery import BooleanQuery
 from QueryResult import QueryResult
 from DataManager import DataManager
+from Pruning import prune, count_postings
+from Stopwords import derive_stopwords
+from IndexFile import is_index_file, write_index
+from PagedIndex import IndexReader
+from Duplicates import DUPLICATE_MODES, minhash_signatures, find_duplicates
+from Related import build_related
+from TermDictionary import WILDCARDS, has_wildcard
 
 class VSM(object):
     '''
         The controller of the system, interact with upper layers and perform operations.
 
+        The input is either a documents collection file or an index file written
+        by save_index. When building from a collection, the keywords occurring in
+        more than max_df of the documents or whose idf is below min_idf are made
+        stopwords; an index file keeps the stopwords it was built with, and
+        raises ValueError if given a different max_df or min_idf. An index
+        file is opened for on demand loading: only its term dictionary and
+        per-document statistics are read at startup, the postings and documents
+        are read on first access into caches of cache_size postings and keywords.
+
+        The backend computing the scores is chosen from the collection statistics,
+        see Backend.select_backend, unless one is named in backend.
+
+        With duplicates, the near-duplicate documents of a collection are found
+        by MinHash, see load_documents: 'drop' indexes only the first document of
+        every cluster, the others keeping their number with no keyword and being
+        left out of the collection size the idf is computed over, and 'collapse'
+        indexes them all but ranks, and pages, only the best of every cluster.
+
+        A query may be limited to deadline seconds and to budget postings, by
+        default for every query or per query in do_query and search; a query cut
+        short returns the best documents found so far, flagged approximate.
+
+        With related, the neighbours keywords most related to every keyword are
+        computed after the index by 'cooccurrence' or 'lsi', see Related.py, and
+        every ranked query is expanded with the keywords related to its own,
+        weighted by expansion * their similarity.
+
         Attrs:
             data_manager: DataManager, storing all the data structure in the system.
+            word_file_map: dictionary, map keywords to a list of document id.
+            cutoff: dictionary, the max_df and min_idf the stopwords were derived with.
+            reader: IndexReader, the opened index file, None for a collection.
+            duplicates: dictionary, the figures of the near-duplicate detection,
+            None if it did not run.
+            related: dictionary, the method, the size and the build time of the
+            related keywords, None if they were not computed.
     '''
-    def __init__(self, input_path):
-        word_file_map, documents = self.load_documents(input_path)
-        self.__data_manager = DataManager(word_file_map, documents)
+    def __init__(self, input_path, scorer = 'cosine', index = 'document', budget = None,
+                 workers = 1, max_df = None, min_idf = None, cache_size = 1000000,
+                 backend = 'auto', duplicates = None, deadline = None, related = None,
+                 neighbours = 5, expansion = 0.5):
+        start = time.time()
+        collection = None
+        clusters = None
+        self.__reader = None
+        self.__duplicates = None
+        if is_index_file(input_path):
+            reader = IndexReader(input_path, cache_size)
+            self.__reader = reader
+            word_file_map = reader.get_word_file_map()
+            documents = reader.get_documents()
+            collection = reader.get_collection()
+            stopwords = reader.get_stopwords()
+            self.__cutoff = reader.get_cutoff()
+            for name, value in (('max_df', max_df), ('min_idf', min_idf)):
+                if value is not None and value != self.__cutoff.get(name):
+                    reader.close()
+                    raise ValueError('The index file keeps the stopwords built with %s %s, '
+                                     'they cannot be derived again with %s without the '
+                                     'collection' % (name, self.__cutoff.get(name), value))
+        else:
+            word_file_map, documents = self.load_documents(input_path,
+                                                           duplicates = duplicates)
+            if duplicates == 'collapse':
+                clusters = self.__duplicates['clusters']
+            num_documents = len(documents)
+            if duplicates == 'drop':
+                num_documents -= self.__duplicates['duplicates']
+                collection = {'collection_size': num_documents}
+            document_frequency = dict((word, len(dids)) for word, dids
+                                      in word_file_map.items())
+            stopwords = derive_stopwords(document_frequency, num_documents, max_df, min_idf)
+            self.__cutoff = {'max_df': max_df, 'min_idf': min_idf}
+        self.__word_file_map = word_file_map
+        self.__data_manager = DataManager(word_file_map, documents, scorer, index, budget,
+                                          collection, workers, stopwords, backend, clusters,
+                                          deadline)
+        self.__options = (scorer, index, budget, workers)
+        if self.__duplicates is not None:
+            self.__duplicates['build_seconds'] = time.time() - start
+        self.__related = None
+        if related is not None:
+            if self.__reader is not None:
+                raise ValueError('The related keywords are computed from a collection, '
+                                 'not from a loaded index.')
+            start = time.time()
+            table = build_related(related, self.__data_manager.get_statistics(),
+                                  stopwords, neighbours, expansion)
+            self.__data_manager.set_related(table)
+            self.__related = {'method': related, 'num_terms': table.get_num_terms(),
+                              'neighbours': table.get_num_neighbours(),
+                              'bytes': table.get_nbytes(), 'seconds': time.time() - start}
+
+    def get_data_manager(self):
+        return self.__data_manager
+
+    def close(self):
+        '''
+            Release the worker threads and the index file, the VSM must not be
+            queried afterwards.
+        '''
+        self.__data_manager.close()
+        if self.__reader is not None:
+            self.__reader.close()
+
+    def get_stopwords(self):
+        return sorted(self.__data_manager.get_stopwords())
+
+    def save_index(self, output_path):
+        '''
+            Write the unpruned index and its stopwords to output_path, to be
+            loaded by VSM(output_path) without preprocessing the collection again.
+        '''
+        write_index(output_path, self.__word_file_map, self.__data_manager.get_documents(),
+                    self.__data_manager.get_statistics(), self.get_stopwords(), self.__cutoff)
+
+    def report_stopwords(self):
+        stopwords = self.get_stopwords()
+        print('Stopwords (%d): %s' % (len(stopwords), ', '.join(stopwords)))
+        print()
+
+    def get_duplicates(self):
+        return self.__duplicates
+
+    def report_duplicates(self):
+        report = self.__duplicates
+        print('Near-duplicates: %d of %d documents in %d clusters, found in %.3fs'
+              % (report['duplicates'], len(report['clusters']), report['num_clusters'],
+                 report['seconds']))
+        if report['mode'] == 'drop':
+            postings = report['postings']
+            indexed = report['indexed_postings']
+            print('Dropped from the index: postings %d -> %d (-%.1f%%), built in %.3fs'
+                  % (postings, indexed, 100.0 * (postings - indexed) / max(postings, 1),
+                     report['build_seconds']))
+        else:
+            print('Collapsed at result time, built in %.3fs' % report['build_seconds'])
+        print()
+
+    def get_related(self):
+        return self.__related
+
+    def report_related(self):
+        report = self.__related
+        print('Related keywords: %d neighbours of %d keywords by %s, %.1f KB, built in %.3fs'
+              % (report['neighbours'], report['num_terms'], report['method'],
+                 report['bytes'] / 1024.0, report['seconds']))
+        print()
+
+    def prune(self, mode, threshold):
+        '''
+            Replace the index by a statically pruned copy, see Pruning.prune.
+
+            Returns:
+                tuple, the number of postings before and after pruning.
+        '''
+        scorer, index, budget, workers = self.__options
+        before = self.__data_manager
+        self.__data_manager = prune(before, mode, threshold, scorer, index, budget, workers)
+        return count_postings(before), count_postings(self.__data_manager)
 
     def pre_process(self, passage):
         passage = passage.lower()
@@ -42,16 +206,84 @@ class VSM(object):
 
         return words
 
-    def load_documents(self, input_path):
+    def expand_wildcards(self, passage):
+        '''
+            Preprocess a query passage, replacing every keyword containing a '*'
+            or '?' wildcard such as 'bank*', '*ing' or 'b?nk' by all the matching
+            keywords of the vocabulary.
+
+            Args:
+                passage: str, the raw query text.
+
+            Returns:
+                words: list, the preprocessed and expanded keywords.
+        '''
+        words = []
+        for token in passage.split():
+            if has_wildcard(token):
+                words.extend(self.expand_pattern(token))
+            else:
+                words.extend(self.pre_process(token))
+        return words
+
+    def expand_pattern(self, token):
+        pattern = ''
+        for char in token.lower():
+            if char.isalpha() or char in WILDCARDS:
+                pattern += char
+        return self.__data_manager.expand_terms(pattern)
+
+    def load_documents(self, input_path, shard_id = 0, num_shards = 1, duplicates = None):
+        '''
+            Load and preprocess the documents of the collection, one per line.
+
+            Args:
+                input_path: str, path of the documents collection file.
+                shard_id: int, only load the documents whose number modulo
+                num_shards is shard_id, the document numbers are local to the shard.
+                num_shards: int, the number of shards the collection is split into.
+                duplicates: str, 'drop' or 'collapse' to cluster the near-duplicate
+                documents by MinHash over word shingles and LSH banding, 'drop'
+                leaving all the documents of a cluster but the first unindexed.
+
+            Returns:
+                word_file_map: dictionary, map keywords to a list of document id.
+                documents: list, the Vector instances of the documents.
+        '''
+        if duplicates is not None and duplicates not in DUPLICATE_MODES:
+            raise ValueError('Unknown duplicates mode \'%s\', expected one of: %s'
+                             % (duplicates, ', '.join(DUPLICATE_MODES)))
         word_file_map = {}
         documents = []
 
+        texts = []
         input_collection = open(input_path, 'r')
+        num = -1
         for line in input_collection:
             if len(line) < 2:
                 continue
+            num += 1
+            if num % num_shards != shard_id:
+                continue
+            texts.append(self.pre_process(line))
 
-            words = self.pre_process(line)
+        if duplicates is not None:
+            start = time.time()
+            clusters = find_duplicates(minhash_signatures(texts))
+            self.__duplicates = {
+                'mode': duplicates,
+                'clusters': clusters,
+                'seconds': time.time() - start,
+                'duplicates': int(np.sum(clusters != np.arange(len(texts)))),
+                'num_clusters': int(np.sum(np.bincount(clusters, minlength = len(texts)) > 1)),
+                'postings': sum(len(set(words)) for words in texts),
+            }
+            if duplicates == 'drop':
+                texts = [words if clusters[did] == did else []
+                         for did, words in enumerate(texts)]
+            self.__duplicates['indexed_postings'] = sum(len(set(words)) for words in texts)
+
+        for words in texts:
             curr_id = len(documents)
             document = Vector(words, curr_id)
             documents.append(document)
@@ -74,17 +306,60 @@ class VSM(object):
               % result.get_num())
         print('Magnitude of the document vector: %.2f'
               % result.get_magnitude())
-        print('Similarity score: %.2f' % result.get_sim_score())
+        if result.is_approximate():
+            print('Similarity score: %.2f (approximate)' % result.get_sim_score())
+        else:
+            print('Similarity score: %.2f' % result.get_sim_score())
+
+    def make_query(self, words, expand = False):
+        '''
+            The query vector of the preprocessed words, expanded with their
+            related keywords if expand and they were computed.
+        '''
+        query = Vector(words)
+        for word in query.get_terms():
+            query.set_weight(word, query.get_tf(word))
+        if expand:
+            self.__data_manager.expand_query(query)
+        return query
+
+    def search(self, words, n = 3, deadline = None, budget = None):
+        '''
+            Find the n highest scored documents for the preprocessed query words
+            without displaying anything, within deadline seconds and budget
+            postings, by default those of the index.
+
+            Returns:
+                result: list, containing n (did, score) tuples.
+                approximate: bool, True if the evaluation was cut by the budget.
+        '''
+        return self.__data_manager.top(self.make_query(words, True), n, deadline, budget)
+
+    def search_page(self, words, size = 10):
+        '''
+            Find the first size documents for the preprocessed query words and
+            open a cursor on the rest of the ranking.
 
-    def do_query(self, query):
+            Returns:
+                page: list, containing size (did, score) tuples.
+                cursor: str, to be passed to next_page, None after the last page.
+        '''
+        return self.__data_manager.search_page(self.make_query(words, True), size)
+
+    def next_page(self, cursor, size = 10):
+        return self.__data_manager.next_page(cursor, size)
+
+    def do_query(self, query, deadline = None, budget = None):
         print('----------------------------------------')
         start = time.time()
 
-        query = Vector(query)
-        for word in query.get_terms():
-            query.set_weight(word, query.get_tf(word))
+        query = self.make_query(query)
+        expansions = self.__data_manager.expand_query(query)
+        if len(expansions) > 0:
+            print('Expanded with: %s' % ', '.join('%s (%.2f)' % (word, weight)
+                                                  for word, weight in expansions))
 
-        query_result = self.__data_manager.get_query_result(query)
+        query_result = self.__data_manager.get_query_result(query, deadline, budget)
         for result in query_result:
             self.display_result(result)
             print('----------------------------------------')
@@ -92,13 +367,52 @@ class VSM(object):
         end = time.time()
         print('Spended Time: %.6fs\n' % (end - start))
 
-    def batch_query(self, input_path):
+    def boolean_query(self, text, rank = True):
+        '''
+            Evaluate and display a boolean query such as 'bank AND NOT debt'.
+
+            Args:
+                text: str, the raw query text with AND, OR, NOT and parentheses.
+                rank: bool, order the matched documents by the score of the
+                non-negated keywords if True, by document id otherwise.
+        '''
+        print('----------------------------------------')
+        start = time.time()
+
+        try:
+            boolean_query = BooleanQuery(text, self.pre_process, self.expand_pattern)
+        except ValueError as e:
+            print(e)
+            print()
+            return
+
+        query = self.make_query(boolean_query.get_terms())
+
+        query_result, num_matched = self.__data_manager.get_boolean_result(
+            boolean_query, query, rank)
+        print('Number of matched documents: %d' % num_matched)
+        print('----------------------------------------')
+        for result in query_result:
+            self.display_result(result)
+            print('----------------------------------------')
+
+        end = time.time()
+        print('Spended Time: %.6fs\n' % (end - start))
+
+    def batch_query(self, input_path, boolean = False, rank = True):
         input_queries = open(input_path, 'r')
         num = 1
         for line in input_queries:
             line = line.strip()
             print('Query %d: %s' % (num, line))
-            query = self.pre_process(line)
+            if boolean:
+                self.boolean_query(line, rank)
+                num += 1
+                continue
+            if has_wildcard(line):
+                query = self.expand_wildcards(line)
+            else:
+                query = self.pre_process(line)
             if len(query) == 0:
                 print('No keyword remained after preprocessing.')
             self.do_query(query)
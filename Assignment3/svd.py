@@ -1,6 +1,10 @@
+import os
 import math
+import time
+import argparse
 import numpy as np
-import matplotlib.pyplot as plt
+
+SCORES = ('lsi', 'cosine', 'reconstruction')
 
 def svd(A):
     A1 = np.dot(A.T, A)
@@ -42,11 +46,163 @@ def display(M):
                 print('%.4f' % M[i], end = ' ')
         print('\n')
 
+def factorize(A, k):
+    '''
+        Truncated SVD of the terms x documents matrix A at rank k, computed once
+        for all the ranks up to k. Uses the sparse solver of scipy when it is
+        installed and k is below the smaller dimension, the full thin SVD of
+        numpy otherwise.
+
+        Returns:
+            U: np.array, terms x k, the left singular vectors.
+            s: np.array, the k singular values in decreasing order.
+            V: np.array, documents x k, the right singular vectors.
+    '''
+    if k < min(A.shape) - 1:
+        try:
+            from scipy.sparse.linalg import svds
+        except ImportError:
+            svds = None
+        if svds is not None:
+            U, s, Vt = svds(A.astype(np.float64), k = k)
+            order = np.argsort(-s)
+            return U[:, order], s[order], Vt[order].T
+    U, s, Vt = np.linalg.svd(A.astype(np.float64), full_matrices = False)
+    return U[:, : k], s[: k], Vt[: k].T
+
+def sweep(U, s, V, q):
+    '''
+        Score every document for the query q at every rank 1..k of one
+        factorization. At rank k the query maps to qk = Sigma_k^-1 * U_k^t * q
+        and document j to the row j of V_k, so every score is a sum over the
+        first k singular triplets and a cumulative sum over them gives all the
+        ranks at once, without reducing or reconstructing any matrix.
+
+        Returns:
+            dictionary, map every method of SCORES to a k x documents array, the
+            row k - 1 holding the scores at rank k: 'lsi' is qk . dk, 'cosine'
+            the cosine of qk and dk, 'reconstruction' q . d for the rank k
+            approximate of the matrix, U_k * Sigma_k * V_k^t.
+    '''
+    s = np.where(s > 0, s, np.inf)
+    projection = np.dot(q, U)
+    mapped = projection / s
+    lsi = np.cumsum(mapped[:, None] * V.T, axis = 0)
+    norms = np.sqrt(np.cumsum(mapped ** 2)[:, None] * np.cumsum(V.T ** 2, axis = 0))
+    cosine = np.divide(lsi, norms, out = np.zeros_like(lsi), where = norms > 0)
+    s = np.where(np.isinf(s), 0.0, s)
+    reconstruction = np.cumsum((projection * s)[:, None] * V.T, axis = 0)
+    return {'lsi': lsi, 'cosine': cosine, 'reconstruction': reconstruction}
+
+def write_scores(path, ranks, scores):
+    with open(path, 'w') as output:
+        output.write('k,%s\n' % ','.join('d%d' % (j + 1) for j in range(scores.shape[1])))
+        for k in ranks:
+            output.write('%d,%s\n' % (k, ','.join('%.6f' % x for x in scores[k - 1])))
+
+def plot_scores(path, ranks, scores, method, num_documents = 10):
+    '''
+        Plot the scores against the rank of the num_documents best documents at
+        the highest rank into an image file, without opening any window.
+    '''
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    ranks = list(ranks)
+    best = np.argsort(-scores[ranks[-1] - 1])[: num_documents]
+    figure = plt.figure()
+    for j in best:
+        plt.plot(ranks, scores[np.array(ranks) - 1, j], label = 'd%d' % (j + 1))
+    plt.grid(True)
+    plt.xlabel('rank k')
+    plt.ylabel('%s score' % method)
+    plt.legend(fontsize = 'small')
+    figure.savefig(path)
+    plt.close(figure)
+
+def load_matrix(path):
+    if path.endswith('.npy'):
+        return np.load(path)
+    return np.loadtxt(path, ndmin = 2)
+
+def run_sweep(A, q, min_rank, max_rank, output_folder, plot = False, top = 3):
+    '''
+        Factor the documents x terms matrix A once at max_rank, score q at every
+        rank from min_rank to max_rank and write one scores-<method>.csv per
+        method, and one scores-<method>.png with plot, to output_folder.
+    '''
+    max_rank = min(max_rank, min(A.shape))
+    ranks = range(min_rank, max_rank + 1)
+    start = time.time()
+    U, s, V = factorize(A.T, max_rank)
+    factorized = time.time()
+    scores = sweep(U, s, V, q)
+    end = time.time()
+    print('Factorized %d x %d at rank %d in %.3fs, scored ranks %d-%d in %.3fs'
+          % (A.shape[0], A.shape[1], max_rank, factorized - start, min_rank, max_rank,
+             end - factorized))
+
+    os.makedirs(output_folder, exist_ok = True)
+    for method in SCORES:
+        path = os.path.join(output_folder, 'scores-%s.csv' % method)
+        write_scores(path, ranks, scores[method])
+        print('Wrote %s' % path)
+        if plot:
+            path = os.path.join(output_folder, 'scores-%s.png' % method)
+            plot_scores(path, ranks, scores[method], method)
+            print('Wrote %s' % path)
+
+    for k in ranks:
+        best = np.argsort(-scores['lsi'][k - 1])[: top]
+        print('k = %d: %s' % (k, ', '.join('d%d %.4f' % (j + 1, scores['lsi'][k - 1, j])
+                                           for j in best)))
+
 def main():
+    parser = argparse.ArgumentParser(
+        description = 'LSI walk-through of the assignment, or a headless rank sweep')
+    parser.add_argument('--sweep', action = 'store_true',
+                        help = 'Score the query at every rank of one factorization and '
+                               'write the scores to files instead of the walk-through')
+    parser.add_argument('--matrix', type = str, default = None,
+                        help = 'Documents x terms matrix, .npy or text, the matrix of '
+                               'the assignment by default')
+    parser.add_argument('--query', type = str, default = None,
+                        help = 'Query vector over the terms, .npy or text')
+    parser.add_argument('--min-rank', type = int, default = 1,
+                        help = 'Smallest rank of the sweep')
+    parser.add_argument('--max-rank', type = int, default = 100,
+                        help = 'Largest rank of the sweep, the factorization rank')
+    parser.add_argument('-o', '--output', type = str, default = 'sweep',
+                        help = 'Folder the sweep results are written to')
+    parser.add_argument('--plot', action = 'store_true',
+                        help = 'Also plot the sweep scores to image files')
+    parser.add_argument('--figure', type = str, default = None,
+                        help = 'Save the figure of the walk-through to this file '
+                               'instead of displaying it')
+    args = parser.parse_args()
+
     A = np.array([[1, 0, 1, 0, 1, 1, 1, 1, 1, 0, 0],
                   [1, 1, 0, 1, 0, 0, 1, 1, 0, 2, 1],
                   [1, 1, 0, 0, 0, 1, 1, 1, 1, 0, 1]])
     q = np.array([0, 0, 0, 0, 0, 1, 0, 0, 0, 1, 1])
+    if args.sweep:
+        if args.matrix is not None:
+            A = load_matrix(args.matrix)
+            if args.query is None:
+                parser.error('--query is required with --matrix')
+        if args.query is not None:
+            q = load_matrix(args.query).ravel()
+        if len(q) != A.shape[1]:
+            parser.error('the query has %d terms, the matrix %d' % (len(q), A.shape[1]))
+        if args.min_rank < 1 or args.min_rank > min(args.max_rank, min(A.shape)):
+            parser.error('--min-rank must be between 1 and the largest rank')
+        run_sweep(A, q, args.min_rank, args.max_rank, args.output, args.plot)
+        return
+
+    walk_through(A, q, args.figure)
+
+def walk_through(A, q, figure = None):
     U, S, V = svd(A.T)
     print('Problem (a):')
     print('Matrix U:')
@@ -74,12 +230,9 @@ def main():
         print('Document %d: %.4f' % (i + 1, score))
     print()
 
-    S2 = np.zeros((2, 2))
-    S2[0:2, 0:2] = S[0:2, 0:2]
-    U2 = np.zeros((U.shape[0], 2))
-    U2[:, 0:2] = U[:, 0:2]
-    V2 = np.zeros((V.shape[0], 2))
-    V2[:, 0:2] = V[:, 0:2]
+    S2 = S[: 2, : 2]
+    U2 = U[:, : 2]
+    V2 = V[:, : 2]
     estimate_A2 = np.dot(np.dot(U2, S2), V2.T)
     print('Problem (c):')
     print('Matrix U2:')
@@ -115,6 +268,11 @@ def main():
     d3_k = np.dot(np.dot(S_inv_2.T, temp_U2.T), d3)
     display(d3_k)
 
+    import matplotlib
+    if figure is not None:
+        matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
     x = np.array([qk[0], d1_k[0], d2_k[0], d3_k[0]])
     y = np.array([qk[1], d1_k[1], d2_k[1], d3_k[1]])
     plt.grid(True)
@@ -132,7 +290,10 @@ def main():
                  arrowprops=dict(arrowstyle="->"))
     plt.annotate("", xy=(d3_k[0], d3_k[1]), xytext=(0, 0),
                  arrowprops=dict(arrowstyle="->"))
-    plt.show()
+    if figure is not None:
+        plt.savefig(figure)
+    else:
+        plt.show()
 
     print('Problem (e):')
     print('Score for Rank-2 approximate:')